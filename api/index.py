@@ -2,20 +2,50 @@
 # Vercel Serverless Function — Python Flask
 
 import os
+import sys
+import csv
+import io
 import hashlib
-import secrets
+import hmac
 import re
 import json
-import math
-from datetime import datetime
+from datetime import datetime, date
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Los módulos compartidos (utils/) viven en la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache import TTLCache
+from utils.qr_tokens import emitir_token, verificar_token, segundos_restantes, exigir_secreto, QR_WINDOW_SECONDS
+from utils.qr_render import get_qr_renderer, MIMETYPES
+from utils.geofence import geocerca_de_clase, validar_poligono
+from utils.session_tokens import (emitir_sesion, ListaRevocacion, SecretoNoConfigurado,
+                                  emitir_activacion, verificar_activacion, coincide_huella)
+from utils.decorators import requiere_sesion, agregar_header, limitar_tasa, idempotente, coalescer
+from utils.idempotency import AlmacenIdempotencia
+from utils.rate_limit import crear_limitador, llave_dispositivo, llave_ip, llave_login
+from utils.db_errors import campo_duplicado, filtro_or_eq, valor_filtro
+from utils.availability import IndiceDisponibilidad, normalizar
+from utils.write_buffer import BufferEscrituras
+from utils.passwords import get_pool, HashingSaturado
+from utils.load_shedding import get_control, prioridad_de
+from utils.offline_sync import validar_lote, MAX_LOTE, REGISTRADA, DUPLICADA
+from utils.roster_import import ImportadorAlumnos, filtro_existentes, COLUMNAS_REPORTE, ERROR, SIN_PASSWORD
+from utils.attendance_stats import ConteosAsistencia, estado_de, PRESENTE, JUSTIFICADA, FALTA
+from utils.enrollment import IndiceInscripciones
+from utils.history import params_pagina, cortar_pagina, leer_limite, detalle_pagina
+from utils.rollups import TrabajoRollup, marcar_pendientes, tendencias, semana_de
+from utils.jobs import ColaTrabajos, ColaLlena
+from utils.singleflight import GrupoVuelo
+from utils.report_pdf import CachePDF, generar_pdf, version_reporte
+
 # ─────────────────────────────────────────────
 # DATABASE CLIENT
 # ─────────────────────────────────────────────
-import requests as req
+# `requests` se importa al construir el cliente (primer uso), no al cargar el
+# módulo: el tiempo de import se paga en cada cold start de la función.
 
 class DB:
     def __init__(self):
@@ -29,34 +59,42 @@ class DB:
             "Content-Type": "application/json",
             "Prefer": "return=representation",
         }
+        import requests
+        # Session reutiliza la conexión TLS entre consultas de la misma invocación
+        self.http = requests.Session()
+        self.http.headers.update(self.h)
 
     def _url(self, table):
         return f"{self.url}/rest/v1/{table}"
 
-    def select(self, table, params=None):
-        r = req.get(self._url(table), headers=self.h, params=params, timeout=10)
+    def _enviar(self, method, url, **kwargs):
+        # Cada consulta cuenta como "en vuelo" para el descarte por prioridad
+        with carga.consulta_bd():
+            r = self.http.request(method, url, timeout=10, **kwargs)
         r.raise_for_status()
         return r.json()
 
+    def select(self, table, params=None):
+        return self._enviar("GET", self._url(table), params=params)
+
     def insert(self, table, data):
-        r = req.post(self._url(table), headers=self.h, json=data, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return self._enviar("POST", self._url(table), json=data)
 
     def update(self, table, data, params):
-        r = req.patch(self._url(table), headers=self.h, json=data, params=params, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return self._enviar("PATCH", self._url(table), json=data, params=params)
 
     def delete(self, table, params):
-        r = req.delete(self._url(table), headers=self.h, params=params, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return self._enviar("DELETE", self._url(table), params=params)
 
     def rpc(self, fn, payload=None):
-        r = req.post(f"{self.url}/rest/v1/rpc/{fn}", headers=self.h, json=payload or {}, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return self._enviar("POST", f"{self.url}/rest/v1/rpc/{fn}", json=payload or {})
+
+    def upsert(self, table, data, on_conflict):
+        """INSERT ... ON CONFLICT (on_conflict) DO UPDATE con las columnas enviadas"""
+        return self._enviar("POST", self._url(table), json=data, params={"on_conflict": on_conflict},
+                            headers={"Prefer": "resolution=merge-duplicates,return=representation"})
+
+carga = get_control()
 
 _db = None
 def get_db():
@@ -65,16 +103,100 @@ def get_db():
         _db = DB()
     return _db
 
+# Metadatos de clases activas: evita releer `clases` en cada escaneo
+_clases_cache = TTLCache(ttl=300, max_entries=2048)
+# Geocercas precalculadas por clase (se construyen al iniciar o en el primer escaneo)
+_geocercas = TTLCache(ttl=300, max_entries=2048)
+RADIO_MAX = 50  # metros (GPS es impreciso en interiores, usamos 50m)
+# Clases terminadas en esta instancia: sus tokens aún podrían estar dentro del desfase
+_clases_terminadas = TTLCache(ttl=3 * QR_WINDOW_SECONDS, max_entries=2048)
+
+def _lista_in(ids) -> str:
+    return f"in.({','.join(map(str, ids))})"
+
+def _cargar_conteos(profesor_id: int):
+    """Clases del profesor y sus asistencias: dos consultas para todo el dashboard"""
+    db = get_db()
+    clases = {c["id"]: c.get("materia_id")
+              for c in db.select("clases", {"profesor_id": f"eq.{profesor_id}", "select": "id,materia_id"})}
+    if not clases:
+        return {}, []
+    filas = db.select("asistencias", {"clase_id": _lista_in(clases),
+                                      "select": "alumno_id,valida,justificada"})
+    return clases, filas or []
+
+# Presentes / justificadas por alumno y profesor, ajustados en cada escritura
+conteos = ConteosAsistencia(_cargar_conteos)
+
+def _cargar_inscripciones(profesor_id: int):
+    """Materias del profesor y los pares (alumno, materia) de sus horarios"""
+    db = get_db()
+    materia_ids = [m["id"] for m in db.select("materias", {"profesor_id": f"eq.{profesor_id}", "select": "id"})]
+    if not materia_ids:
+        return [], []
+    horarios = db.select("horarios", {"materia_id": _lista_in(materia_ids),
+                                      "select": "alumno_id,materia_id"}) or []
+    return materia_ids, [(h["alumno_id"], h["materia_id"]) for h in horarios]
+
+def _cargar_materias_alumno(alumno_id: int):
+    horarios = get_db().select("horarios", {"alumno_id": f"eq.{alumno_id}", "select": "materia_id"}) or []
+    return {h["materia_id"] for h in horarios if h.get("materia_id")}
+
+# Listas por materia/profesor derivadas de `horarios`
+inscripciones = IndiceInscripciones(_cargar_inscripciones, _cargar_materias_alumno)
+
+_CAMPOS_ALUMNO = "id,matricula,nombre,apellido_paterno,apellido_materno"
+
+def _alumnos_inscritos(profesor_id: int, materia_id=None, order=None):
+    """
+    Filas de `usuarios` de los alumnos inscritos con el profesor (o en una
+    materia). Si el profesor aún no tiene horarios cargados, todos los
+    alumnos, como antes de existir el índice.
+    """
+    db = get_db()
+    roster = inscripciones.de_profesor(profesor_id).roster(materia_id)
+    params = {"rol": "eq.alumno", "select": _CAMPOS_ALUMNO}
+    if order:
+        params["order"] = order
+    if roster:
+        params["id"] = _lista_in(sorted(roster))
+    elif inscripciones.de_profesor(profesor_id).por_alumno:
+        return []  # la materia pedida no tiene alumnos inscritos
+    return db.select("usuarios", params) or []
+
+def get_clase_activa(clase_id: int):
+    """Fila de la clase si está activa (caché en memoria, luego lookup por PK)"""
+    if clase_id in _clases_terminadas:
+        return None
+    clase = _clases_cache.get(clase_id)
+    if clase is None:
+        rows = get_db().select("clases", {"id": f"eq.{clase_id}", "activa": "eq.true"})
+        if not rows:
+            return None
+        clase = rows[0]
+        _clases_cache.set(clase_id, clase)
+    return clase
+
+def get_geocerca(clase: dict):
+    """Geocerca de la clase, construida una sola vez por instancia"""
+    geocerca = _geocercas.get(clase["id"])
+    if geocerca is None:
+        geocerca = geocerca_de_clase(clase, RADIO_MAX)
+        if geocerca is not None:
+            _geocercas.set(clase["id"], geocerca)
+    return geocerca
+
 # ─────────────────────────────────────────────
 # UTILIDADES
 # ─────────────────────────────────────────────
 def hp(password: str) -> str:
-    """Hash de contraseña con SHA-256 + salt fijo de env"""
+    """Hash legado (SHA-256 + salt fijo de env); solo para migrar con rehash-on-login"""
     salt = os.getenv("PASSWORD_SALT", "attendanceapp_salt_2024")
     return hashlib.sha256(f"{salt}{password}".encode()).hexdigest()
 
-def token() -> str:
-    return secrets.token_urlsafe(32)
+def token(user: dict) -> str:
+    """Token de sesión firmado (uid, rol, telefono_id, exp); se verifica sin BD"""
+    return emitir_sesion(user)
 
 def valid_matricula(m: str) -> bool:
     # Formato: 9 chars alfanuméricos (ej. 232H17024)
@@ -83,22 +205,12 @@ def valid_matricula(m: str) -> bool:
 def valid_email(e: str) -> bool:
     return bool(re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', e))
 
-def haversine(lat1, lon1, lat2, lon2) -> float | None:
-    """Distancia en metros entre dos coordenadas GPS"""
-    if None in (lat1, lon1, lat2, lon2):
-        return None
-    R = 6_371_000
-    p1, p2 = math.radians(lat1), math.radians(lat2)
-    dp = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dp/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dl/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-
 def cors():
     return {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Methods": "GET, POST, PATCH, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, Idempotency-Key",
+        "Access-Control-Expose-Headers": "X-Session-Token, Idempotent-Replayed",
     }
 
 def ok(data: dict, status=200):
@@ -107,6 +219,39 @@ def ok(data: dict, status=200):
 def err(msg: str, status=400):
     return (json.dumps({"success": False, "message": msg}), status, {"Content-Type": "application/json", **cors()})
 
+def err_ocupado(msg: str, retry_after: int = 1):
+    return agregar_header(err(msg, 503), "Retry-After", str(retry_after))
+
+# ── SESIONES ──────────────────────────────────
+def _jti_revocado(jti: str) -> bool:
+    return bool(get_db().select("sesiones_revocadas", {"jti": f"eq.{jti}", "select": "jti"}))
+
+def _revocar_jti(jti: str, exp: int):
+    get_db().insert("sesiones_revocadas", {"jti": jti, "expira": datetime.fromtimestamp(exp).isoformat()})
+
+revocaciones = ListaRevocacion(_jti_revocado, _revocar_jti)
+
+def con_sesion(roles=None, sensible=False):
+    """Sesión firmada; `sensible` agrega la consulta a la lista de revocación"""
+    return requiere_sesion(roles=roles, revocaciones=revocaciones if sensible else None, error=err)
+
+# ── LÍMITES DE TASA ───────────────────────────
+# Token bucket por dispositivo/IP (utils/rate_limit.py); 429 + Retry-After
+_limitadores = {nombre: crear_limitador(nombre) for nombre in ("asistencia", "login", "check")}
+
+def limitado(nombre: str, llave=llave_dispositivo):
+    return limitar_tasa(_limitadores[nombre], llave=llave, error=err)
+
+# Reintentos con Idempotency-Key: se repite el 201 original sin tocar la BD
+_idempotencia = AlmacenIdempotencia()
+
+# Lecturas caras idénticas y simultáneas (dashboard, reporte, asistencias de
+# una clase) comparten una sola ejecución
+_vuelos = GrupoVuelo()
+
+def _es_propietario(req_obj, user_id) -> bool:
+    return str(req_obj.sesion["uid"]) == str(user_id)
+
 # ─────────────────────────────────────────────
 # HANDLERS
 # ─────────────────────────────────────────────
@@ -138,17 +283,6 @@ def h_register(req_obj):
 
     db = get_db()
 
-    # Verificar duplicados
-    for field, val in [("email",       data["email"]),
-                       ("matricula",   data["matricula"].upper()),
-                       ("telefono_id", data["telefono_id"])]:
-        existing = db.select("usuarios", {field: f"eq.{val}"})
-        if existing:
-            labels = {"email": "correo electrónico",
-                      "matricula": "matrícula",
-                      "telefono_id": "dispositivo"}
-            return err(f"El {labels.get(field, field)} ya está registrado")
-
     # nombre = "Nombre(s) ApellidoPaterno ApellidoMaterno" guardado en la
     # columna `nombre` que ya existe + las 2 columnas nuevas del ALTER TABLE
     ap  = data["apellido_paterno"].strip().title()
@@ -156,23 +290,37 @@ def h_register(req_obj):
     nom = data["nombre"].strip().title()
     nombre_completo = f"{nom} {ap} {am}"
 
+    try:
+        password_hash = get_pool().hash(data["password"])
+    except HashingSaturado:
+        return err_ocupado("Servidor ocupado, intenta de nuevo")
+
     new_user = {
         "matricula":        data["matricula"].upper(),
         "nombre":           nombre_completo,          # columna existente
         "apellido_paterno": ap,                        # columna nueva (ALTER TABLE)
         "apellido_materno": am,                        # columna nueva (ALTER TABLE)
         "email":            data["email"].lower().strip(),
-        "password_hash":    hp(data["password"]),
+        "password_hash":    password_hash,
         "rol":              data["rol"],
         "telefono_id":      data["telefono_id"],
         "created_at":       datetime.now().isoformat(),
     }
 
-    result = db.insert("usuarios", new_user)
+    # Un solo INSERT: las restricciones UNIQUE (email, matricula, telefono_id)
+    # detectan duplicados sin consultas previas y sin carrera check-then-insert
+    try:
+        result = db.insert("usuarios", new_user)
+    except Exception as e:
+        campo = _campo_duplicado_usuario(e, new_user)
+        if campo:
+            return err(f"El {_LABELS_USUARIO[campo]} ya está registrado", 409)
+        raise
     if not result:
         return err("Error al crear el usuario", 500)
 
     user = result[0]
+    indice_disponibilidad.agregar(user)
     # Enriquecer la respuesta con los campos separados aunque no estén en DB
     user.setdefault("apellido_paterno", ap)
     user.setdefault("apellido_materno", am)
@@ -181,10 +329,76 @@ def h_register(req_obj):
         "success": True,
         "message": "Registro exitoso",
         "user": _safe_user(user),
-        "token": token(),
+        "token": token(user),
     }, 201)
 
 
+_LABELS_USUARIO = {"email": "correo electrónico",
+                   "matricula": "matrícula",
+                   "telefono_id": "dispositivo"}
+
+
+def _campo_duplicado_usuario(exc, new_user: dict):
+    """Columna duplicada de un INSERT fallido en `usuarios`, o None si el error es otro"""
+    response = getattr(exc, "response", None)
+    if response is None or response.status_code != 409:
+        return None
+    try:
+        error = response.json()
+    except ValueError:
+        error = None
+    campo = campo_duplicado(error, "usuarios", _LABELS_USUARIO)
+    if campo:
+        return campo
+    # No se pudo leer la columna del error: una sola consulta or=(...) la identifica
+    valores = {c: new_user[c] for c in _LABELS_USUARIO}
+    existentes = get_db().select("usuarios", {"or": filtro_or_eq(valores),
+                                              "select": ",".join(valores)}) or []
+    for c, v in valores.items():
+        if any(u.get(c) == v for u in existentes):
+            return c
+    return None
+
+
+def _flush_last_login(lote: dict):
+    """
+    Escribe un lote {user_id: last_login} en un solo round trip con la RPC:
+
+        create function actualizar_last_login(filas jsonb) returns void
+        language sql as $$
+          update usuarios u set last_login = (f->>'last_login')::timestamptz
+          from jsonb_array_elements(filas) f where u.id = (f->>'id')::bigint;
+        $$;
+
+    Si la función no existe, un PATCH id=in.(...) por cada valor distinto
+    (los timestamps van truncados al segundo, así que se agrupan bien).
+    """
+    global _rpc_last_login
+    db = get_db()
+    if _rpc_last_login:
+        try:
+            db.rpc("actualizar_last_login",
+                   {"filas": [{"id": uid, "last_login": ts} for uid, ts in lote.items()]})
+            return
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if response is None or response.status_code != 404:
+                raise
+            _rpc_last_login = False  # no volver a intentarla en esta instancia
+
+    por_valor = {}
+    for uid, ts in lote.items():
+        por_valor.setdefault(ts, []).append(str(uid))
+    for ts, ids in por_valor.items():
+        db.update("usuarios", {"last_login": ts}, {"id": f"in.({','.join(ids)})"})
+
+_rpc_last_login = True
+_last_login = BufferEscrituras(_flush_last_login,
+                               intervalo=float(os.getenv("LAST_LOGIN_FLUSH_S", "10")),
+                               nombre="last-login")
+
+
+@limitado("login", llave=llave_login)
 def h_login(req_obj):
     """POST /api/login"""
     data = req_obj.get_json() or {}
@@ -203,7 +417,11 @@ def h_login(req_obj):
 
     user = users[0]
 
-    if user["password_hash"] != hp(password):
+    try:
+        valida, nuevo_hash = get_pool().verificar(password, user["password_hash"], legado=hp)
+    except HashingSaturado:
+        return err_ocupado("Servidor ocupado, intenta de nuevo")
+    if not valida:
         return err("Credenciales inválidas", 401)
 
     # ── VERIFICACIÓN DE DISPOSITIVO ──────────────────
@@ -211,37 +429,50 @@ def h_login(req_obj):
     if user.get("telefono_id") and telefono_id and user["telefono_id"] != telefono_id:
         return err("Esta cuenta no pertenece a este dispositivo", 403)
 
-    # Si no tenía telefono_id, asignar este
-    if telefono_id and not user.get("telefono_id"):
-        db.update("usuarios", {"telefono_id": telefono_id}, {"id": f"eq.{user['id']}"})
-        user["telefono_id"] = telefono_id
+    ahora = datetime.now().replace(microsecond=0).isoformat()
 
-    # Actualizar last_login
-    db.update("usuarios", {"last_login": datetime.now().isoformat()}, {"id": f"eq.{user['id']}"})
+    # Cambios que deben persistir ya (teléfono nuevo, hash migrado) van en
+    # una sola escritura junto con last_login
+    cambios = {}
+    if telefono_id and not user.get("telefono_id"):
+        cambios["telefono_id"] = telefono_id
+    if nuevo_hash:
+        cambios["password_hash"] = nuevo_hash
+    if cambios:
+        db.update("usuarios", {**cambios, "last_login": ahora}, {"id": f"eq.{user['id']}"})
+        user.update(cambios)
+    else:
+        # last_login es bookkeeping: se escribe por lotes, fuera de la respuesta
+        # (en Vercel, dentro del mismo request: ver utils/write_buffer.py)
+        _last_login.registrar(user["id"], ahora)
 
     return ok({
         "success": True,
         "message": "Login exitoso",
         "user": _safe_user(user),
-        "token": token(),
+        "token": token(user),
     })
 
 
+@con_sesion()
 def h_verify(req_obj):
-    """POST /api/verify-session — verificar sesión por telefono_id"""
-    data = req_obj.get_json() or {}
-    telefono_id = data.get("telefono_id", "")
+    """POST /api/verify-session — verifica el token firmado, sin consultar la BD"""
+    data = req_obj.get_json(silent=True) or {}
+    sesion = req_obj.sesion
 
-    if not telefono_id:
+    # El token está ligado al dispositivo con el que se inició sesión
+    if data.get("telefono_id") and sesion.get("tel") and data["telefono_id"] != sesion["tel"]:
         return ok({"valid": False})
 
-    db = get_db()
-    users = db.select("usuarios", {"telefono_id": f"eq.{telefono_id}"})
+    return ok({"valid": True, "user": {"id": sesion["uid"], "rol": sesion["rol"],
+                                       "telefono_id": sesion.get("tel")}})
 
-    if not users:
-        return ok({"valid": False})
 
-    return ok({"valid": True, "user": _safe_user(users[0])})
+@con_sesion()
+def h_logout(req_obj):
+    """POST /api/logout — revoca el token actual"""
+    revocaciones.revocar(req_obj.sesion)
+    return ok({"success": True, "message": "Sesión cerrada"})
 
 
 # ── ALUMNO ────────────────────────────────────
@@ -258,7 +489,13 @@ def h_alumno_stats(req_obj, user_id: int):
         "select": "id,valida,justificada,clase_id"
     }) or []
 
-    total_clases_query = db.select("clases", {"select": "count"})
+    # Solo las clases de las materias en que está inscrito (más las que no
+    # tienen materia); sin horarios, todas como antes
+    materias = inscripciones.materias_de_alumno(user_id)
+    clases_params = {"select": "count"}
+    if materias:
+        clases_params["or"] = f"(materia_id.{_lista_in(sorted(materias))},materia_id.is.null)"
+    total_clases_query = db.select("clases", clases_params)
     total_clases = total_clases_query[0]["count"] if total_clases_query else 0
 
     presentes = sum(1 for a in asistencias if a.get("valida"))
@@ -310,6 +547,63 @@ def h_alumno_actividad(req_obj, user_id: int):
     return ok({"success": True, "actividad": result})
 
 
+# ── HISTORIAL ─────────────────────────────────
+# Keyset sobre (fecha_escaneo, id): ?cursor=&limite=&desde=&hasta=&materia_id=
+
+def _pagina_historial(req_obj, filtros: dict):
+    """Una página de `asistencias` con el filtro del dueño; -> (filas, cursor)"""
+    args = req_obj.args
+    limite = leer_limite(args.get("limite"))
+    params = params_pagina(args.get("cursor"), args.get("desde"), args.get("hasta"), limite)
+    params.update(filtros)
+    return cortar_pagina(get_db().select("asistencias", params) or [], limite)
+
+def _buscar_ids(tabla: str, ids, columnas: str):
+    return get_db().select(tabla, {"id": _lista_in(ids), "select": columnas})
+
+@con_sesion(roles=("alumno",))
+def h_alumno_historial(req_obj, user_id: int):
+    """GET /api/alumno/<id>/historial"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
+    filtros = {"alumno_id": f"eq.{user_id}"}
+    materia_id = req_obj.args.get("materia_id")
+    if materia_id:
+        clase_ids = [c["id"] for c in get_db().select("clases", {
+            "materia_id": f"eq.{int(materia_id)}", "select": "id"
+        }) or []]
+        if not clase_ids:
+            return ok({"success": True, "historial": [], "siguiente": None})
+        filtros["clase_id"] = _lista_in(clase_ids)
+
+    filas, siguiente = _pagina_historial(req_obj, filtros)
+    return ok({"success": True, "historial": detalle_pagina(filas, _buscar_ids), "siguiente": siguiente})
+
+@con_sesion(roles=("profesor",))
+def h_profesor_historial(req_obj, user_id: int):
+    """GET /api/profesor/<id>/historial (?alumno_id= para un solo alumno)"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
+    # Las clases del profesor ya están en los conteos precargados
+    clases = conteos.de_profesor(user_id).clases
+    materia_id = req_obj.args.get("materia_id")
+    clase_ids = sorted(c for c, m in clases.items()
+                       if not materia_id or str(m) == str(int(materia_id)))
+    if not clase_ids:
+        return ok({"success": True, "historial": [], "siguiente": None})
+
+    filtros = {"clase_id": _lista_in(clase_ids)}
+    alumno_id = req_obj.args.get("alumno_id")
+    if alumno_id:
+        filtros["alumno_id"] = f"eq.{int(alumno_id)}"
+
+    filas, siguiente = _pagina_historial(req_obj, filtros)
+    return ok({"success": True, "historial": detalle_pagina(filas, _buscar_ids, con_alumno=True),
+               "siguiente": siguiente})
+
+
 def h_alumno_horario(req_obj, user_id: int):
     """GET /api/alumno/<id>/horario"""
     db = get_db()
@@ -335,11 +629,14 @@ def h_alumno_horario(req_obj, user_id: int):
 
 # ── CLASE / QR ────────────────────────────────
 
+@con_sesion(roles=("profesor",))
 def h_clase_activa(req_obj):
-    """GET /api/clase/activa?profesor_id=X"""
+    """GET /api/clase/activa?profesor_id=X — sin el token del QR (ver qr-token)"""
     profesor_id = req_obj.args.get("profesor_id")
     if not profesor_id:
         return err("profesor_id requerido")
+    if not _es_propietario(req_obj, profesor_id):
+        return err("No autorizado", 403)
 
     db = get_db()
     clases = db.select("clases", {
@@ -369,9 +666,15 @@ def h_clase_activa(req_obj):
             })
             a["alumno"] = alumnos[0] if alumnos else None
 
-    return ok({"success": True, "clase": clase, "asistencias": asistencias})
+    return ok({
+        "success": True,
+        "clase": clase,
+        "asistencias": asistencias,
+        "qr_rotacion_s": QR_WINDOW_SECONDS,
+    })
 
 
+@con_sesion(roles=("profesor",), sensible=True)
 def h_clase_iniciar(req_obj):
     """POST /api/clase/iniciar"""
     data = req_obj.get_json() or {}
@@ -380,10 +683,23 @@ def h_clase_iniciar(req_obj):
     longitud = data.get("longitud")
     titulo = data.get("titulo", "Clase")
     materia_id = data.get("materia_id")
+    geocerca = data.get("geocerca")  # opcional: [[lat, lon], ...] para aulas irregulares
 
     if not profesor_id:
         return err("profesor_id requerido")
 
+    if not _es_propietario(req_obj, profesor_id):
+        return err("No autorizado", 403)
+
+    if geocerca is not None:
+        try:
+            geocerca = validar_poligono(geocerca)
+        except ValueError as e:
+            return err(str(e))
+
+    # Sin QR_SECRET no habría QR que proyectar: fallar (503) antes de tocar la BD
+    exigir_secreto()
+
     db = get_db()
 
     # Terminar cualquier clase activa anterior del mismo profe
@@ -394,9 +710,11 @@ def h_clase_iniciar(req_obj):
     for c in clases_activas:
         db.update("clases", {"activa": False, "hora_fin": datetime.now().strftime("%H:%M:%S")},
                   {"id": f"eq.{c['id']}"})
+        _clases_cache.pop(c["id"])
+        _geocercas.pop(c["id"])
+        _clases_terminadas.set(c["id"], True)
+    marcar_pendientes(db, {c["id"] for c in clases_activas})
 
-    # Generar token único para el QR
-    qr_token = token()
     ahora = datetime.now()
 
     nueva_clase = {
@@ -404,22 +722,82 @@ def h_clase_iniciar(req_obj):
         "fecha": ahora.strftime("%Y-%m-%d"),
         "hora_inicio": ahora.strftime("%H:%M:%S"),
         "activa": True,
-        "qr_code": qr_token,
         "latitud_referencia": latitud,
         "longitud_referencia": longitud,
         "titulo": titulo,
         "materia_id": materia_id,
         "created_at": ahora.isoformat(),
     }
+    if geocerca:
+        nueva_clase["geocerca"] = geocerca  # columna nueva (ALTER TABLE clases ADD geocerca jsonb)
 
     result = db.insert("clases", nueva_clase)
     if not result:
         return err("Error al iniciar clase", 500)
 
     clase = result[0]
-    return ok({"success": True, "clase": clase, "qr_token": qr_token}, 201)
+    _clases_cache.set(clase["id"], clase)
+    conteos.clase_creada(clase["profesor_id"], clase["id"], clase.get("materia_id"))
+    pdfs.invalidar(clase["profesor_id"])
+    get_geocerca(clase)  # precalcular la proyección antes del primer escaneo
+    # Una clase sin escaneos también necesita su fila de rollup (todos ausentes)
+    marcar_pendientes(db, {clase["id"]})
+    return ok({
+        "success": True,
+        "clase": clase,
+        "qr_token": emitir_token(clase["id"]),
+        "qr_rotacion_s": QR_WINDOW_SECONDS,
+    }, 201)
+
+
+@con_sesion(roles=("profesor",))
+def h_clase_qr_token(req_obj, clase_id: int):
+    """GET /api/clase/<id>/qr-token — token vigente para proyectar; solo el profesor de la clase"""
+    clase = get_clase_activa(clase_id)
+    if not clase or not _es_propietario(req_obj, clase.get("profesor_id")):
+        return err("Clase no encontrada o no autorizada", 404)
+
+    return ok({
+        "success": True,
+        "qr_token": emitir_token(clase_id),
+        "expira_en": segundos_restantes(),
+        "qr_rotacion_s": QR_WINDOW_SECONDS,
+    })
+
+
+@con_sesion(roles=("profesor",))
+def h_clase_qr_imagen(req_obj, clase_id: int):
+    """
+    GET /api/clase/<id>/qr?formato=svg|png — imagen del QR rotativo. La imagen
+    lleva el token de la ventana actual: se cachea (y se valida por ETag) solo
+    hasta la siguiente rotación.
+    """
+    formato = req_obj.args.get("formato", "svg")
+    if formato not in MIMETYPES:
+        return err("Formato inválido (svg o png)")
+    clase = get_clase_activa(clase_id)
+    if not clase or not _es_propietario(req_obj, clase.get("profesor_id")):
+        return err("Clase no encontrada o no autorizada", 404)
+
+    renderer = get_qr_renderer()
+    ahora = datetime.now().timestamp()
+    token = emitir_token(clase_id, ahora)
+    renderer.registrar_clase(clase_id, token)
+    expira = segundos_restantes(ahora)
+
+    headers = {
+        **cors(),
+        "Content-Type": MIMETYPES[formato],
+        "Cache-Control": f"private, max-age={expira}",
+        "ETag": f'"{renderer.etag(token, formato)}"',
+        "X-QR-Expira": str(expira),
+    }
+    if req_obj.headers.get("If-None-Match") == headers["ETag"]:
+        return ("", 304, headers)
+    return (renderer.render(token, formato), 200, headers)
 
 
+@con_sesion(roles=("profesor",), sensible=True)
 def h_clase_terminar(req_obj):
     """POST /api/clase/terminar"""
     data = req_obj.get_json() or {}
@@ -427,18 +805,29 @@ def h_clase_terminar(req_obj):
     if not clase_id:
         return err("clase_id requerido")
 
+    clase = get_clase_activa(int(clase_id))
+    if clase and not _es_propietario(req_obj, clase.get("profesor_id")):
+        return err("No autorizado", 403)
+
     db = get_db()
     result = db.update("clases", {
         "activa": False,
         "hora_fin": datetime.now().strftime("%H:%M:%S"),
         "qr_code": None,  # Invalidar QR al terminar
     }, {"id": f"eq.{clase_id}"})
+    _clases_cache.pop(int(clase_id))
+    _geocercas.pop(int(clase_id))
+    _clases_terminadas.set(int(clase_id), True)
+    get_qr_renderer().evict_clase(int(clase_id))
+    marcar_pendientes(db, {clase_id})
 
     return ok({"success": True, "message": "Clase terminada"})
 
 
 # ── ASISTENCIA ────────────────────────────────
 
+@idempotente(_idempotencia, error=err)
+@limitado("asistencia")
 def h_registrar_asistencia(req_obj):
     """POST /api/registrar-asistencia"""
     data = req_obj.get_json() or {}
@@ -451,17 +840,16 @@ def h_registrar_asistencia(req_obj):
     if not qr_token or not alumno_id:
         return err("qr_token y alumno_id requeridos")
 
-    db = get_db()
+    # 1. Validar el token firmado (sin consultar la BD) y resolver la clase
+    clase_id = verificar_token(qr_token)
+    if clase_id is None:
+        return err("QR inválido o expirado, escanea el código actual", 400)
 
-    # 1. Buscar clase activa con ese QR
-    clases = db.select("clases", {
-        "qr_code": f"eq.{qr_token}",
-        "activa": "eq.true"
-    })
-    if not clases:
+    clase = get_clase_activa(clase_id)
+    if not clase:
         return err("QR inválido o clase ya finalizada", 400)
 
-    clase = clases[0]
+    db = get_db()
 
     # 2. Verificar dispositivo del alumno
     alumnos = db.select("usuarios", {"id": f"eq.{alumno_id}"})
@@ -480,17 +868,14 @@ def h_registrar_asistencia(req_obj):
     if existente:
         return err("Ya registraste asistencia en esta clase", 409)
 
-    # 4. Calcular distancia si hay coordenadas
+    # 4. Validar ubicación contra la geocerca precalculada de la clase
     distancia = None
     valida = True
-    RADIO_MAX = 50  # metros (GPS es impreciso en interiores, usamos 50m)
-
-    if latitud and longitud and clase.get("latitud_referencia") and clase.get("longitud_referencia"):
-        distancia = haversine(
-            float(latitud), float(longitud),
-            float(clase["latitud_referencia"]), float(clase["longitud_referencia"])
-        )
-        if distancia is not None and distancia > RADIO_MAX:
+
+    geocerca = get_geocerca(clase)
+    if latitud and longitud and geocerca is not None:
+        dentro, distancia = geocerca.contiene(latitud, longitud)
+        if not dentro:
             return err(f"Estás demasiado lejos del aula ({distancia:.0f}m). Máximo permitido: {RADIO_MAX}m", 400)
 
     # 5. Registrar asistencia
@@ -508,6 +893,8 @@ def h_registrar_asistencia(req_obj):
     result = db.insert("asistencias", nueva)
     if not result:
         return err("Error al registrar asistencia", 500)
+    conteos.cambio(clase["profesor_id"], int(alumno_id), FALTA, estado_de(nueva))
+    pdfs.invalidar(clase["profesor_id"])
 
     au = _parse_nombre(alumno)
     return ok({
@@ -529,31 +916,261 @@ def h_registrar_asistencia(req_obj):
     }, 201)
 
 
+@limitado("asistencia")
+@con_sesion(roles=("alumno",))
+def h_sincronizar_asistencias(req_obj):
+    """POST /api/asistencias/sincronizar — escaneos capturados sin conexión (sesión del alumno)"""
+    data = req_obj.get_json() or {}
+    alumno_id = data.get("alumno_id")
+    telefono_id = data.get("telefono_id")
+    escaneos = data.get("escaneos")
+
+    if not alumno_id or not isinstance(escaneos, list) or not escaneos:
+        return err("alumno_id y escaneos requeridos")
+    if not _es_propietario(req_obj, alumno_id):
+        return err("No autorizado", 403)
+    if len(escaneos) > MAX_LOTE:
+        return err(f"Máximo {MAX_LOTE} escaneos por lote", 413)
+    if not all(isinstance(e, dict) for e in escaneos):
+        return err("Formato de escaneos inválido")
+
+    db = get_db()
+    alumnos = db.select("usuarios", {"id": f"eq.{alumno_id}", "select": "id,telefono_id"})
+    if not alumnos:
+        return err("Alumno no encontrado", 404)
+    if alumnos[0].get("telefono_id") and telefono_id and alumnos[0]["telefono_id"] != telefono_id:
+        return err("Esta cuenta no pertenece a este dispositivo", 403)
+
+    clases = {}
+
+    def cargar_clases(ids):
+        rows = db.select("clases", {"id": f"in.({','.join(map(str, ids))})"})
+        clases.update((c["id"], c) for c in rows)
+        return clases
+
+    def ya_registradas(ids):
+        rows = db.select("asistencias", {"alumno_id": f"eq.{alumno_id}",
+                                         "clase_id": f"in.({','.join(map(str, ids))})",
+                                         "select": "clase_id"})
+        return {r["clase_id"] for r in rows}
+
+    resultados, filas = validar_lote(escaneos, alumno_id, cargar_clases, ya_registradas,
+                                     lambda clase: geocerca_de_clase(clase, RADIO_MAX))
+
+    if filas:
+        # Un solo INSERT para todo el lote. Si un escaneo en línea se coló
+        # entre la validación y el INSERT (UNIQUE clase_id+alumno_id), se
+        # vuelve a consultar y se reintenta una vez sin esas clases.
+        try:
+            db.insert("asistencias", filas)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if response is None or response.status_code != 409:
+                raise
+            repetidas = ya_registradas([f["clase_id"] for f in filas])
+            filas = [f for f in filas if f["clase_id"] not in repetidas]
+            for r in resultados:
+                if r["estado"] == REGISTRADA and r["clase_id"] in repetidas:
+                    r.update(estado=DUPLICADA, message="Ya registraste asistencia en esta clase")
+            if filas:
+                db.insert("asistencias", filas)
+        for f in filas:
+            conteos.cambio(clases[f["clase_id"]]["profesor_id"], int(alumno_id), FALTA, PRESENTE)
+            pdfs.invalidar(clases[f["clase_id"]]["profesor_id"])
+        # La hora de captura puede quedar atrás de la marca de agua del rollup
+        marcar_pendientes(db, {f["clase_id"] for f in filas})
+
+    return ok({
+        "success": True,
+        "registradas": sum(r["estado"] == REGISTRADA for r in resultados),
+        "resultados": resultados,
+    })
+
+
+# ── TENDENCIAS (ROLLUPS) ──────────────────────
+
+@con_sesion(roles=("profesor",))
+def h_profesor_tendencias(req_obj, user_id: int):
+    """GET /api/profesor/<id>/tendencias?desde=&hasta=&materia_id=&agrupar=dia|semana&alumno_id=
+    Lee solo las tablas de rollup (utils/rollups.py), nunca `asistencias`.
+    """
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
+    args = req_obj.args
+    agrupar = args.get("agrupar", "semana")
+    if agrupar not in ("dia", "semana"):
+        return err("agrupar debe ser 'dia' o 'semana'")
+    desde, hasta = args.get("desde"), args.get("hasta")
+    materia_id = args.get("materia_id")
+    alumno_id = args.get("alumno_id")
+    db = get_db()
+
+    if alumno_id:
+        # Serie semanal de un alumno
+        params = {"profesor_id": f"eq.{user_id}", "alumno_id": f"eq.{int(alumno_id)}",
+                  "select": "semana,materia_id,clases,presentes,justificadas,ausentes,distancia_promedio",
+                  "order": "semana.asc"}
+        columna = "semana"
+        tabla = "rollup_alumnos_semana"
+    else:
+        params = {"profesor_id": f"eq.{user_id}",
+                  "select": "fecha,semana,materia_id,presentes,justificadas,ausentes,distancia_promedio",
+                  "order": "fecha.asc"}
+        columna = "fecha"
+        tabla = "rollup_clases"
+    if materia_id:
+        params["materia_id"] = f"eq.{int(materia_id)}"
+    rango = []
+    if desde:
+        rango.append(f"{columna}.gte.{datetime.strptime(desde, '%Y-%m-%d').date()}")
+    if hasta:
+        rango.append(f"{columna}.lte.{datetime.strptime(hasta, '%Y-%m-%d').date()}")
+    if rango:
+        params["and"] = f"({','.join(rango)})"
+
+    filas = db.select(tabla, params) or []
+    if alumno_id:
+        serie = [{**f, "tasa": round((f["presentes"] + f["justificadas"]) / f["clases"] * 100, 1)
+                  if f.get("clases") else None} for f in filas]
+    else:
+        serie = tendencias(filas, agrupar)
+
+    estado = db.select("rollup_estado", {"nombre": "eq.asistencias", "select": "actualizado"}) or []
+    return ok({
+        "success": True,
+        "tendencias": serie,
+        "actualizado": estado[0]["actualizado"] if estado else None,
+    })
+
+
+# ── ANALÍTICA ─────────────────────────────────
+
+def _entero(valor, default: int, minimo: int, maximo: int) -> int:
+    try:
+        return min(max(int(valor), minimo), maximo) if valor not in (None, "") else default
+    except (TypeError, ValueError):
+        return default
+
+def _redondear(x):
+    return None if x is None or x != x else round(float(x), 1)  # NaN -> None
+
+@con_sesion(roles=("profesor",))
+def h_profesor_analitica(req_obj, user_id: int):
+    """GET /api/profesor/<id>/analitica?materia_id=&clases_restantes=&ventana=
+    Tasa, tasa reciente, rachas de faltas, cambio semanal y proyección al
+    final del término de cada alumno, calculadas sobre la matriz completa
+    alumnos × clases (utils/analytics.py).
+    """
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+    # NumPy solo se importa en esta ruta: no encarece el cold start de las demás
+    from utils import analytics
+
+    args = req_obj.args
+    materia_id = args.get("materia_id")
+    if materia_id and not materia_id.isdigit():
+        return err("materia_id inválido")
+    restantes = _entero(args.get("clases_restantes"), 0, 0, 500)
+    ventana = _entero(args.get("ventana"), 5, 1, 50)
+    db = get_db()
+
+    params = {"profesor_id": f"eq.{user_id}", "select": "id,fecha,materia_id", "order": "fecha.asc,id.asc"}
+    if materia_id:
+        params["materia_id"] = f"eq.{materia_id}"
+    clases = db.select("clases", params) or []
+    alumnos = _alumnos_inscritos(user_id, int(materia_id) if materia_id else None,
+                                 order="apellido_paterno.asc")
+    filas = []
+    if clases and alumnos:
+        filas = db.select("asistencias", {"clase_id": _lista_in([c["id"] for c in clases]),
+                                          "select": "alumno_id,clase_id,valida,justificada"}) or []
+
+    # Clases de materias que el alumno no lleva no cuentan (igual que el reporte)
+    inscritos = inscripciones.de_profesor(user_id)
+    aplica = None
+    if inscritos.por_alumno:
+        aplica = [[c.get("materia_id") is None or c.get("materia_id") in inscritos.materias_de(a["id"])
+                   for c in clases] for a in alumnos]
+    m = analytics.construir_matriz([a["id"] for a in alumnos], [c["id"] for c in clases], filas, aplica)
+    semanas = [semana_de(c["fecha"]).toordinal() for c in clases]
+    r = analytics.analizar(m, semanas, clases_restantes=restantes, ventana=ventana)
+
+    resultado, categorias = [], {c: 0 for c in analytics.CATEGORIAS}
+    for i, alumno in enumerate(alumnos):
+        u = _parse_nombre(alumno)
+        categorias[r["categoria_proyectada"][i]] += 1
+        resultado.append({
+            "id":                alumno["id"],
+            "matricula":         alumno["matricula"],
+            "nombre":            alumno.get("nombre"),
+            "apellido_paterno":  u["apellido_paterno"],
+            "apellido_materno":  u["apellido_materno"],
+            "tasa":              _redondear(r["tasa"][i]),
+            "tasa_reciente":     _redondear(r["tasa_reciente"][i]),
+            "racha_actual":      int(r["racha_actual"][i]),
+            "racha_maxima":      int(r["racha_maxima"][i]),
+            "delta_semanal":     _redondear(r["delta_semanal"][i]),
+            "proyeccion":        _redondear(r["proyeccion"][i]),
+            "proyeccion_maxima": _redondear(r["proyeccion_maxima"][i]),
+            "categoria":         str(r["categoria_proyectada"][i]),
+            "alcanza_ordinario":      bool(r["alcanza_ordinario"][i]),
+            "alcanza_extraordinario": bool(r["alcanza_extraordinario"][i]),
+        })
+
+    return ok({
+        "success": True,
+        "analitica": {
+            "total_alumnos":    len(alumnos),
+            "total_clases":     len(clases),
+            "clases_restantes": restantes,
+            "ventana":          ventana,
+            "categorias":       categorias,
+            "alumnos":          resultado,
+        },
+    })
+
+
+def h_cron_rollups(req_obj):
+    """GET /api/cron/rollups — corrida incremental (Vercel Cron, con CRON_SECRET)"""
+    secreto = os.getenv("CRON_SECRET", "")
+    recibido = req_obj.headers.get("Authorization", "")
+    if not secreto or not hmac.compare_digest(recibido, f"Bearer {secreto}"):
+        return err("No autorizado", 401)
+    return ok({"success": True, "rollup": TrabajoRollup(get_db()).ejecutar()})
+
+
 # ── PROFESOR DASHBOARD ────────────────────────
 
+@con_sesion(roles=("profesor",))
+@coalescer(_vuelos)
 def h_profesor_dashboard(req_obj, user_id: int):
     """GET /api/profesor/<id>/dashboard"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
     db = get_db()
 
     profesores = db.select("usuarios", {"id": f"eq.{user_id}", "rol": "eq.profesor"})
     if not profesores:
         return err("Profesor no encontrado", 404)
 
-    alumnos = db.select("usuarios", {"rol": "eq.alumno", "select": "id,matricula,nombre,apellido_paterno,apellido_materno"}) or []
-    total_clases_q = db.select("clases", {"profesor_id": f"eq.{user_id}", "select": "count"})
-    total_clases = total_clases_q[0]["count"] if total_clases_q else 0
+    # Solo los alumnos inscritos en sus materias (índice de `horarios`)
+    alumnos = _alumnos_inscritos(user_id)
+    inscritos = inscripciones.de_profesor(user_id)
+    # Conteos precargados del profesor (se ajustan con escaneos y justificaciones)
+    resumen = conteos.de_profesor(user_id)
+    total_clases = resumen.total_clases()
 
     categorias = {"excelente": 0, "riesgo": 0, "sin_ordinario": 0, "sin_extraordinario": 0}
     alumnos_info = []
 
     for alumno in alumnos:
-        asis = db.select("asistencias", {
-            "alumno_id": f"eq.{alumno['id']}",
-            "valida": "eq.true",
-            "select": "id"
-        }) or []
-        presentes = len(asis)
-        pct = round((presentes / total_clases) * 100) if total_clases > 0 else 0
+        presentes, justificadas = resumen.de_alumno(alumno["id"])
+        # Denominador: las clases de las materias que lleva el alumno
+        materias = inscritos.materias_de(alumno["id"]) if inscritos.por_alumno else None
+        clases_alumno = resumen.total_clases(materias)
+        # Una falta justificada cuenta como asistencia para el porcentaje
+        pct = round(((presentes + justificadas) / clases_alumno) * 100) if clases_alumno > 0 else 0
 
         if pct >= 90:
             categorias["excelente"] += 1
@@ -576,6 +1193,7 @@ def h_profesor_dashboard(req_obj, user_id: int):
             "apellido_paterno": u["apellido_paterno"],
             "apellido_materno": u["apellido_materno"],
             "asistencias": presentes,
+            "justificadas": justificadas,
             "porcentaje":  pct,
             "estado":      estado,
         })
@@ -590,13 +1208,114 @@ def h_profesor_dashboard(req_obj, user_id: int):
                               key=lambda x: (x.get("apellido_paterno",""),
                                              x.get("apellido_materno",""),
                                              x.get("nombre","")))
-        }
+        },
+        # Altas y bajas en `horarios` se reflejan a lo más tras este tiempo
+        "inscripciones_ttl_s": inscripciones.ttl,
+    })
+
+
+MAX_JUSTIFICACIONES = 5000
+
+@con_sesion(roles=("profesor",), sensible=True)
+def h_justificar(req_obj, user_id: int):
+    """
+    POST /api/profesor/<id>/justificar
+
+    Cuerpo: {"pares": [{"alumno_id", "clase_id"}, ...]}
+        o   {"alumnos": [ids], "desde": "YYYY-MM-DD", "hasta": "YYYY-MM-DD", "materia_id"?}
+
+    Las faltas se marcan justificadas con un solo upsert (requiere
+    UNIQUE (clase_id, alumno_id) en `asistencias`); las asistencias válidas
+    no se tocan. Los conteos del dashboard se ajustan sin recontar.
+    """
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
+    data = req_obj.get_json() or {}
+    db = get_db()
+    clases_params = {"profesor_id": f"eq.{user_id}", "select": "id,fecha,hora_inicio"}
+
+    if data.get("pares"):
+        try:
+            pares = {(int(p["alumno_id"]), int(p["clase_id"])) for p in data["pares"]}
+        except (KeyError, TypeError, ValueError):
+            return err("Cada par requiere alumno_id y clase_id numéricos")
+        pedidas = sorted({c for _, c in pares})
+        clases_params["id"] = f"in.({','.join(map(str, pedidas))})"
+        propias = {c["id"]: c for c in db.select("clases", clases_params)}
+        if len(propias) != len(pedidas):
+            return err("Alguna clase no existe o no es tuya", 403)
+    elif data.get("alumnos") and data.get("desde") and data.get("hasta"):
+        clases_params["and"] = (f"(fecha.gte.{valor_filtro(data['desde'])},"
+                                f"fecha.lte.{valor_filtro(data['hasta'])})")
+        if data.get("materia_id"):
+            clases_params["materia_id"] = f"eq.{int(data['materia_id'])}"
+        propias = {c["id"]: c for c in db.select("clases", clases_params)}
+        try:
+            pares = {(int(a), c) for a in data["alumnos"] for c in propias}
+        except (TypeError, ValueError):
+            return err("alumnos debe ser una lista de ids")
+    else:
+        return err("Envía pares o alumnos + desde + hasta")
+
+    # Con horarios cargados, solo alumnos inscritos en sus materias
+    roster = inscripciones.de_profesor(user_id).roster()
+    if roster and any(a not in roster for a, _ in pares):
+        return err("Algún alumno no está inscrito en tus materias", 403)
+
+    if not pares:
+        return ok({"success": True, "justificadas": 0, "sin_cambio": 0})
+    if len(pares) > MAX_JUSTIFICACIONES:
+        return err(f"Máximo {MAX_JUSTIFICACIONES} registros por solicitud", 413)
+
+    # Estado actual de esos pares: una consulta
+    alumnos = sorted({a for a, _ in pares})
+    existentes = db.select("asistencias", {
+        "clase_id": f"in.({','.join(map(str, sorted(propias)))})",
+        "alumno_id": f"in.({','.join(map(str, alumnos))})",
+        "select": "clase_id,alumno_id,valida,justificada,fecha_escaneo",
+    }) or []
+    previo = {(a["alumno_id"], a["clase_id"]): estado_de(a) for a in existentes}
+    escaneos = {(a["alumno_id"], a["clase_id"]): a.get("fecha_escaneo") for a in existentes}
+
+    def fecha_de(par):
+        # El historial pagina y filtra por fecha_escaneo: una falta justificada
+        # sin escaneo toma la hora de inicio de su clase; un escaneo fuera de
+        # rango conserva la suya
+        if escaneos.get(par):
+            return escaneos[par]
+        clase = propias[par[1]]
+        return f"{clase['fecha']}T{clase.get('hora_inicio') or '00:00:00'}"
+
+    # Solo las faltas cambian; presentes y ya justificadas se quedan igual
+    faltas = sorted(p for p in pares if previo.get(p, FALTA) == FALTA)
+    if faltas:
+        db.upsert("asistencias", [
+            {"clase_id": c, "alumno_id": a, "valida": False, "justificada": True,
+             "fecha_escaneo": fecha_de((a, c))}
+            for a, c in faltas
+        ], on_conflict="clase_id,alumno_id")
+        for a, _ in faltas:
+            conteos.cambio(user_id, a, FALTA, JUSTIFICADA)
+        pdfs.invalidar(user_id)
+        marcar_pendientes(db, {c for _, c in faltas})
+
+    return ok({
+        "success": True,
+        "justificadas": len(faltas),
+        "sin_cambio": len(pares) - len(faltas),
     })
 
 
+@con_sesion(roles=("profesor",))
+@coalescer(_vuelos)
 def h_clase_asistencias(req_obj, clase_id: int):
-    """GET /api/clase/<id>/asistencias"""
+    """GET /api/clase/<id>/asistencias — solo el profesor de la clase"""
     db = get_db()
+    clase = get_clase_activa(clase_id) or (db.select("clases", {"id": f"eq.{clase_id}",
+                                                                "select": "profesor_id"}) or [None])[0]
+    if not clase or not _es_propietario(req_obj, clase.get("profesor_id")):
+        return err("Clase no encontrada o no autorizada", 404)
     asistencias = db.select("asistencias", {
         "clase_id": f"eq.{clase_id}",
         "select": "id,alumno_id,fecha_escaneo,valida,distancia_metros",
@@ -617,18 +1336,29 @@ def h_clase_asistencias(req_obj, clase_id: int):
     return ok({"success": True, "asistencias": result})
 
 
+@con_sesion(roles=("profesor",))
+@coalescer(_vuelos)
 def h_reporte_pdf_data(req_obj, user_id: int):
     """GET /api/profesor/<id>/reporte — datos para generar PDF
        Query param opcional: ?materia_id=X para filtrar por materia
+       Cursos grandes: POST /api/profesor/<id>/reporte/trabajos (en segundo plano)
     """
-    db = get_db()
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
     materia_id = req_obj.args.get("materia_id")
+    if materia_id and not materia_id.isdigit():
+        return err("materia_id inválido")
+    return ok({"success": True, "reporte": _generar_reporte(user_id, int(materia_id) if materia_id else None),
+               "inscripciones_ttl_s": inscripciones.ttl})
 
-    alumnos = db.select("usuarios", {
-        "rol": "eq.alumno",
-        "select": "id,matricula,nombre,apellido_paterno,apellido_materno",
-        "order": "apellido_paterno.asc"
-    }) or []
+
+def _generar_reporte(user_id: int, materia_id=None, progreso=None):
+    """Tabla P/J/F/- por alumno y clase; `progreso(fraccion, mensaje)` opcional"""
+    avanzar = progreso or (lambda *_: None)
+    db = get_db()
+    avanzar(0.05, "Cargando alumnos")
+    alumnos = _alumnos_inscritos(user_id, materia_id, order="apellido_paterno.asc")
+    inscritos = inscripciones.de_profesor(user_id)
 
     # Clases del profesor, filtradas por materia si se especifica
     clases_params = {
@@ -639,10 +1369,24 @@ def h_reporte_pdf_data(req_obj, user_id: int):
     if materia_id:
         clases_params["materia_id"] = f"eq.{materia_id}"
 
+    avanzar(0.15, "Cargando clases")
     clases = db.select("clases", clases_params) or []
 
+    # Todas las asistencias de esas clases en una sola consulta
+    asis_por_alumno = {}
+    if clases and alumnos:
+        avanzar(0.3, "Cargando asistencias")
+        for a in db.select("asistencias", {
+            "clase_id": _lista_in([c["id"] for c in clases]),
+            "select": "alumno_id,clase_id,valida,justificada",
+        }) or []:
+            asis_por_alumno.setdefault(a["alumno_id"], {})[a["clase_id"]] = a
+
     tabla = []
-    for alumno in alumnos:
+    paso = max(len(alumnos) // 20, 1)
+    for n, alumno in enumerate(alumnos):
+        if n % paso == 0:
+            avanzar(0.5 + 0.45 * n / len(alumnos), f"Alumno {n + 1} de {len(alumnos)}")
         u = _parse_nombre(alumno)
         fila = {
             "id":               alumno["id"],
@@ -652,15 +1396,14 @@ def h_reporte_pdf_data(req_obj, user_id: int):
             "apellido_materno": u["apellido_materno"],
             "clases": {}
         }
-        asis_alumno = db.select("asistencias", {
-            "alumno_id": f"eq.{alumno['id']}",
-            "select": "clase_id,valida,justificada"
-        }) or []
-
-        asis_por_clase = {a["clase_id"]: a for a in asis_alumno}
+        asis_por_clase = asis_por_alumno.get(alumno["id"], {})
+        materias = inscritos.materias_de(alumno["id"]) if inscritos.por_alumno else None
         for clase in clases:
             a = asis_por_clase.get(clase["id"])
-            if a:
+            if materias is not None and clase.get("materia_id") not in materias \
+                    and clase.get("materia_id") is not None and not a:
+                fila["clases"][clase["id"]] = "-"  # clase de una materia que no lleva
+            elif a:
                 fila["clases"][clase["id"]] = "P" if a.get("valida") else ("J" if a.get("justificada") else "F")
             else:
                 fila["clases"][clase["id"]] = "F"
@@ -674,14 +1417,103 @@ def h_reporte_pdf_data(req_obj, user_id: int):
         x.get("nombre", "").upper(),
     ))
 
-    return ok({
-        "success": True,
-        "reporte": {
-            "clases":    clases,
-            "alumnos":   tabla,
-            "generado":  datetime.now().isoformat()
+    return {
+        "clases":    clases,
+        "alumnos":   tabla,
+        "generado":  datetime.now().isoformat()
+    }
+
+
+# PDFs del reporte por (profesor, materia, versión de datos)
+pdfs = CachePDF()
+
+@con_sesion(roles=("profesor",))
+def h_reporte_pdf(req_obj, user_id: int):
+    """GET /api/profesor/<id>/reporte/pdf?materia_id=X
+    PDF generado en el servidor y transmitido por páginas. Una descarga
+    repetida sin escrituras de por medio sale de caché sin armar el reporte
+    (o 304 con If-None-Match).
+    """
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+    materia_id = req_obj.args.get("materia_id")
+    if materia_id and not materia_id.isdigit():
+        return err("materia_id inválido")
+    materia_id = int(materia_id) if materia_id else None
+
+    def respuesta(huella, cuerpo=None):
+        headers = {
+            **cors(),
+            "Content-Type": "application/pdf",
+            "Content-Disposition": f'attachment; filename="reporte_asistencias_{date.today().isoformat()}.pdf"',
+            "Cache-Control": "private, no-cache",
+            "ETag": f'"{huella}"',
         }
-    })
+        if req_obj.headers.get("If-None-Match") == headers["ETag"]:
+            return ("", 304, headers)
+        if isinstance(cuerpo, bytes):
+            headers["Content-Length"] = str(len(cuerpo))
+        return (cuerpo, 200, headers)
+
+    # Sin escrituras desde la última descarga: ni reporte ni PDF que armar
+    llave = pdfs.llave(user_id, materia_id)
+    previo = pdfs.reciente(llave)
+    if previo is not None:
+        return respuesta(*previo)
+
+    db = get_db()
+    reporte = _generar_reporte(user_id, materia_id)
+    titulo = "REPORTE DE ASISTENCIAS"
+    if materia_id:
+        materia = db.select("materias", {"id": f"eq.{materia_id}", "profesor_id": f"eq.{user_id}",
+                                         "select": "nombre"})
+        if materia:
+            titulo += f" — {materia[0]['nombre']}"
+    profesor = db.select("usuarios", {"id": f"eq.{user_id}", "select": "nombre"}) or [{}]
+    subtitulo = f"Generado: {date.today().strftime('%d/%m/%Y')} · Profesor: {profesor[0].get('nombre') or ''}"
+
+    huella = version_reporte(reporte, titulo, subtitulo)
+    if req_obj.headers.get("If-None-Match") == f'"{huella}"':
+        return respuesta(huella)
+    return respuesta(huella, pdfs.servir(llave, huella, lambda: generar_pdf(reporte, titulo, subtitulo)))
+
+
+# Reportes en segundo plano: pool acotado, deduplicación y resultados con TTL.
+# En Vercel (JOB_BACKGROUND=0) el trabajo corre dentro del POST: ver utils/jobs.py
+trabajos = ColaTrabajos()
+REPORT_JOB_WAIT_S = float(os.getenv("REPORT_JOB_WAIT_S", "2"))
+
+@con_sesion(roles=("profesor",))
+def h_reporte_trabajo_crear(req_obj, user_id: int):
+    """POST /api/profesor/<id>/reporte/trabajos  {materia_id?}
+    202 con el trabajo pendiente, o 200 si terminó durante la espera corta.
+    """
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+    data = req_obj.get_json(silent=True) or {}
+    materia_id = str(data.get("materia_id") or req_obj.args.get("materia_id") or "")
+    if materia_id and not materia_id.isdigit():
+        return err("materia_id inválido")
+    materia_id = int(materia_id) if materia_id else None
+
+    try:
+        trabajo, _ = trabajos.encolar(("reporte", user_id, materia_id), _generar_reporte,
+                                      user_id, materia_id, dueno=user_id)
+    except ColaLlena:
+        return err_ocupado("Hay demasiados reportes en proceso, intenta en unos segundos", 5)
+    trabajo.esperar(REPORT_JOB_WAIT_S)
+    return ok({"success": True, "trabajo": trabajo.a_dict()}, 202 if trabajo.activo else 200)
+
+
+@con_sesion(roles=("profesor",))
+def h_reporte_trabajo(req_obj, user_id: int, trabajo_id: str):
+    """GET /api/profesor/<id>/reporte/trabajos/<trabajo_id> — estado, progreso y resultado"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+    trabajo = trabajos.obtener(trabajo_id)
+    if trabajo is None or trabajo.dueno != user_id:
+        return err("Trabajo no encontrado o expirado", 404)
+    return ok({"success": True, "trabajo": trabajo.a_dict()})
 
 
 def h_materias(req_obj, user_id: int):
@@ -695,8 +1527,12 @@ def h_materias(req_obj, user_id: int):
     return ok({"success": True, "materias": materias})
 
 
+@con_sesion(roles=("profesor",), sensible=True)
 def h_materia_create(req_obj, user_id: int):
     """POST /api/profesor/<id>/materias"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
     data = req_obj.get_json() or {}
     nombre = data.get("nombre", "").strip()
     codigo = data.get("codigo", "").strip()
@@ -714,11 +1550,17 @@ def h_materia_create(req_obj, user_id: int):
     if not result:
         return err("Error al crear la materia", 500)
 
+    inscripciones.invalidar_profesor(user_id)
+    pdfs.invalidar(user_id)
     return ok({"success": True, "materia": result[0]}, 201)
 
 
+@con_sesion(roles=("profesor",), sensible=True)
 def h_materia_update(req_obj, user_id: int, materia_id: int):
     """PATCH /api/profesor/<id>/materias/<mid>"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
     data = req_obj.get_json() or {}
     nombre = data.get("nombre", "").strip()
     codigo = data.get("codigo", "").strip()
@@ -734,28 +1576,171 @@ def h_materia_update(req_obj, user_id: int, materia_id: int):
     return ok({"success": True, "materia": result[0] if result else {}})
 
 
+@con_sesion(roles=("profesor",), sensible=True)
 def h_materia_delete(req_obj, user_id: int, materia_id: int):
     """DELETE /api/profesor/<id>/materias/<mid>"""
+    if not _es_propietario(req_obj, user_id):
+        return err("No autorizado", 403)
+
     db = get_db()
     # Verificar que la materia pertenece al profesor
     m = db.select("materias", {"id": f"eq.{materia_id}", "profesor_id": f"eq.{user_id}"})
     if not m:
         return err("Materia no encontrada o no autorizada", 404)
     db.delete("materias", {"id": f"eq.{materia_id}"})
+    inscripciones.invalidar_profesor(user_id)
+    pdfs.invalidar(user_id)
     return ok({"success": True})
 
 
+def _usuarios_desde(despues_de, limite: int):
+    """Página de usuarios con id mayor a `despues_de`, para el índice"""
+    params = {
+        "select": "id,email,matricula",
+        "order": "id.asc",
+        "limit": str(limite),
+    }
+    if despues_de is not None:
+        params["id"] = f"gt.{int(despues_de)}"
+    return get_db().select("usuarios", params)
+
+indice_disponibilidad = IndiceDisponibilidad(_usuarios_desde)
+
+
+@limitado("check", llave=llave_ip)
 def h_check_field(req_obj, field: str):
     """POST /api/check/<field>"""
     data = req_obj.get_json() or {}
-    val = data.get(field, "")
+    val = normalizar(field, data.get(field, ""))
     if not val:
         return ok({"exists": False})
+    # Negativo del índice en memoria: disponible sin tocar la BD
+    if not indice_disponibilidad.puede_existir(field, val):
+        return ok({"exists": False})
     db = get_db()
-    result = db.select("usuarios", {field: f"eq.{val}"})
+    result = db.select("usuarios", {field: f"eq.{val}", "select": "id"})
     return ok({"exists": bool(result)})
 
 
+# ── IMPORTACIÓN DE ALUMNOS ────────────────────
+
+@con_sesion(roles=("profesor",), sensible=True)
+def h_importar_alumnos(req_obj):
+    """
+    POST /api/alumnos/importar?lote=500[&formato=csv]
+
+    Cuerpo: el CSV (text/csv) o multipart con el campo `archivo`. Regresa el
+    resumen y las filas con error; con formato=csv, el reporte de todas las
+    filas. No asigna contraseñas (el KDF es demasiado costoso para un
+    request): cada alumno fija la suya con un código de activación
+    (POST /api/alumnos/activaciones y POST /api/activar), o se asignan con
+    la CLI, `python -m utils.roster_import`.
+    """
+    archivo = req_obj.files.get("archivo") if req_obj.files else None
+    stream = archivo.stream if archivo else req_obj.stream
+    lote = min(int(req_obj.args.get("lote", 500)), 1000)
+
+    db = get_db()
+
+    def existentes(emails, matriculas):
+        rows = db.select("usuarios", filtro_existentes(emails, matriculas))
+        return {r["email"] for r in rows}, {r["matricula"] for r in rows}
+
+    def insertar(filas):
+        creadas = db.insert("usuarios", filas)
+        for user in creadas or []:
+            indice_disponibilidad.agregar(user)
+        return creadas
+
+    importador = ImportadorAlumnos(existentes, insertar, lote=lote)
+    reporte = importador.importar(stream)
+
+    if req_obj.args.get("formato") == "csv":
+        salida = io.StringIO()
+        escritor = csv.DictWriter(salida, fieldnames=COLUMNAS_REPORTE)
+        escritor.writeheader()
+        escritor.writerows(reporte)
+        return (salida.getvalue(), 200, {"Content-Type": "text/csv; charset=utf-8",
+                                         "Content-Disposition": 'attachment; filename="importacion.csv"',
+                                         **cors()})
+
+    errores = [r for r in reporte if r["estado"] == ERROR]
+    return ok({"success": True, "resumen": importador.resumen, "errores": errores})
+
+
+MAX_ACTIVACIONES = 1000
+
+@con_sesion(roles=("profesor",), sensible=True)
+def h_activaciones(req_obj):
+    """
+    POST /api/alumnos/activaciones  {"matriculas": [...]} o {"alumno_ids": [...]}
+
+    Códigos de activación para alumnos importados que aún no tienen
+    contraseña (una consulta). Las cuentas que ya tienen una se omiten, y
+    solo se emiten para alumnos inscritos en materias del profesor.
+    """
+    data = req_obj.get_json() or {}
+    params = {"rol": "eq.alumno", "password_hash": f"eq.{SIN_PASSWORD}",
+              "select": "id,matricula,email,password_hash"}
+    roster = inscripciones.de_profesor(req_obj.sesion["uid"]).roster()
+    if data.get("matriculas"):
+        valores = sorted({valor_filtro(str(m).strip().upper()) for m in data["matriculas"]})
+        params["matricula"] = f"in.({','.join(valores)})"
+        ids = roster
+    elif data.get("alumno_ids"):
+        valores = sorted({int(a) for a in data["alumno_ids"]})
+        ids = roster.intersection(valores)
+    else:
+        return err("Envía matriculas o alumno_ids")
+    if len(valores) > MAX_ACTIVACIONES:
+        return err(f"Máximo {MAX_ACTIVACIONES} alumnos por solicitud", 413)
+    if not ids:
+        return ok({"success": True, "activaciones": []})
+    params["id"] = _lista_in(sorted(ids))
+
+    pendientes = get_db().select("usuarios", params) or []
+    return ok({"success": True, "activaciones": [
+        {"id": u["id"], "matricula": u["matricula"], "email": u["email"],
+         "codigo": emitir_activacion(u)}
+        for u in pendientes
+    ]})
+
+
+@limitado("login", llave=llave_ip)
+def h_activar(req_obj):
+    """
+    POST /api/activar  {"codigo", "password"}
+
+    Fija la primera contraseña de una cuenta importada. La escritura exige
+    que el hash siga siendo el del código, así que cada código sirve una vez.
+    """
+    data = req_obj.get_json() or {}
+    password = data.get("password", "")
+    if len(password) < 8:
+        return err("La contraseña debe tener mínimo 8 caracteres")
+    activacion = verificar_activacion(data.get("codigo", ""))
+    if activacion is None:
+        return err("Código de activación inválido o expirado", 400)
+    uid, huella = activacion
+
+    db = get_db()
+    users = db.select("usuarios", {"id": f"eq.{int(uid)}", "select": "id,password_hash"})
+    if not users or not coincide_huella(users[0]["password_hash"], huella):
+        return err("Código de activación inválido o ya usado", 400)
+
+    try:
+        password_hash = get_pool().hash(password)
+    except HashingSaturado:
+        return err_ocupado("Servidor ocupado, intenta de nuevo")
+    actualizados = db.update("usuarios", {"password_hash": password_hash}, {
+        "id": f"eq.{users[0]['id']}",
+        "password_hash": f"eq.{users[0]['password_hash']}",
+    })
+    if not actualizados:
+        return err("Código de activación inválido o ya usado", 400)
+    return ok({"success": True, "message": "Cuenta activada, ya puedes iniciar sesión"})
+
+
 # ─────────────────────────────────────────────
 # HELPERS
 # ─────────────────────────────────────────────
@@ -787,6 +1772,9 @@ def _parse_nombre(u: dict) -> dict:
         u = {**u, "apellido_paterno": ap, "apellido_materno": am, "nombre_corto": nombre_corto}
 
     return u
+
+
+def _safe_user(u: dict) -> dict:
     """Usuario sin password_hash. Siempre expone apellido_paterno / apellido_materno."""
     out = {k: v for k, v in u.items() if k != "password_hash"}
 
@@ -825,6 +1813,14 @@ def handler(request, **kwargs):
     if request.method == "OPTIONS":
         return ("", 204, cors())
 
+    # Con la BD saturada, dashboards y reportes ceden el paso a los escaneos
+    with carga.request(prioridad_de(request.path)) as admitido:
+        if not admitido:
+            return err_ocupado("Servidor saturado, intenta de nuevo en unos segundos", 2)
+        return _despachar(request)
+
+
+def _despachar(request):
     path = request.path.rstrip("/")
     method = request.method
 
@@ -839,6 +1835,9 @@ def handler(request, **kwargs):
         if path == "/api/verify-session" and method == "POST":
             return h_verify(request)
 
+        if path == "/api/logout" and method == "POST":
+            return h_logout(request)
+
         # ── CHECK DUPLICADOS ──────────────────
         if path == "/api/check/email" and method == "POST":
             return h_check_field(request, "email")
@@ -860,6 +1859,21 @@ def handler(request, **kwargs):
         if path == "/api/registrar-asistencia" and method == "POST":
             return h_registrar_asistencia(request)
 
+        if path == "/api/asistencias/sincronizar" and method == "POST":
+            return h_sincronizar_asistencias(request)
+
+        # ── IMPORTACIÓN ───────────────────────
+        if path == "/api/alumnos/importar" and method == "POST":
+            return h_importar_alumnos(request)
+        if path == "/api/alumnos/activaciones" and method == "POST":
+            return h_activaciones(request)
+        if path == "/api/activar" and method == "POST":
+            return h_activar(request)
+
+        # ── TRABAJOS PROGRAMADOS ──────────────
+        if path == "/api/cron/rollups" and method == "GET":
+            return h_cron_rollups(request)
+
         # ── ALUMNO ────────────────────────────
         parts = path.split("/")
         if len(parts) >= 4 and parts[1] == "api" and parts[2] == "alumno":
@@ -870,6 +1884,8 @@ def handler(request, **kwargs):
                     return h_alumno_stats(request, uid)
                 if endpoint == "actividad" and method == "GET":
                     return h_alumno_actividad(request, uid)
+                if endpoint == "historial" and method == "GET":
+                    return h_alumno_historial(request, uid)
                 if endpoint == "horario" and method == "GET":
                     return h_alumno_horario(request, uid)
 
@@ -882,11 +1898,26 @@ def handler(request, **kwargs):
                     return h_profesor_dashboard(request, uid)
                 if endpoint == "reporte" and method == "GET":
                     return h_reporte_pdf_data(request, uid)
+                if endpoint == "historial" and method == "GET":
+                    return h_profesor_historial(request, uid)
+                if endpoint == "tendencias" and method == "GET":
+                    return h_profesor_tendencias(request, uid)
+                if endpoint == "analitica" and method == "GET":
+                    return h_profesor_analitica(request, uid)
+                if endpoint == "justificar" and method == "POST":
+                    return h_justificar(request, uid)
                 if endpoint == "materias":
                     if method == "GET":
                         return h_materias(request, uid)
                     if method == "POST":
                         return h_materia_create(request, uid)
+            if len(parts) == 6 and parts[4] == "reporte" and parts[5] == "pdf" and method == "GET":
+                return h_reporte_pdf(request, uid)
+            # /api/profesor/<id>/reporte/trabajos[/<trabajo_id>]
+            if len(parts) == 6 and parts[4] == "reporte" and parts[5] == "trabajos" and method == "POST":
+                return h_reporte_trabajo_crear(request, uid)
+            if len(parts) == 7 and parts[4] == "reporte" and parts[5] == "trabajos" and method == "GET":
+                return h_reporte_trabajo(request, uid, parts[6])
             # /api/profesor/<id>/materias/<mid>
             if len(parts) == 6 and parts[4] == "materias":
                 mid = int(parts[5])
@@ -901,10 +1932,21 @@ def handler(request, **kwargs):
             if method == "GET":
                 return h_clase_asistencias(request, clase_id)
 
+        if len(parts) == 5 and parts[1] == "api" and parts[2] == "clase" and parts[4] == "qr-token":
+            if method == "GET":
+                return h_clase_qr_token(request, int(parts[3]))
+
+        if len(parts) == 5 and parts[1] == "api" and parts[2] == "clase" and parts[4] == "qr":
+            if method == "GET":
+                return h_clase_qr_imagen(request, int(parts[3]))
+
         return err("Ruta no encontrada", 404)
 
     except ValueError as e:
         return err(f"Parámetro inválido: {e}", 400)
+    except SecretoNoConfigurado as e:
+        print(f"ERROR: {e}")
+        return err("Servicio no configurado", 503)
     except Exception as e:
         print(f"ERROR: {e}")
         return err(f"Error interno del servidor", 500)
\ No newline at end of file
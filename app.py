@@ -1,18 +1,27 @@
 # app.py - Versión COMPLETA con DATOS REALES
 import os
 import hashlib
-import secrets
 import re
-import socket
-import json
-import qrcode
-import io
-import base64
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, session, g
 from dotenv import load_dotenv
-from database import init_db, get_db
+from database import init_db, get_db, get_health
+from utils.qr_render import get_qr_renderer, MIMETYPES
+from utils.geofence import geocerca_de_clase
+from utils.cache import TTLCache
+from utils.session_tokens import emitir_sesion, ListaRevocacion, SecretoNoConfigurado
+from utils.decorators import requiere_sesion, limitar_tasa, idempotente, coalescer
+from utils.idempotency import AlmacenIdempotencia
+from utils.rate_limit import crear_limitador, llave_ip, llave_login
+from utils.load_shedding import get_control, prioridad_de
+from utils.db_errors import filtro_or_eq
+from utils.passwords import get_pool, HashingSaturado
+from utils.enrollment import IndiceInscripciones
+from utils.attendance_stats import ConteosProfesor
+from utils.active_classes import RegistroClasesActivas, normalizar_aula
+from utils.qr_tokens import emitir_token, verificar_token, segundos_restantes, exigir_secreto, QR_WINDOW_SECONDS
+from utils.history import params_pagina, cortar_pagina, leer_limite, detalle_pagina
+from utils.singleflight import GrupoVuelo
 from datetime import datetime, date, time
-from geopy.distance import geodesic
 
 # Cargar variables de entorno
 load_dotenv()
@@ -20,15 +29,85 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-key-123')
 
+RADIO_PERMITIDO_M = 7  # 5m + 2m tolerancia
+
 # ========== FUNCIONES DE UTILERÍA ==========
 
 def hash_password(password):
-    """Hashea la contraseña usando SHA-256"""
+    """Hash legado (SHA-256); solo para migrar con rehash-on-login"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def generar_token():
-    """Genera un token único para sesiones"""
-    return secrets.token_urlsafe(32)
+def respuesta_ocupado():
+    """503 con Retry-After cuando el pool de hashing está saturado"""
+    resp = jsonify({'success': False, 'message': 'Servidor ocupado, intenta de nuevo'})
+    resp.headers['Retry-After'] = '1'
+    return resp, 503
+
+def generar_token(user):
+    """Genera un token de sesión firmado (se verifica sin consultar la BD)"""
+    return emitir_sesion(user)
+
+def _jti_revocado(jti):
+    return bool(get_db().query('sesiones_revocadas', params={'jti': f'eq.{jti}', 'select': 'jti'}))
+
+def _revocar_jti(jti, exp):
+    get_db().query('sesiones_revocadas', method='POST',
+                   data={'jti': jti, 'expira': datetime.fromtimestamp(exp).isoformat()})
+
+revocaciones = ListaRevocacion(_jti_revocado, _revocar_jti)
+
+# Token bucket por dispositivo/IP: 429 + Retry-After al agotarse
+limite_asistencia = crear_limitador('asistencia')
+limite_login = crear_limitador('login')
+limite_check = crear_limitador('check')
+
+# Reintentos de escaneo con Idempotency-Key: se repite la respuesta original
+idempotencia_asistencia = AlmacenIdempotencia()
+
+# Dashboard y asistencias de una clase abiertos en varias pantallas a la vez:
+# una sola ejecución por llave (ruta + argumentos + query)
+vuelos = GrupoVuelo()
+
+def _cargar_inscripciones(profesor_id):
+    db = get_db()
+    materias = db.query('materias', params={'profesor_id': f'eq.{profesor_id}', 'select': 'id'}) or []
+    materia_ids = [m['id'] for m in materias]
+    if not materia_ids:
+        return [], []
+    horarios = db.query('horarios', params={
+        'materia_id': f"in.({','.join(map(str, materia_ids))})",
+        'select': 'alumno_id,materia_id'
+    }) or []
+    return materia_ids, [(h['alumno_id'], h['materia_id']) for h in horarios]
+
+def _cargar_materias_alumno(alumno_id):
+    horarios = get_db().query('horarios', params={'alumno_id': f'eq.{alumno_id}', 'select': 'materia_id'}) or []
+    return {h['materia_id'] for h in horarios if h.get('materia_id')}
+
+# Alumnos inscritos por profesor/materia, derivado de `horarios`
+inscripciones = IndiceInscripciones(_cargar_inscripciones, _cargar_materias_alumno)
+
+def _cargar_clases_activas():
+    return get_db().query('clases', params={'activa': 'eq.true'})
+
+def _cargar_clase(clase_id):
+    clase = get_db().query('clases', params={'id': f'eq.{clase_id}', 'activa': 'eq.true'})
+    return clase[0] if clase else None
+
+# Clases activas de todo el campus, indexadas por id, profesor y aula
+clases_activas = RegistroClasesActivas(_cargar_clases_activas, _cargar_clase)
+
+# Geocercas precalculadas por clase (se construyen al iniciar o en el primer escaneo)
+_geocercas = TTLCache(ttl=300, max_entries=2048)
+
+def get_geocerca(clase):
+    """Geocerca de la clase, construida una sola vez por proceso"""
+    geocerca = _geocercas.get(clase['id'])
+    if geocerca is None:
+        geocerca = geocerca_de_clase(clase, RADIO_PERMITIDO_M)
+        if geocerca is not None:
+            _geocercas.set(clase['id'], geocerca)
+    return geocerca
 
 def validar_matricula(matricula):
     """Valida formato de matrícula"""
@@ -42,6 +121,7 @@ def validar_email(email):
 
 def get_local_ip():
     """Obtiene la IP local de la máquina"""
+    import socket
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 80))
@@ -51,18 +131,30 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
-# Inicializar conexión a BD
-if init_db():
-    local_ip = get_local_ip()
-    print("="*50)
-    print("🚀 App lista para arrancar con DATOS REALES")
-    print(f"📱 Local: http://localhost:5000")
-    print(f"📱 Red: http://{local_ip}:5000")
-    print(f"📱 Network info: http://{local_ip}:5000/network-info")
-    print("="*50)
-else:
-    print("💥 Error fatal: No hay conexión a la base de datos")
-    exit(1)
+# Inicializar conexión a BD (no bloquea: la verificación corre en segundo plano)
+init_db()
+
+@app.before_request
+def _asegurar_health_checker():
+    """Re-arranca el verificador si el worker se creó por fork (gunicorn --preload)"""
+    get_health().ensure_started()
+
+@app.before_request
+def _admitir_por_prioridad():
+    """Con la BD saturada, dashboards y reportes ceden el paso a los escaneos"""
+    prioridad = prioridad_de(request.path)
+    if not get_control().admitir(prioridad):
+        resp = jsonify({'success': False,
+                        'message': 'Servidor saturado, intenta de nuevo en unos segundos'})
+        resp.headers['Retry-After'] = '2'
+        return resp, 503
+    g.prioridad = prioridad
+
+@app.teardown_request
+def _liberar_prioridad(exc):
+    prioridad = g.pop('prioridad', None)
+    if prioridad is not None:
+        get_control().liberar(prioridad)
 
 # ========== RUTAS PÚBLICAS ==========
 
@@ -100,11 +192,18 @@ def dashboard_alumno():
 
 # ========== RUTAS API ==========
 
+@app.route('/healthz')
+def healthz():
+    """Estado de disponibilidad: 200 si la BD responde, 503 si está degradada"""
+    health = get_health()
+    estado = {**health.snapshot(), 'carga': get_control().snapshot(),
+              'clases_activas': len(clases_activas), 'coalescencia': vuelos.estadisticas()}
+    return jsonify(estado), 200 if health.is_ready() else 503
+
 @app.route('/test-db')
 def test_db():
     """Prueba la conexión a Supabase"""
-    db = get_db()
-    if db:
+    if get_health().check_now() == 'ok':
         return jsonify({
             "status": "success",
             "message": "✅ Conexión a Supabase funcionando",
@@ -121,7 +220,7 @@ def debug():
     return jsonify({
         "app": "Asistencia App",
         "status": "running",
-        "database": "connected" if get_db() else "disconnected",
+        "database": get_health().status,
         "routes": [str(rule) for rule in app.url_map.iter_rules()],
         "timestamp": datetime.now().isoformat()
     })
@@ -340,40 +439,47 @@ def api_register():
         if not db:
             return jsonify({'success': False, 'message': 'Error de conexión'}), 500
         
-        # Verificar duplicados
-        for field in ['email', 'matricula', 'telefono_id']:
-            existing = db.query('usuarios', params={field: f'eq.{data[field]}'})
-            if existing and len(existing) > 0:
-                return jsonify({'success': False, 'message': f'{field} ya está registrado'}), 400
-        
         # Crear usuario
         new_user = {
             'matricula': data['matricula'],
             'nombre': data['nombre'],
             'email': data['email'],
-            'password_hash': hash_password(data['password']),
+            'password_hash': get_pool().hash(data['password']),
             'rol': data['rol'],
             'telefono_id': data['telefono_id'],
             'created_at': datetime.now().isoformat()
         }
         
+        # Un solo INSERT; las restricciones UNIQUE rechazan duplicados
         result = db.query('usuarios', method='POST', data=new_user)
         
+        if not result:
+            # Solo si falló: una consulta or=(...) para saber qué campo está repetido
+            valores = {field: data[field] for field in ['email', 'matricula', 'telefono_id']}
+            existentes = db.query('usuarios', params={'or': filtro_or_eq(valores),
+                                                      'select': ','.join(valores)}) or []
+            for field, val in valores.items():
+                if any(u.get(field) == val for u in existentes):
+                    return jsonify({'success': False, 'message': f'{field} ya está registrado'}), 400
+        
         if result and len(result) > 0:
             return jsonify({
                 'success': True,
                 'message': 'Usuario registrado',
                 'user': result[0],
-                'token': generar_token()
+                'token': generar_token(result[0])
             }), 201
         
         return jsonify({'success': False, 'message': 'Error al registrar'}), 500
             
+    except HashingSaturado:
+        return respuesta_ocupado()
     except Exception as e:
         print(f"Error en registro: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/check-email', methods=['POST'])
+@limitar_tasa(limite_check, llave=llave_ip)
 def check_email():
     """Verifica si email existe"""
     try:
@@ -389,6 +495,7 @@ def check_email():
         return jsonify({'exists': False, 'error': str(e)})
 
 @app.route('/api/check-matricula', methods=['POST'])
+@limitar_tasa(limite_check, llave=llave_ip)
 def check_matricula():
     """Verifica si matrícula existe"""
     try:
@@ -406,6 +513,7 @@ def check_matricula():
 # ========== API DE LOGIN ==========
 
 @app.route('/api/login', methods=['POST'])
+@limitar_tasa(limite_login, llave=llave_login)
 def api_login():
     """Inicia sesión con email y contraseña"""
     try:
@@ -425,14 +533,20 @@ def api_login():
         
         user = result[0]
         
-        if user['password_hash'] != hash_password(password):
+        valida, nuevo_hash = get_pool().verificar(password, user['password_hash'],
+                                                  legado=hash_password)
+        if not valida:
             return jsonify({'success': False, 'message': 'Credenciales inválidas'}), 401
         
-        # Actualizar teléfono si es necesario
+        # Actualizar teléfono y/o migrar el hash en una sola escritura
+        cambios = {}
         if telefono_id and user['telefono_id'] != telefono_id:
-            db.query('usuarios', method='PATCH', 
-                    data={'telefono_id': telefono_id},
-                    params={'id': f'eq.{user["id"]}'})
+            cambios['telefono_id'] = telefono_id
+        if nuevo_hash:
+            cambios['password_hash'] = nuevo_hash
+        if cambios:
+            db.query('usuarios', method='PATCH', data=cambios,
+                     params={'id': f'eq.{user["id"]}'})
         
         return jsonify({
             'success': True,
@@ -445,9 +559,11 @@ def api_login():
                 'rol': user['rol'],
                 'telefono_id': user['telefono_id']
             },
-            'token': generar_token()
+            'token': generar_token(user)
         })
         
+    except HashingSaturado:
+        return respuesta_ocupado()
     except Exception as e:
         print(f"Error en login: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -455,41 +571,32 @@ def api_login():
 # ========== API DE VERIFICACIÓN DE SESIÓN ==========
 
 @app.route('/api/verify-session', methods=['POST'])
+@requiere_sesion()
 def verify_session():
-    """Verifica sesión por teléfono_id"""
-    try:
-        data = request.json
-        telefono_id = data.get('telefono_id')
-        
-        if not telefono_id:
-            return jsonify({'valid': False})
-        
-        db = get_db()
-        result = db.query('usuarios', params={'telefono_id': f'eq.{telefono_id}'})
-        
-        if result and len(result) > 0:
-            user = result[0]
-            return jsonify({
-                'valid': True,
-                'user': {
-                    'id': user['id'],
-                    'matricula': user['matricula'],
-                    'nombre': user['nombre'],
-                    'email': user['email'],
-                    'rol': user['rol']
-                }
-            })
-        
+    """Verifica la sesión con el token firmado, sin consultar la BD"""
+    data = request.get_json(silent=True) or {}
+    sesion = request.sesion
+    
+    # El token está ligado al dispositivo con el que se inició sesión
+    if data.get('telefono_id') and sesion.get('tel') and data['telefono_id'] != sesion['tel']:
         return jsonify({'valid': False})
-        
-    except Exception as e:
-        return jsonify({'valid': False, 'error': str(e)})
+    
+    return jsonify({
+        'valid': True,
+        'user': {
+            'id': sesion['uid'],
+            'rol': sesion['rol'],
+            'telefono_id': sesion.get('tel')
+        }
+    })
 
 # ========== API DE LOGOUT ==========
 
 @app.route('/api/logout', methods=['POST'])
+@requiere_sesion()
 def api_logout():
-    """Cierra sesión"""
+    """Cierra sesión revocando el token actual"""
+    revocaciones.revocar(request.sesion)
     return jsonify({'success': True, 'message': 'Sesión cerrada'})
 
 # ========== API DE ESTADÍSTICAS PARA ALUMNO (DATOS REALES) ==========
@@ -522,9 +629,13 @@ def get_estadisticas_alumno(user_id):
                 if a.get('justificada'):
                     justificadas_count += 1
         
-        # Obtener total de clases (podrías calcularlo de otra tabla)
-        # Por ahora usamos un valor fijo o lo calculamos de las clases
-        clases = db.query('clases', params={'select': 'count'})
+        # Total de clases de las materias en que está inscrito (y las que no
+        # tienen materia); sin horarios, todas las clases
+        clases_params = {'select': 'count'}
+        materias = inscripciones.materias_de_alumno(user_id)
+        if materias:
+            clases_params['or'] = f"(materia_id.in.({','.join(map(str, sorted(materias)))}),materia_id.is.null)"
+        clases = db.query('clases', params=clases_params)
         total_clases = clases[0]['count'] if clases and len(clases) > 0 else 20
         
         faltas_count = total_clases - asistencias_count
@@ -585,19 +696,86 @@ def get_actividad_alumno(user_id):
         print(f"Error en actividad: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# ========== HISTORIAL (PAGINADO POR LLAVE) ==========
+
+def _buscar_ids(tabla, ids, columnas):
+    return get_db().query(tabla, params={'id': f"in.({','.join(map(str, ids))})", 'select': columnas})
+
+def _respuesta_historial(filtros, con_alumno=False):
+    """Página de `asistencias` (?cursor=&limite=&desde=&hasta=) con el filtro del dueño"""
+    limite = leer_limite(request.args.get('limite'))
+    try:
+        params = params_pagina(request.args.get('cursor'), request.args.get('desde'),
+                               request.args.get('hasta'), limite)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Parámetro inválido: {e}'}), 400
+    params.update(filtros)
+    filas = get_db().query('asistencias', params=params)
+    if filas is None:
+        return jsonify({'success': False, 'message': 'Error al consultar el historial'}), 500
+    filas, siguiente = cortar_pagina(filas, limite)
+    return jsonify({
+        'success': True,
+        'historial': detalle_pagina(filas, _buscar_ids, con_alumno=con_alumno),
+        'siguiente': siguiente
+    })
+
+def _ids_clases(params):
+    clases = get_db().query('clases', params={**params, 'select': 'id'}) or []
+    return ','.join(str(c['id']) for c in clases)
+
+@app.route('/api/alumno/<int:user_id>/historial', methods=['GET'])
+@requiere_sesion(roles=('alumno',))
+def historial_alumno(user_id):
+    """Historial de asistencias del alumno (?materia_id= opcional)"""
+    if str(request.sesion['uid']) != str(user_id):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    filtros = {'alumno_id': f'eq.{user_id}'}
+    materia_id = request.args.get('materia_id', type=int)
+    if materia_id:
+        ids = _ids_clases({'materia_id': f'eq.{materia_id}'})
+        if not ids:
+            return jsonify({'success': True, 'historial': [], 'siguiente': None})
+        filtros['clase_id'] = f'in.({ids})'
+    return _respuesta_historial(filtros)
+
+@app.route('/api/profesor/<int:user_id>/historial', methods=['GET'])
+@requiere_sesion(roles=('profesor',))
+def historial_profesor(user_id):
+    """Historial de las clases del profesor (?materia_id= y ?alumno_id= opcionales)"""
+    if str(request.sesion['uid']) != str(user_id):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    clases_params = {'profesor_id': f'eq.{user_id}'}
+    materia_id = request.args.get('materia_id', type=int)
+    if materia_id:
+        clases_params['materia_id'] = f'eq.{materia_id}'
+    ids = _ids_clases(clases_params)
+    if not ids:
+        return jsonify({'success': True, 'historial': [], 'siguiente': None})
+    
+    filtros = {'clase_id': f'in.({ids})'}
+    alumno_id = request.args.get('alumno_id', type=int)
+    if alumno_id:
+        filtros['alumno_id'] = f'eq.{alumno_id}'
+    return _respuesta_historial(filtros, con_alumno=True)
+
 # ========== API PARA REGISTRAR ASISTENCIA (ESCANEO QR) ==========
 
 @app.route('/api/registrar-asistencia', methods=['POST'])
+@idempotente(idempotencia_asistencia)
+@limitar_tasa(limite_asistencia)
 def registrar_asistencia():
     """Registra asistencia desde QR con geolocalización"""
     try:
         data = request.json
-        qr_data = data.get('qr_data')
+        qr_token = data.get('qr_token')
         telefono_id = data.get('telefono_id')
         latitud = data.get('latitud')
         longitud = data.get('longitud')
         
-        if not qr_data or not telefono_id:
+        if not qr_token or not telefono_id:
             return jsonify({'success': False, 'message': 'Datos incompletos'}), 400
         
         db = get_db()
@@ -613,23 +791,17 @@ def registrar_asistencia():
         
         alumno_id = alumno[0]['id']
         
-        # Decodificar QR
-        try:
-            qr_info = json.loads(qr_data)
-            clase_id = qr_info.get('clase_id')
-        except:
-            clase_id = qr_data
-        
-        # Verificar clase activa
-        clase = db.query('clases', params={
-            'id': f'eq.{clase_id}',
-            'activa': 'eq.true'
-        })
+        # Solo el token firmado y rotativo identifica la clase (sin consultar la BD)
+        clase_id = verificar_token(qr_token)
+        if clase_id is None:
+            return jsonify({'success': False, 'message': 'QR expirado o inválido'}), 400
         
-        if not clase or len(clase) == 0:
-            return jsonify({'success': False, 'message': 'Clase no válida o inactiva'}), 400
+        # Verificar clase activa: búsqueda por id en el registro en memoria
+        clase_info = clases_activas.get(clase_id)
         
-        clase_info = clase[0]
+        if clase_info is None:
+            return jsonify({'success': False, 'message': 'Clase no válida o inactiva'}), 400
+        clase_id = clase_info['id']
         
         # Verificar si ya registró
         existente = db.query('asistencias', params={
@@ -644,11 +816,18 @@ def registrar_asistencia():
         distancia = None
         valida = True
         
-        if latitud and longitud and clase_info.get('latitud_referencia'):
-            punto_escaneo = (latitud, longitud)
-            punto_clase = (clase_info['latitud_referencia'], clase_info['longitud_referencia'])
-            distancia = geodesic(punto_escaneo, punto_clase).meters
-            valida = distancia <= 7  # 5m + 2m tolerancia
+        geocerca = get_geocerca(clase_info)
+        if latitud and longitud and geocerca is not None:
+            valida, distancia = geocerca.contiene(latitud, longitud)
+        
+        # Fuera de la geocerca: ¿está en el aula de otra clase activa?
+        clase_cercana = None
+        if not valida:
+            otras = [c for c, _ in clases_activas.cercanas(latitud, longitud, RADIO_PERMITIDO_M)
+                     if c['id'] != clase_id]
+            if otras:
+                clase_cercana = otras[0]
+                print(f"⚠️  Escaneo de la clase {clase_id} desde el aula de la clase {clase_cercana['id']}")
         
         # Registrar asistencia
         nueva_asistencia = {
@@ -665,12 +844,16 @@ def registrar_asistencia():
         result = db.query('asistencias', method='POST', data=nueva_asistencia)
         
         if result and len(result) > 0:
-            return jsonify({
+            respuesta = {
                 'success': True,
                 'message': 'Asistencia registrada',
                 'valida': valida,
                 'distancia': distancia
-            }), 201
+            }
+            if clase_cercana is not None:
+                respuesta['message'] = 'Asistencia registrada fuera del aula: estás en el aula de otra clase activa'
+                respuesta['clase_cercana'] = {'id': clase_cercana['id'], 'aula': clase_cercana.get('aula')}
+            return jsonify(respuesta), 201
         
         return jsonify({'success': False, 'message': 'Error al registrar'}), 500
             
@@ -682,43 +865,93 @@ def registrar_asistencia():
 
 @app.route('/api/clase/activa', methods=['GET'])
 def clase_activa():
-    """Verifica si hay clase activa"""
+    """Clase activa de un profesor (?profesor_id=) o de un aula (?aula=);
+    sin filtros, la más reciente del campus"""
     try:
-        db = get_db()
-        clase = db.query('clases', params={
-            'activa': 'eq.true',
-            'order': 'created_at.desc',
-            'limit': 1
-        })
-        
-        if clase and len(clase) > 0:
+        profesor_id = request.args.get('profesor_id')
+        aula = request.args.get('aula')
+        if profesor_id:
+            clase = clases_activas.de_profesor(profesor_id)
+        elif aula:
+            clase = clases_activas.en_aula(aula)
+        else:
+            clase = clases_activas.ultima()
+        
+        if clase is not None:
             return jsonify({
                 'activa': True,
-                'clase': clase[0]
+                'clase': clase
             })
         
         return jsonify({'activa': False})
     except Exception as e:
         return jsonify({'activa': False, 'error': str(e)}), 500
 
+@app.route('/api/clase/<int:clase_id>/qr-token', methods=['GET'])
+@requiere_sesion(roles=('profesor',))
+def qr_token_clase(clase_id):
+    """Token vigente para proyectar el QR rotativo; solo el profesor de la clase"""
+    clase = clases_activas.get(clase_id)
+    if clase is None or str(clase.get('profesor_id')) != str(request.sesion['uid']):
+        return jsonify({'success': False, 'message': 'Clase no encontrada o no autorizada'}), 404
+    
+    return jsonify({
+        'success': True,
+        'qr_token': emitir_token(clase['id']),
+        'expira_en': segundos_restantes(),
+        'qr_rotacion_s': QR_WINDOW_SECONDS
+    })
+
+@app.route('/api/clases/cercanas', methods=['GET'])
+def clases_cercanas():
+    """Clases activas a menos de ?radio= metros (máx. 500) de ?latitud=&longitud="""
+    try:
+        latitud = float(request.args['latitud'])
+        longitud = float(request.args['longitud'])
+        radio = min(float(request.args.get('radio', 50)), 500.0)
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'latitud y longitud requeridas'}), 400
+    
+    return jsonify({
+        'success': True,
+        'clases': [{
+            'id': clase['id'],
+            'profesor_id': clase.get('profesor_id'),
+            'aula': clase.get('aula'),
+            'distancia': round(distancia, 1)
+        } for clase, distancia in clases_activas.cercanas(latitud, longitud, radio)]
+    })
+
 @app.route('/api/clase/iniciar', methods=['POST'])
+@requiere_sesion(roles=('profesor',), revocaciones=revocaciones)
 def iniciar_clase():
     """Inicia una nueva clase (profesor)"""
     try:
         data = request.json
-        profesor_id = data.get('profesor_id')
+        # La clase es del profesor de la sesión; un profesor_id distinto se rechaza
+        profesor_id = data.get('profesor_id') or request.sesion['uid']
         latitud = data.get('latitud')
         longitud = data.get('longitud')
+        aula = normalizar_aula(data.get('aula'))
         
-        if not profesor_id:
-            return jsonify({'success': False, 'message': 'ID de profesor requerido'}), 400
+        if str(profesor_id) != str(request.sesion['uid']):
+            return jsonify({'success': False, 'message': 'No autorizado'}), 403
+        
+        # Sin QR_SECRET no habría QR que proyectar: fallar antes de tocar la BD
+        try:
+            exigir_secreto()
+        except SecretoNoConfigurado:
+            return jsonify({'success': False, 'message': 'Servicio no configurado'}), 503
         
         db = get_db()
         
-        # Verificar que no haya otra clase activa
-        activa = db.query('clases', params={'activa': 'eq.true'})
-        if activa and len(activa) > 0:
-            return jsonify({'success': False, 'message': 'Ya hay una clase activa'}), 400
+        # Una clase activa por profesor y por aula; el resto del campus sigue
+        propia = clases_activas.de_profesor(profesor_id)
+        if propia is not None:
+            return jsonify({'success': False, 'message': 'Ya tienes una clase activa',
+                            'clase_id': propia['id']}), 409
+        if aula and clases_activas.en_aula(aula) is not None:
+            return jsonify({'success': False, 'message': f'El aula {aula} ya tiene una clase activa'}), 409
         
         # Crear clase
         nueva_clase = {
@@ -727,31 +960,18 @@ def iniciar_clase():
             'hora_inicio': datetime.now().time().isoformat(),
             'activa': True,
             'latitud_referencia': latitud,
-            'longitud_referencia': longitud
+            'longitud_referencia': longitud,
+            'created_at': datetime.now().isoformat()
         }
+        if aula:
+            nueva_clase['aula'] = aula  # columna nueva (ALTER TABLE clases ADD aula text)
         
         result = db.query('clases', method='POST', data=nueva_clase)
         
         if result and len(result) > 0:
             clase = result[0]
-            
-            # Generar QR
-            qr_data = {
-                'clase_id': clase['id'],
-                'profesor_id': profesor_id,
-                'latitud': latitud,
-                'longitud': longitud,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(json.dumps(qr_data))
-            qr.make(fit=True)
-            
-            img = qr.make_image(fill_color="black", back_color="white")
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG")
-            img_base64 = base64.b64encode(buffered.getvalue()).decode()
+            clases_activas.activar(clase)
+            get_geocerca(clase)  # precalcular la proyección antes del primer escaneo
             
             return jsonify({
                 'success': True,
@@ -759,8 +979,11 @@ def iniciar_clase():
                     'id': clase['id'],
                     'fecha': clase['fecha'],
                     'hora_inicio': clase['hora_inicio'],
-                    'qr_base64': img_base64
-                }
+                    'aula': clase.get('aula'),
+                    'qr_url': url_for('qr_clase', clase_id=clase['id'])
+                },
+                'qr_token': emitir_token(clase['id']),
+                'qr_rotacion_s': QR_WINDOW_SECONDS
             })
         
         return jsonify({'success': False, 'message': 'Error al crear clase'}), 500
@@ -769,12 +992,48 @@ def iniciar_clase():
         print(f"Error iniciando clase: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/clase/<int:clase_id>/qr', methods=['GET'])
+@requiere_sesion(roles=('profesor',))
+def qr_clase(clase_id):
+    """Imagen del QR rotativo de una clase (?formato=svg|png); solo su profesor"""
+    formato = request.args.get('formato', 'svg')
+    if formato not in MIMETYPES:
+        return jsonify({'success': False, 'message': 'Formato inválido (svg o png)'}), 400
+    
+    clase = clases_activas.get(clase_id)
+    if clase is None or str(clase.get('profesor_id')) != str(request.sesion['uid']):
+        return jsonify({'success': False, 'message': 'Clase no encontrada o no autorizada'}), 404
+    
+    # El token es determinista por ventana: la imagen (y su ETag) cambian al rotar
+    renderer = get_qr_renderer()
+    ahora = datetime.now().timestamp()
+    token = emitir_token(clase['id'], ahora)
+    renderer.registrar_clase(clase_id, token)
+    expira = segundos_restantes(ahora)
+    
+    etag = renderer.etag(token, formato)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(renderer.render(token, formato), mimetype=MIMETYPES[formato])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"private, max-age={expira}"
+    response.headers['X-QR-Expira'] = str(expira)
+    return response
+
 @app.route('/api/clase/<int:clase_id>/asistencias', methods=['GET'])
+@requiere_sesion(roles=('profesor',))
+@coalescer(vuelos)
 def get_asistencias_clase(clase_id):
-    """Obtiene asistencias de una clase"""
+    """Obtiene asistencias de una clase (solo su profesor)"""
     try:
         db = get_db()
         
+        clase = clases_activas.get(clase_id) or (db.query('clases', params={
+            'id': f'eq.{clase_id}', 'select': 'profesor_id'}) or [None])[0]
+        if clase is None or str(clase.get('profesor_id')) != str(request.sesion['uid']):
+            return jsonify({'success': False, 'message': 'Clase no encontrada o no autorizada'}), 404
+        
         # Esta consulta puede ser compleja, mejor hacer varias
         asistencias = db.query('asistencias', params={
             'clase_id': f'eq.{clase_id}',
@@ -807,8 +1066,9 @@ def get_asistencias_clase(clase_id):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/clase/terminar', methods=['POST'])
+@requiere_sesion(roles=('profesor',), revocaciones=revocaciones)
 def terminar_clase():
-    """Termina una clase activa"""
+    """Termina una clase activa (solo su profesor)"""
     try:
         data = request.json
         clase_id = data.get('clase_id')
@@ -818,9 +1078,16 @@ def terminar_clase():
         
         db = get_db()
         
+        # El filtro por profesor_id es la verificación de dueño: otra clase no se toca
         result = db.query('clases', method='PATCH',
                          data={'activa': False, 'hora_fin': datetime.now().time().isoformat()},
-                         params={'id': f'eq.{clase_id}'})
+                         params={'id': f'eq.{int(clase_id)}',
+                                 'profesor_id': f"eq.{request.sesion['uid']}"})
+        if not result:
+            return jsonify({'success': False, 'message': 'Clase no encontrada o no autorizada'}), 404
+        get_qr_renderer().evict_clase(int(clase_id))
+        clases_activas.terminar(clase_id)
+        _geocercas.pop(int(clase_id))
         
         return jsonify({'success': True, 'message': 'Clase terminada'})
         
@@ -830,6 +1097,7 @@ def terminar_clase():
 # ========== API PARA PROFESOR (DASHBOARD) ==========
 
 @app.route('/api/profesor/<int:user_id>/dashboard', methods=['GET'])
+@coalescer(vuelos)
 def get_dashboard_profesor(user_id):
     """Obtiene datos para dashboard del profesor"""
     try:
@@ -844,28 +1112,39 @@ def get_dashboard_profesor(user_id):
         if not profesor or len(profesor) == 0:
             return jsonify({'success': False, 'message': 'Profesor no encontrado'}), 404
         
-        # Obtener todos los alumnos
-        alumnos = db.query('usuarios', params={'rol': 'eq.alumno'})
+        # Alumnos inscritos en sus materias; sin horarios, todos los alumnos
+        alumnos_params = {'rol': 'eq.alumno'}
+        inscritos = inscripciones.de_profesor(user_id)
+        roster = inscritos.roster()
+        if roster:
+            alumnos_params['id'] = f"in.({','.join(map(str, sorted(roster)))})"
+        alumnos = db.query('usuarios', params=alumnos_params)
         
-        # Obtener total de clases
-        clases = db.query('clases', params={'select': 'count'})
-        total_clases = clases[0]['count'] if clases and len(clases) > 0 else 20
+        # Solo las clases de este profesor (el total por alumno depende de sus materias)
+        clases = db.query('clases', params={'profesor_id': f'eq.{user_id}',
+                                            'select': 'id,materia_id'}) or []
+        resumen = ConteosProfesor({c['id']: c.get('materia_id') for c in clases}, {})
         
         verde = amarillo = naranja = rojo = 0
         alumnos_detalle = []
         
         if alumnos:
+            # Asistencias del roster a esas clases en una consulta
+            conteo = {}
+            asistencias = db.query('asistencias', params={
+                'alumno_id': f"in.({','.join(str(a['id']) for a in alumnos)})",
+                'clase_id': f"in.({','.join(str(c) for c in sorted(resumen.clases))})",
+                'select': 'alumno_id,valida,justificada'
+            }) if resumen.clases else []
+            for a in asistencias or []:
+                if a.get('valida') or a.get('justificada'):
+                    conteo[a['alumno_id']] = conteo.get(a['alumno_id'], 0) + 1
+
             for alumno in alumnos:
-                # Obtener asistencias del alumno
-                asistencias = db.query('asistencias', params={
-                    'alumno_id': f'eq.{alumno["id"]}'
-                })
-                
-                asistencias_count = 0
-                if asistencias:
-                    for a in asistencias:
-                        if a.get('valida') or a.get('justificada'):
-                            asistencias_count += 1
+                asistencias_count = conteo.get(alumno['id'], 0)
+                # Denominador: las clases de las materias que lleva el alumno
+                materias = inscritos.materias_de(alumno['id']) if roster else None
+                total_clases = resumen.total_clases(materias)
                 
                 porcentaje = round((asistencias_count / total_clases) * 100) if total_clases > 0 else 0
                 
@@ -898,7 +1177,9 @@ def get_dashboard_profesor(user_id):
                     'rojo': rojo
                 },
                 'alumnos': alumnos_detalle
-            }
+            },
+            # Altas y bajas en `horarios` se reflejan a lo más tras este tiempo
+            'inscripciones_ttl_s': inscripciones.ttl
         })
         
     except Exception as e:
@@ -931,4 +1212,11 @@ def not_found(error):
     ''', 404
 
 if __name__ == '__main__':
+    local_ip = get_local_ip()
+    print("="*50)
+    print("🚀 App lista para arrancar con DATOS REALES")
+    print(f"📱 Local: http://localhost:5000")
+    print(f"📱 Red: http://{local_ip}:5000")
+    print(f"📱 Network info: http://{local_ip}:5000/network-info")
+    print("="*50)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
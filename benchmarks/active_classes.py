@@ -0,0 +1,162 @@
+# benchmarks/active_classes.py
+"""
+Prueba de carga de clases simultáneas en app.py (utils/active_classes.py).
+
+Con una BD en memoria que agrega `--consulta-ms` por consulta, `--clases`
+profesores inician su clase en paralelo (cada uno en su aula) y después
+`--alumnos` por clase escanean el token firmado de su clase, todos a la vez.
+Verifica que:
+
+- todas las clases arrancan (ninguna bloquea a otra);
+- un segundo inicio del mismo profesor o en la misma aula regresa 409;
+- cada asistencia queda en la clase del token que se escaneó;
+- ningún escaneo consulta la tabla `clases` (la ruta es el registro en memoria).
+  Durante los escaneos el registro se refresca cada `--refresco-s`: esas
+  consultas corren en su hilo (stale-while-revalidate) y se cuentan aparte,
+  así el resultado no depende de cuánto tarde la corrida.
+
+Uso:
+    python benchmarks/active_classes.py [--clases 100] [--alumnos 30] [--hilos 64]
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+os.environ.setdefault('SUPABASE_KEY', 'benchmark')
+os.environ.setdefault('QR_SECRET', 'benchmark-qr')
+os.environ.setdefault('SESSION_SECRET', 'benchmark-session')
+
+import app as flask_app  # noqa: E402
+from utils.session_tokens import emitir_sesion  # noqa: E402
+
+
+class BDMemoria:
+    """Subconjunto de Database.query: filtros eq., POST y PATCH"""
+
+    def __init__(self, consulta_ms):
+        self.tablas = {}
+        self.ids = itertools.count(1)
+        self.consulta_s = consulta_ms / 1000
+        self.consultas = Counter()
+        self.lock = threading.Lock()
+
+    def query(self, table, method='GET', data=None, params=None):
+        time.sleep(self.consulta_s)
+        with self.lock:
+            # El refresco en segundo plano del registro no es la ruta del escaneo
+            refresco = threading.current_thread().name == 'clases-activas'
+            self.consultas[f'{table} (refresco)' if refresco else table] += 1
+            filas = self.tablas.setdefault(table, [])
+            if method == 'POST':
+                nueva = {**data, 'id': next(self.ids)}
+                filas.append(nueva)
+                return [dict(nueva)]
+            encontradas = [f for f in filas if self._coincide(f, params or {})]
+            if method == 'PATCH':
+                for f in encontradas:
+                    f.update(data)
+            return [dict(f) for f in encontradas]
+
+    @staticmethod
+    def _coincide(fila, params):
+        for columna, filtro in params.items():
+            if columna in ('select', 'order', 'limit'):
+                continue
+            valor = filtro.split('.', 1)[1]
+            actual = fila.get(columna)
+            if str(actual).lower() != valor.lower():
+                return False
+        return True
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))] if ordenados else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clases activas simultáneas en app.py')
+    parser.add_argument('--clases', type=int, default=100)
+    parser.add_argument('--alumnos', type=int, default=30, help='alumnos por clase')
+    parser.add_argument('--hilos', type=int, default=64)
+    parser.add_argument('--consulta-ms', type=float, default=2)
+    parser.add_argument('--refresco-s', type=float, default=0.5,
+                        help='refresco del registro durante los escaneos')
+    args = parser.parse_args()
+
+    bd = BDMemoria(args.consulta_ms)
+    flask_app.get_db = lambda: bd
+    app = flask_app.app
+    for i in range(args.clases * args.alumnos):
+        bd.tablas.setdefault('usuarios', []).append(
+            {'id': 10_000 + i, 'rol': 'alumno', 'telefono_id': f'tel-{i}'})
+
+    # 1. Inicio en paralelo: un profesor por aula
+    def iniciar(profesor_id, aula):
+        sesion = emitir_sesion({'id': profesor_id, 'rol': 'profesor'})
+        with app.test_client() as c:
+            r = c.post('/api/clase/iniciar', json={'profesor_id': profesor_id, 'aula': aula,
+                                                   'latitud': None, 'longitud': None},
+                       headers={'Authorization': f'Bearer {sesion}'})
+            return r.status_code, r.get_json()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.hilos) as pool:
+        inicios = list(pool.map(lambda p: iniciar(p, f'A-{p}'), range(1, args.clases + 1)))
+    t_inicio = time.perf_counter() - inicio
+    iniciadas = [body for status, body in inicios if status == 200]
+    print(f"clases iniciadas: {len(iniciadas)}/{args.clases} en {t_inicio * 1000:.0f} ms")
+
+    repetida, _ = iniciar(1, 'Z-999')
+    aula_ocupada, _ = iniciar(args.clases + 1, 'a-1')
+    print(f"mismo profesor: {repetida} · misma aula: {aula_ocupada} (esperado 409)")
+
+    # 2. Escaneos: cada alumno escanea el token de su clase
+    tokens = [body['qr_token'] for body in iniciadas]
+    clase_de_token = [body['clase']['id'] for body in iniciadas]
+    consultas_clases = bd.consultas['clases']
+    flask_app.clases_activas.refresco = args.refresco_s
+    latencias, lock = [], threading.Lock()
+
+    def escanear(i):
+        k = i // args.alumnos
+        with app.test_client() as c:
+            t0 = time.perf_counter()
+            r = c.post('/api/registrar-asistencia',
+                       json={'qr_token': tokens[k], 'telefono_id': f'tel-{i}'})
+            with lock:
+                latencias.append((time.perf_counter() - t0) * 1000)
+            return r.status_code, clase_de_token[k], 10_000 + i
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.hilos) as pool:
+        escaneos = list(pool.map(escanear, range(len(tokens) * args.alumnos)))
+    t_escaneo = time.perf_counter() - inicio
+
+    registradas = {(a['alumno_id'], a['clase_id']) for a in bd.tablas.get('asistencias', [])}
+    correctas = sum(1 for status, clase_id, alumno_id in escaneos
+                    if status == 201 and (alumno_id, clase_id) in registradas)
+    consultas_escaneo = bd.consultas['clases'] - consultas_clases
+    print(f"escaneos: {correctas}/{len(escaneos)} en su clase · "
+          f"{len(escaneos) / t_escaneo:.0f}/s · p50 {percentil(latencias, 50):.1f} ms · "
+          f"p95 {percentil(latencias, 95):.1f} ms")
+    print(f"consultas a `clases` durante los escaneos: {consultas_escaneo} "
+          f"(refrescos en segundo plano: {bd.consultas['clases (refresco)']})")
+
+    exito = (len(iniciadas) == args.clases and repetida == aula_ocupada == 409
+             and correctas == len(escaneos) and consultas_escaneo == 0)
+    print('OK' if exito else 'FALLÓ')
+    sys.exit(0 if exito else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/analytics.py
+"""
+Benchmark de utils/analytics.py sobre una matriz alumnos × clases sintética.
+
+Genera `--alumnos` × `--clases` con ~10% de celdas que no aplican, mide cada
+métrica y el `analizar` completo (mediana de `--repeticiones`), y compara
+contra el cálculo alumno por alumno en Python sobre una muestra. Termina con
+exit 1 si `analizar` supera `--presupuesto-ms` o si los resultados difieren.
+
+Uso:
+    python benchmarks/analytics.py [--alumnos 10000] [--clases 200] [--presupuesto-ms 100]
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from utils import analytics  # noqa: E402
+from utils.analytics import NO_APLICA, PRESENTE, JUSTIFICADA  # noqa: E402
+
+
+def medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def por_alumno(fila):
+    """Versión escalar de tasa y rachas, para verificar"""
+    aplicables = [x for x in fila if x != NO_APLICA]
+    asistidas = sum(1 for x in aplicables if x in (PRESENTE, JUSTIFICADA))
+    tasa = asistidas / len(aplicables) * 100 if aplicables else math.nan
+    actual = maxima = 0
+    for x in aplicables:
+        actual = 0 if x in (PRESENTE, JUSTIFICADA) else actual + 1
+        maxima = max(maxima, actual)
+    return tasa, actual, maxima
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analítica vectorizada alumnos × clases')
+    parser.add_argument('--alumnos', type=int, default=10_000)
+    parser.add_argument('--clases', type=int, default=200)
+    parser.add_argument('--repeticiones', type=int, default=7)
+    parser.add_argument('--muestra', type=int, default=500, help='alumnos verificados en Python')
+    parser.add_argument('--presupuesto-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    m = rng.choice(np.array([0, 1, 2, -1], dtype=np.int8), size=(args.alumnos, args.clases),
+                   p=[0.15, 0.7, 0.05, 0.1])
+    semanas = np.arange(args.clases) // 3
+
+    metricas = {
+        'tasas': lambda: analytics.tasas(m),
+        'tasa_movil': lambda: analytics.tasa_movil(m),
+        'rachas': lambda: analytics.rachas(m),
+        'delta_semanal': lambda: analytics.delta_semanal(m, semanas),
+        'proyeccion': lambda: analytics.proyeccion(m, 40),
+        'analizar': lambda: analytics.analizar(m, semanas, clases_restantes=40),
+    }
+    print(f"matriz {args.alumnos} × {args.clases}")
+    tiempos = {}
+    for nombre, fn in metricas.items():
+        tiempos[nombre] = medir(fn, args.repeticiones)
+        print(f"  {nombre:14} {tiempos[nombre]:8.2f} ms")
+
+    resultado = analytics.analizar(m, semanas, clases_restantes=40)
+    indices = rng.choice(args.alumnos, size=min(args.muestra, args.alumnos), replace=False)
+    distintos = 0
+    for i in indices:
+        tasa, actual, maxima = por_alumno(m[i])
+        misma_tasa = (math.isnan(tasa) and math.isnan(resultado['tasa'][i])) or \
+            abs(tasa - resultado['tasa'][i]) < 1e-9
+        if not (misma_tasa and actual == resultado['racha_actual'][i]
+                and maxima == resultado['racha_maxima'][i]):
+            distintos += 1
+
+    inicio = time.perf_counter()
+    for fila in m:
+        por_alumno(fila)
+    lazo_ms = (time.perf_counter() - inicio) * 1000
+    print(f"  lazo Python (tasa + rachas) {lazo_ms:8.0f} ms")
+
+    ok = distintos == 0 and tiempos['analizar'] <= args.presupuesto_ms
+    print(f"\n{'OK' if ok else 'FALLÓ'}: {distintos} diferencias en {len(indices)} alumnos, "
+          f"analizar {tiempos['analizar']:.1f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/availability.py
+"""
+Benchmark del índice de disponibilidad (email/matrícula) con 50k usuarios.
+
+Mide la carga inicial paginada, la memoria del índice, el throughput de
+consultas negativas y positivas y la tasa real de falsos positivos del
+filtro de Bloom. No usa la BD: el cargador sirve filas sintéticas.
+
+Uso:
+    python benchmarks/availability.py [--usuarios 50000] [--consultas 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.availability import IndiceDisponibilidad
+
+
+def usuarios_sinteticos(n):
+    return [{
+        'id': i,
+        'email': f'alumno{i}@universidad.edu.mx',
+        'matricula': f'{23 + i % 3}{i:07d}',
+    } for i in range(1, n + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Índice de disponibilidad')
+    parser.add_argument('--usuarios', type=int, default=50_000)
+    parser.add_argument('--consultas', type=int, default=200_000)
+    args = parser.parse_args()
+
+    filas = usuarios_sinteticos(args.usuarios)
+    paginas = [0]
+
+    def cargar(despues_de, limite):
+        paginas[0] += 1
+        inicio = despues_de or 0
+        return filas[inicio:inicio + limite]
+
+    t0 = time.perf_counter()
+    indice = IndiceDisponibilidad(cargar)
+    indice.puede_existir('email', 'x@y.z')
+    carga = time.perf_counter() - t0
+
+    # Memoria medida en una segunda carga (tracemalloc distorsiona el tiempo)
+    tracemalloc.start()
+    otro = IndiceDisponibilidad(cargar)
+    otro.puede_existir('email', 'x@y.z')
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"carga inicial: {carga * 1000:.0f} ms en {paginas[0] // 2} páginas, "
+          f"memoria {memoria / 1e6:.1f} MB")
+
+    for campo, existentes, ausentes in [
+        ('email', [f['email'] for f in filas], [f'nuevo{i}@universidad.edu.mx' for i in range(args.consultas)]),
+        ('matricula', [f['matricula'] for f in filas], [f'99{i:07d}' for i in range(args.consultas)]),
+    ]:
+        falsos = sum(v in indice._bloom[campo] for v in ausentes)
+        t0 = time.perf_counter()
+        negativos = sum(indice.puede_existir(campo, v) for v in ausentes)
+        t_neg = time.perf_counter() - t0
+        muestra = existentes * (args.consultas // len(existentes) + 1)
+        t0 = time.perf_counter()
+        positivos = sum(indice.puede_existir(campo, v) for v in muestra[:args.consultas])
+        t_pos = time.perf_counter() - t0
+        print(f"{campo:10} negativos {args.consultas / t_neg:10,.0f}/s  positivos {args.consultas / t_pos:10,.0f}/s  "
+              f"FP del Bloom {falsos / len(ausentes):.3%}  (errores: {negativos} falsos 'existe', "
+              f"{args.consultas - positivos} falsos 'libre')")
+
+
+if __name__ == '__main__':
+    main()
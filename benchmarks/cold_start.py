@@ -0,0 +1,85 @@
+# benchmarks/cold_start.py
+"""
+Benchmark de cold start: tiempo de import por módulo (como `python -X importtime`).
+
+Importa el entry point en un proceso nuevo con -X importtime, agrega el tiempo
+propio de cada módulo por paquete raíz y falla (exit 1) si se excede el
+presupuesto total o el presupuesto por módulo.
+
+Uso:
+    python benchmarks/cold_start.py [--target api|app] [--runs 5]
+                                    [--budget-ms 300] [--module-budget-ms 150] [--top 15]
+
+Los presupuestos también se leen de COLD_START_BUDGET_MS y COLD_START_MODULE_BUDGET_MS.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'api': "import sys; sys.path.insert(0, 'api'); import index",
+    'app': "import app",
+}
+
+# import time: self [us] | cumulative | imported package
+LINEA = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def importtime(target):
+    """Ejecuta un import en frío y regresa {paquete_raiz: ms}, total_ms"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', TARGETS[target]],
+                         cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise SystemExit(out.stderr[-2000:])
+
+    por_modulo = defaultdict(float)
+    for linea in out.stderr.splitlines():
+        m = LINEA.match(linea)
+        if not m:
+            continue
+        self_us, _, _, nombre = m.groups()
+        # Tiempo propio agrupado por paquete raíz: flask, werkzeug, requests...
+        # (el acumulado mezclaría a las dependencias dentro de quien las importó primero)
+        por_modulo[nombre.split('.')[0]] += int(self_us) / 1000
+    return dict(por_modulo), sum(por_modulo.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de import para el cold start')
+    parser.add_argument('--target', choices=TARGETS, default='api')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.getenv('COLD_START_BUDGET_MS', '300')))
+    parser.add_argument('--module-budget-ms', type=float,
+                        default=float(os.getenv('COLD_START_MODULE_BUDGET_MS', '150')))
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    corridas = [importtime(args.target) for _ in range(args.runs)]
+    modulos = {m for por_modulo, _ in corridas for m in por_modulo}
+    medianas = {m: statistics.median(c[0].get(m, 0.0) for c in corridas) for m in modulos}
+    total = statistics.median(t for _, t in corridas)
+
+    print(f"Cold start '{args.target}' — mediana de {args.runs} corridas")
+    for nombre, ms in sorted(medianas.items(), key=lambda x: -x[1])[:args.top]:
+        marca = '  <-- excede' if ms > args.module_budget_ms else ''
+        print(f"  {nombre:30} {ms:8.1f} ms{marca}")
+    print(f"  {'TOTAL':30} {total:8.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+
+    excedidos = [m for m, ms in medianas.items() if ms > args.module_budget_ms]
+    if total > args.budget_ms or excedidos:
+        print("❌ Presupuesto de cold start excedido")
+        sys.exit(1)
+    print("✅ Dentro del presupuesto")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/geofence.py
+"""
+Benchmark y verificación de precisión de utils/geofence.py.
+
+Compara la geocerca (proyección local precalculada) y haversine contra
+geopy.geodesic en puntos aleatorios alrededor de un aula, y mide el
+throughput escalar y por lotes (NumPy). Termina con exit 1 si el error
+supera la tolerancia.
+
+Uso:
+    python benchmarks/geofence.py [--n 100000] [--radio 200] [--tolerancia-m 0.05]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.geofence import Geocerca, haversine
+
+# Facultad en CDMX; cambia poco el resultado mientras no sea cerca de los polos
+LAT0, LON0 = 19.3326, -99.1843
+
+
+def puntos(n, radio_m, seed=7):
+    rnd = random.Random(seed)
+    kx = 111_195 * math.cos(math.radians(LAT0))
+    out = []
+    for _ in range(n):
+        r = radio_m * math.sqrt(rnd.random())
+        t = rnd.random() * 2 * math.pi
+        out.append((LAT0 + r * math.sin(t) / 111_195, LON0 + r * math.cos(t) / kx))
+    return out
+
+
+def cronometrar(nombre, fn, n):
+    inicio = time.perf_counter()
+    fn()
+    total = time.perf_counter() - inicio
+    print(f"  {nombre:34} {n / total:14,.0f} puntos/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Geocercas: precisión y throughput')
+    parser.add_argument('--n', type=int, default=100_000)
+    parser.add_argument('--radio', type=float, default=200.0)
+    parser.add_argument('--tolerancia-m', type=float, default=0.05)
+    args = parser.parse_args()
+
+    pts = puntos(args.n, args.radio)
+    circulo = Geocerca(LAT0, LON0, 50)
+    # Aula en "L" de ~40 m
+    poligono = Geocerca(LAT0, LON0, 2, poligono=[
+        (LAT0 - 0.0001, LON0 - 0.0002), (LAT0 - 0.0001, LON0 + 0.0002),
+        (LAT0 + 0.0000, LON0 + 0.0002), (LAT0 + 0.0000, LON0 + 0.0000),
+        (LAT0 + 0.0002, LON0 + 0.0000), (LAT0 + 0.0002, LON0 - 0.0002),
+    ])
+
+    fallas = 0
+    print("Precisión")
+    try:
+        from geopy.distance import geodesic
+    except ImportError:
+        geodesic = None
+        print("  geopy no instalado: se compara contra haversine")
+
+    muestra = pts[:min(len(pts), 5_000)]
+    referencia = [geodesic((LAT0, LON0), p).meters if geodesic else haversine(LAT0, LON0, *p)
+                  for p in muestra]
+    error = max(abs(circulo.distancia(*p) - d) for p, d in zip(muestra, referencia))
+    estado = 'ok' if error <= args.tolerancia_m else 'EXCEDE'
+    fallas += estado != 'ok'
+    print(f"  geocerca     error máx {error:.3f} m sobre {args.radio:.0f} m  [{estado}]")
+    # haversine (esfera) es solo informativo: su error crece ~0.3-0.5% con la distancia
+    error = max(abs(haversine(LAT0, LON0, *p) - d) for p, d in zip(muestra, referencia))
+    print(f"  haversine    error máx {error:.3f} m sobre {args.radio:.0f} m  [referencia]")
+
+    import numpy as np
+    lats = np.array([p[0] for p in pts])
+    lons = np.array([p[1] for p in pts])
+    for nombre, g in [('círculo', circulo), ('polígono', poligono)]:
+        mascara, _ = g.contiene_lote(lats, lons)
+        escalar = np.array([g.contiene(*p)[0] for p in pts])
+        distintos = int((mascara != escalar).sum())
+        fallas += distintos > 0
+        print(f"  lote vs escalar ({nombre}): {distintos} diferencias")
+
+    print("Throughput")
+    if geodesic:
+        m = pts[:20_000]
+        cronometrar('geopy.geodesic', lambda: [geodesic((LAT0, LON0), p).meters for p in m], len(m))
+    cronometrar('haversine', lambda: [haversine(LAT0, LON0, *p) for p in pts], len(pts))
+    cronometrar('Geocerca.contiene (círculo)', lambda: [circulo.contiene(*p) for p in pts], len(pts))
+    cronometrar('Geocerca.contiene (polígono)', lambda: [poligono.contiene(*p) for p in pts], len(pts))
+    cronometrar('contiene_lote (círculo)', lambda: circulo.contiene_lote(lats, lons), len(pts))
+    cronometrar('contiene_lote (polígono)', lambda: poligono.contiene_lote(lats, lons), len(pts))
+
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == '__main__':
+    main()
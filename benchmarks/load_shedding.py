@@ -0,0 +1,119 @@
+# benchmarks/load_shedding.py
+"""
+Prueba de carga del descarte por prioridad (utils/load_shedding.py).
+
+Simula una BD con `--capacidad` conexiones y `--consulta-ms` por consulta.
+Varios profesores recargan el dashboard en bucle (cada carga son `--fanout`
+consultas, prioridad BAJA) mientras los alumnos escanean (3 consultas,
+prioridad CRITICA). Se corre dos veces: sin descarte y con el ControlCarga
+por defecto, y se compara la latencia de los escaneos.
+
+Uso:
+    python benchmarks/load_shedding.py [--dashboards 30] [--escaneos-por-s 40] [--segundos 5]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.load_shedding import ControlCarga, CRITICA, BAJA
+
+
+class BDSimulada:
+    """Pool de conexiones acotado: con más consultas que conexiones, se hace cola"""
+
+    def __init__(self, control, capacidad, consulta_ms):
+        self.control = control
+        self.conexiones = threading.Semaphore(capacidad)
+        self.consulta_s = consulta_ms / 1000
+
+    def consulta(self):
+        with self.control.consulta_bd():
+            with self.conexiones:
+                time.sleep(self.consulta_s)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))] if ordenados else 0.0
+
+
+def escenario(control, args):
+    bd = BDSimulada(control, args.capacidad, args.consulta_ms)
+    fin = time.monotonic() + args.segundos
+    latencias, dashboards = [], {'ok': 0, 'descartados': 0}
+    lock = threading.Lock()
+
+    def profesor():
+        while time.monotonic() < fin:
+            with control.request(BAJA) as admitido:
+                if not admitido:
+                    with lock:
+                        dashboards['descartados'] += 1
+                    time.sleep(0.5)  # el cliente respeta Retry-After (acortado)
+                    continue
+                for _ in range(args.fanout):
+                    bd.consulta()
+            with lock:
+                dashboards['ok'] += 1
+
+    def escaneo():
+        inicio = time.perf_counter()
+        with control.request(CRITICA):
+            for _ in range(3):
+                bd.consulta()
+        with lock:
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    hilos = [threading.Thread(target=profesor) for _ in range(args.dashboards)]
+    for h in hilos:
+        h.start()
+    time.sleep(0.2)  # que la BD ya esté saturada cuando empiecen los escaneos
+    intervalo = 1 / args.escaneos_por_s
+    while time.monotonic() < fin:
+        h = threading.Thread(target=escaneo)
+        h.start()
+        hilos.append(h)
+        time.sleep(intervalo)
+    for h in hilos:
+        h.join()
+    return latencias, dashboards
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latencia de escaneos con y sin descarte')
+    parser.add_argument('--dashboards', type=int, default=30, help='profesores recargando')
+    parser.add_argument('--fanout', type=int, default=50, help='consultas por dashboard')
+    parser.add_argument('--escaneos-por-s', type=float, default=40)
+    parser.add_argument('--capacidad', type=int, default=8, help='conexiones de la BD')
+    parser.add_argument('--consulta-ms', type=float, default=10)
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--slo-ms', type=float, default=300, help='p95 objetivo del escaneo')
+    args = parser.parse_args()
+
+    print(f"{'escenario':14} {'escaneos':>9} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8} "
+          f"{'dash ok':>8} {'dash 503':>9}")
+    escenarios = [
+        ('sin descarte', ControlCarga(max_bd=10 ** 9, max_baja=10 ** 9, espera_baja_s=0)),
+        ('con descarte', ControlCarga()),
+    ]
+    p95s = {}
+    for nombre, control in escenarios:
+        latencias, dashboards = escenario(control, args)
+        p95s[nombre] = percentil(latencias, 95)
+        print(f"{nombre:14} {len(latencias):>9} {percentil(latencias, 50):>8.0f} "
+              f"{p95s[nombre]:>8.0f} {max(latencias):>8.0f} "
+              f"{dashboards['ok']:>8} {dashboards['descartados']:>9}")
+
+    cumple = p95s['con descarte'] <= args.slo_ms
+    print(f"\np95 del escaneo con descarte {'cumple' if cumple else 'NO cumple'} "
+          f"el SLO de {args.slo_ms:.0f} ms")
+    sys.exit(0 if cumple else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/password_hashing.py
+"""
+Dimensiona el pool de hashing de contraseñas contra ráfagas de login.
+
+Para el costo configurado (PASSWORD_SCRYPT_N/_R/_P) mide la latencia de un
+hash y, para cada tamaño de pool, el throughput y la latencia p50/p95 de una
+ráfaga de --rafaga logins simultáneos (p. ej. un grupo entero al empezar la
+clase). Sugiere el pool más chico cuyo p95 cabe en --slo-ms.
+
+Uso:
+    python benchmarks/password_hashing.py [--rafaga 60] [--slo-ms 2000] [--max-workers 8]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.passwords import (PoolHashing, hash_scrypt, verificar_sincrono,
+                             SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def rafaga(workers, n, almacenado):
+    """n logins que llegan a la vez; regresa (segundos totales, latencias ms)"""
+    pool = PoolHashing(workers=workers, max_cola=n)
+    latencias = []
+    lock = threading.Lock()
+    salida = threading.Event()
+
+    def login():
+        salida.wait()
+        inicio = time.perf_counter()
+        valida, _ = pool.verificar('contraseña-de-prueba', almacenado)
+        assert valida
+        with lock:
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    hilos = [threading.Thread(target=login) for _ in range(n)]
+    for h in hilos:
+        h.start()
+    inicio = time.perf_counter()
+    salida.set()
+    for h in hilos:
+        h.join()
+    return time.perf_counter() - inicio, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput del pool de hashing')
+    parser.add_argument('--rafaga', type=int, default=60, help='logins simultáneos')
+    parser.add_argument('--slo-ms', type=float, default=2000, help='p95 aceptable por login')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    almacenado = hash_scrypt('contraseña-de-prueba')
+    muestras = []
+    for _ in range(5):
+        inicio = time.perf_counter()
+        verificar_sincrono('contraseña-de-prueba', almacenado)
+        muestras.append((time.perf_counter() - inicio) * 1000)
+    memoria_mib = 128 * SCRYPT_N * SCRYPT_R / 2 ** 20
+    print(f"scrypt n={SCRYPT_N} r={SCRYPT_R} p={SCRYPT_P}: "
+          f"{statistics.median(muestras):.1f} ms/hash, {memoria_mib:.0f} MiB por hash")
+    print(f"Ráfaga de {args.rafaga} logins, CPUs: {os.cpu_count()}\n")
+    print(f"{'workers':>8} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'máx ms':>9}")
+
+    sugerido = None
+    workers = 1
+    while workers <= args.max_workers:
+        total, latencias = rafaga(workers, args.rafaga, almacenado)
+        p95 = percentil(latencias, 95)
+        print(f"{workers:>8} {args.rafaga / total:>10.1f} {percentil(latencias, 50):>9.0f} "
+              f"{p95:>9.0f} {max(latencias):>9.0f}")
+        if sugerido is None and p95 <= args.slo_ms:
+            sugerido = workers
+        workers *= 2
+
+    if sugerido is None:
+        print(f"\nNingún pool cumple p95 <= {args.slo_ms:.0f} ms: bajar el costo o "
+              f"repartir la ráfaga (PASSWORD_HASH_QUEUE limita la espera)")
+    else:
+        print(f"\nPASSWORD_HASH_WORKERS={sugerido} cumple p95 <= {args.slo_ms:.0f} ms "
+              f"(memoria pico ~{sugerido * memoria_mib:.0f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
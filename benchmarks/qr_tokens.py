@@ -0,0 +1,48 @@
+# benchmarks/qr_tokens.py
+"""
+Microbenchmark de emisión y verificación de tokens de QR firmados.
+
+Uso:
+    python benchmarks/qr_tokens.py [--n 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QR_SECRET', 'benchmark-qr')
+
+from utils.qr_tokens import emitir_token, verificar_token  # noqa: E402
+
+
+def medir(nombre, fn, n):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        fn()
+    total = time.perf_counter() - inicio
+    print(f"{nombre:28} {n / total:12,.0f} ops/s   {total / n * 1e6:7.2f} µs/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput de tokens de QR')
+    parser.add_argument('--n', type=int, default=200_000)
+    args = parser.parse_args()
+
+    token = emitir_token(12345)
+    falso = token[:-2] + ('AA' if not token.endswith('AA') else 'BB')
+    viejo = emitir_token(12345, ahora=time.time() - 3600)
+
+    assert verificar_token(token) == 12345
+    assert verificar_token(falso) is None
+    assert verificar_token(viejo) is None
+
+    medir('emitir', lambda: emitir_token(12345), args.n)
+    medir('verificar (válido)', lambda: verificar_token(token), args.n)
+    medir('verificar (firma falsa)', lambda: verificar_token(falso), args.n)
+    medir('verificar (expirado)', lambda: verificar_token(viejo), args.n)
+
+
+if __name__ == '__main__':
+    main()
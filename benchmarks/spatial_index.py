@@ -0,0 +1,67 @@
+# benchmarks/spatial_index.py
+"""
+Benchmark y verificación de utils/spatial_index.py.
+
+Coloca `--clases` clases activas al azar en un campus de `--lado-m` metros
+y responde `--consultas` búsquedas "clases a menos de R metros" con la
+rejilla geohash y con un recorrido lineal (haversine contra todas). Termina
+con exit 1 si algún resultado difiere.
+
+Uso:
+    python benchmarks/spatial_index.py [--clases 500] [--consultas 20000] [--radio 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.geofence import haversine
+from utils.spatial_index import IndiceGeohash
+
+LAT0, LON0 = 19.3326, -99.1843
+_GRADOS_POR_M = 1 / 111_320
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rejilla geohash vs recorrido lineal')
+    parser.add_argument('--clases', type=int, default=500)
+    parser.add_argument('--consultas', type=int, default=20_000)
+    parser.add_argument('--radio', type=float, default=50)
+    parser.add_argument('--lado-m', type=float, default=2_000, help='lado del campus')
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    medio = args.lado_m / 2 * _GRADOS_POR_M
+
+    def punto():
+        return LAT0 + rnd.uniform(-medio, medio), LON0 + rnd.uniform(-medio, medio)
+
+    clases = {i: punto() for i in range(args.clases)}
+    indice = IndiceGeohash()
+    for clase_id, (lat, lon) in clases.items():
+        indice.agregar(clase_id, lat, lon)
+    consultas = [punto() for _ in range(args.consultas)]
+
+    inicio = time.perf_counter()
+    por_indice = [sorted(c for c, _ in indice.cercanas(lat, lon, args.radio)) for lat, lon in consultas]
+    t_indice = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    lineal = [sorted(c for c, (la, lo) in clases.items() if haversine(lat, lon, la, lo) <= args.radio)
+              for lat, lon in consultas]
+    t_lineal = time.perf_counter() - inicio
+
+    print(f"{args.clases} clases, {args.consultas} consultas, radio {args.radio:.0f} m")
+    print(f"geohash: {t_indice / args.consultas * 1e6:8.1f} µs/consulta")
+    print(f"lineal:  {t_lineal / args.consultas * 1e6:8.1f} µs/consulta")
+    iguales = por_indice == lineal
+    print('resultados idénticos' if iguales else 'RESULTADOS DISTINTOS')
+    sys.exit(0 if iguales else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/startup.py
+"""
+Benchmark de arranque del worker.
+
+Importa app.py en un proceso nuevo N veces y mide cuánto tarda la importación
+y la primera respuesta de /healthz. Por defecto apunta SUPABASE_URL a una IP
+no enrutable para demostrar que el arranque ya no espera a la base de datos.
+
+Uso:
+    python benchmarks/startup.py [--runs 10] [--real-db]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+r = app.app.test_client().get('/healthz')
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'first_healthz_ms': (t2 - t1) * 1000,
+                  'healthz_status': r.status_code}))
+"""
+
+
+def medir(runs, real_db):
+    env = dict(os.environ)
+    if not real_db:
+        env['SUPABASE_URL'] = 'http://10.255.255.1'
+        env['SUPABASE_KEY'] = 'benchmark'
+    muestras = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        muestras.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return muestras
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--real-db', action='store_true',
+                        help='Usar las credenciales de .env en lugar de una IP inalcanzable')
+    args = parser.parse_args()
+
+    muestras = medir(args.runs, args.real_db)
+    for clave in ('import_ms', 'first_healthz_ms'):
+        valores = [m[clave] for m in muestras]
+        print(f"{clave:18} min={min(valores):8.1f}  mediana={statistics.median(valores):8.1f}  "
+              f"max={max(valores):8.1f}")
+    print(f"healthz status: {sorted({m['healthz_status'] for m in muestras})}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,35 +4,45 @@ Módulo de base de datos para Asistencia App
 Maneja todas las conexiones y operaciones con Supabase
 """
 
+import os
+
 from .supabase_client import SupabaseClient
+from .health import HealthChecker
 
 # Instancia global del cliente (singleton)
 _db_instance = None
+_health = None
 
 def get_db():
     """
     Retorna una instancia única del cliente de Supabase
     Patrón Singleton para evitar múltiples conexiones
+    El cliente se construye en el primer uso, no al importar
     """
     global _db_instance
     if _db_instance is None:
         _db_instance = SupabaseClient()
     return _db_instance
 
+def _probe():
+    """Consulta mínima para verificar que Supabase responde"""
+    return get_db().query('usuarios', params={'select': 'id', 'limit': 1}) is not None
+
+def get_health():
+    """Retorna el verificador de salud (singleton)"""
+    global _health
+    if _health is None:
+        _health = HealthChecker(_probe, interval=float(os.getenv('HEALTHCHECK_INTERVAL', '30')))
+    return _health
+
 def init_db():
     """
-    Inicializa la conexión a la base de datos
-    Verifica que la conexión sea exitosa
+    Inicializa la conexión a la base de datos sin bloquear
+    Arranca el verificador de salud en segundo plano y regresa de inmediato;
+    el estado real se consulta con get_health()
     """
-    try:
-        db = get_db()
-        # Hacer una consulta simple para verificar conexión
-        result = db.query('usuarios', params={'select': 'count', 'limit': 1})
-        print("✅ Conexión a Supabase establecida correctamente")
-        return True
-    except Exception as e:
-        print(f"❌ Error conectando a Supabase: {e}")
-        return False
+    get_health().ensure_started()
+    return True
 
 # Exportar todo lo necesario
-__all__ = ['get_db', 'init_db', 'SupabaseClient']
\ No newline at end of file
+__all__ = ['get_db', 'init_db', 'get_health', 'SupabaseClient', 'HealthChecker']
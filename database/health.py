@@ -0,0 +1,80 @@
+# database/health.py
+"""
+Verificador de salud de la base de datos en segundo plano.
+
+Sustituye a la consulta síncrona que se hacía al importar app.py: el worker
+arranca de inmediato y un hilo daemon consulta Supabase periódicamente.
+Si la consulta falla, el estado pasa a 'degraded' en lugar de tumbar el proceso.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+STARTING = 'starting'
+OK = 'ok'
+DEGRADED = 'degraded'
+
+
+class HealthChecker:
+    """Hilo daemon que prueba la conexión a Supabase cada `interval` segundos"""
+
+    def __init__(self, probe, interval=30.0):
+        self.probe = probe
+        self.interval = interval
+        self.status = STARTING
+        self.last_check = None
+        self.last_error = None
+        self.latency_ms = None
+        self.started_at = time.time()
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """
+        Arranca el hilo si no está corriendo en este proceso.
+        Compara el PID porque los hilos no sobreviven al fork de gunicorn --preload.
+        """
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='db-health', daemon=True)
+            self._thread.start()
+
+    def check_now(self):
+        """Ejecuta una prueba de conexión y actualiza el estado"""
+        inicio = time.perf_counter()
+        try:
+            ok = bool(self.probe())
+            error = None if ok else 'La consulta de prueba no devolvió datos'
+        except Exception as e:
+            ok, error = False, str(e)
+        self.latency_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        self.last_check = datetime.now().isoformat()
+        self.last_error = error
+        self.status = OK if ok else DEGRADED
+        return self.status
+
+    def _run(self):
+        while True:
+            self.check_now()
+            time.sleep(self.interval)
+
+    def is_ready(self):
+        return self.status == OK
+
+    def snapshot(self):
+        """Estado actual para /healthz"""
+        return {
+            'status': self.status,
+            'last_check': self.last_check,
+            'last_error': self.last_error,
+            'latency_ms': self.latency_ms,
+            'uptime_s': round(time.time() - self.started_at, 1),
+        }
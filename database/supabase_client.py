@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 import requests
 import json
 
+from utils.load_shedding import get_control
+
 load_dotenv()
 
 class SupabaseClient:
@@ -20,6 +22,8 @@ class SupabaseClient:
             'Content-Type': 'application/json',
             'Prefer': 'return=representation'  # Importante para que devuelva el objeto creado
         }
+        # Sin timeout una petición colgada bloquea el worker indefinidamente
+        self.timeout = float(os.getenv('SUPABASE_TIMEOUT', '10'))
     
     def query(self, table, method='GET', data=None, params=None):
         url = f"{self.url}/rest/v1/{table}"
@@ -31,14 +35,16 @@ class SupabaseClient:
             print(f"🔍 Params: {params}")
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=self.headers, params=params)
-            elif method == 'POST':
-                response = requests.post(url, headers=self.headers, json=data)
-            elif method == 'PATCH':
-                response = requests.patch(url, headers=self.headers, json=data, params=params)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=self.headers, params=params)
+            # Cada petición cuenta como "en vuelo" para el descarte por prioridad
+            with get_control().consulta_bd():
+                if method == 'GET':
+                    response = requests.get(url, headers=self.headers, params=params, timeout=self.timeout)
+                elif method == 'POST':
+                    response = requests.post(url, headers=self.headers, json=data, timeout=self.timeout)
+                elif method == 'PATCH':
+                    response = requests.patch(url, headers=self.headers, json=data, params=params, timeout=self.timeout)
+                elif method == 'DELETE':
+                    response = requests.delete(url, headers=self.headers, params=params, timeout=self.timeout)
             
             print(f"📥 Status Code: {response.status_code}")
             print(f"📥 Response: {response.text[:200]}")  # Primeros 200 caracteres
@@ -1,10 +1,16 @@
 # models/attendance.py
-import qrcode
+import os
 import json
 from datetime import datetime
 
-def generar_qr_clase(clase_id, profesor_id, latitud, longitud):
-    """Genera QR con datos de la clase"""
+def generar_qr_clase(clase_id, profesor_id, latitud, longitud, formato='png'):
+    """Genera QR con datos de la clase (reutiliza el archivo si ya existe)"""
+    from utils.qr_render import get_qr_renderer
+
+    ruta = f"static/qr_codes/clase_{clase_id}.{formato}"
+    if os.path.exists(ruta):
+        return ruta
+
     data = {
         'clase_id': clase_id,
         'profesor_id': profesor_id,
@@ -13,14 +19,12 @@ def generar_qr_clase(clase_id, profesor_id, latitud, longitud):
         'timestamp': datetime.now().isoformat()
     }
     
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(json.dumps(data))
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    img.save(f"static/qr_codes/clase_{clase_id}.png")
+    contenido = get_qr_renderer().render(json.dumps(data), formato)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'wb') as f:
+        f.write(contenido)
     
-    return f"static/qr_codes/clase_{clase_id}.png"
+    return ruta
 from database import get_db
 
 def registrar_asistencia(clase_id, alumno_id, latitud, longitud):
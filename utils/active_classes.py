@@ -0,0 +1,203 @@
+# utils/active_classes.py
+"""
+Registro en memoria de las clases activas del campus.
+
+Cada profesor puede tener una clase activa y cada aula alojar una a la vez;
+clases de profesores y aulas distintos corren en paralelo. El registro
+mantiene tres índices (dicts) para que ninguna búsqueda recorra la tabla:
+
+- clase_id -> fila de `clases` (ruta del escaneo: el token trae el id);
+- profesor_id -> clase_id;
+- aula -> clase_id;
+- celda geohash -> clases (utils/spatial_index.py), para buscar por GPS.
+
+Se llena con una sola consulta de las clases activas y se refresca cada
+`refresco` segundos para ver lo que iniciaron o terminaron otros workers.
+Solo la primera carga es síncrona; después, una lectura que encuentra el
+registro vencido lanza el refresco en un hilo y sigue con lo que ya hay
+(stale-while-revalidate), así que ningún escaneo espera a esa consulta ni
+la toma bajo el candado. Lo que esta instancia activa o termina mientras el
+refresco está en vuelo se vuelve a aplicar sobre el resultado.
+Un clase_id desconocido entre refrescos se busca puntualmente en la BD
+(y se recuerda brevemente si no está activa).
+
+En la BD, índices parciales para que la consulta de activas y las de
+unicidad no escaneen el histórico de clases:
+
+    CREATE INDEX clases_activas ON clases (id) WHERE activa;
+    CREATE UNIQUE INDEX clases_activa_profesor ON clases (profesor_id) WHERE activa;
+    CREATE UNIQUE INDEX clases_activa_aula ON clases (aula) WHERE activa AND aula IS NOT NULL;
+"""
+
+import os
+import threading
+import time
+
+from utils.cache import TTLCache
+from utils.spatial_index import IndiceGeohash
+
+REFRESCO_S = float(os.getenv('ACTIVE_CLASSES_REFRESH_S', '15'))
+
+
+def normalizar_aula(aula):
+    """'  b-204 ' -> 'B-204'; vacío -> None"""
+    aula = str(aula or '').strip().upper()
+    return aula or None
+
+
+class RegistroClasesActivas:
+    """
+    - cargar_activas() -> filas de `clases` con activa=true (None si falla)
+    - cargar_clase(clase_id) -> la fila si existe y está activa, o None
+    """
+
+    def __init__(self, cargar_activas, cargar_clase, refresco=REFRESCO_S):
+        self.cargar_activas = cargar_activas
+        self.cargar_clase = cargar_clase
+        self.refresco = refresco
+        self._clases = {}
+        self._por_profesor = {}
+        self._por_aula = {}
+        self._espacial = IndiceGeohash()
+        self._inactivas = TTLCache(ttl=min(refresco, 5.0), max_entries=4096)
+        self._cargado = 0.0
+        self._refrescando = False
+        self._diario = None     # (activar|terminar, dato) durante un refresco
+        self._lock = threading.Lock()
+        self._primera = threading.Lock()
+
+    # ── Lecturas (O(1)) ───────────────────────
+    def get(self, clase_id):
+        """Clase activa por id, o None"""
+        self._vigente()
+        try:
+            clase_id = int(clase_id)
+        except (TypeError, ValueError):
+            return None
+        clase = self._clases.get(clase_id)
+        if clase is not None or self._inactivas.get(clase_id):
+            return clase
+        clase = self.cargar_clase(clase_id)
+        if clase and clase.get('activa'):
+            self.activar(clase)
+            return clase
+        self._inactivas.set(clase_id, True)
+        return None
+
+    def de_profesor(self, profesor_id):
+        self._vigente()
+        clase_id = self._por_profesor.get(str(profesor_id))
+        return self._clases.get(clase_id) if clase_id is not None else None
+
+    def en_aula(self, aula):
+        self._vigente()
+        clase_id = self._por_aula.get(normalizar_aula(aula))
+        return self._clases.get(clase_id) if clase_id is not None else None
+
+    def ultima(self):
+        """La clase activa iniciada más recientemente (compatibilidad)"""
+        self._vigente()
+        clases = list(self._clases.values())
+        return max(clases, key=lambda c: (str(c.get('created_at') or ''), c['id'])) if clases else None
+
+    def cercanas(self, lat, lon, radio_m):
+        """[(clase, distancia_m)] activas a menos de radio_m del punto"""
+        self._vigente()
+        clases = self._clases
+        return [(clases[clase_id], d) for clase_id, d in self._espacial.cercanas(lat, lon, radio_m)
+                if clase_id in clases]
+
+    def todas(self):
+        self._vigente()
+        return list(self._clases.values())
+
+    def __len__(self):
+        return len(self._clases)
+
+    # ── Escrituras de esta instancia ──────────
+    def activar(self, clase):
+        with self._lock:
+            self._indexar(clase)
+            if self._diario is not None:
+                self._diario.append((self._indexar, clase))
+        self._inactivas.pop(clase['id'])
+
+    def terminar(self, clase_id):
+        with self._lock:
+            self._desindexar(int(clase_id))
+            if self._diario is not None:
+                self._diario.append((self._desindexar, int(clase_id)))
+        self._inactivas.set(int(clase_id), True)
+
+    # ── Internos ──────────────────────────────
+    def _indexar(self, clase):
+        clase_id = int(clase['id'])
+        self._desindexar(clase_id)
+        self._clases[clase_id] = clase
+        self._por_profesor[str(clase.get('profesor_id'))] = clase_id
+        aula = normalizar_aula(clase.get('aula'))
+        if aula:
+            self._por_aula[aula] = clase_id
+        self._espacial.agregar(clase_id, clase.get('latitud_referencia'), clase.get('longitud_referencia'))
+
+    def _desindexar(self, clase_id):
+        self._espacial.quitar(clase_id)
+        clase = self._clases.pop(clase_id, None)
+        if clase is None:
+            return
+        profesor = str(clase.get('profesor_id'))
+        if self._por_profesor.get(profesor) == clase_id:
+            del self._por_profesor[profesor]
+        aula = normalizar_aula(clase.get('aula'))
+        if aula and self._por_aula.get(aula) == clase_id:
+            del self._por_aula[aula]
+
+    def _vigente(self):
+        if time.monotonic() - self._cargado < self.refresco:
+            return
+        if not self._cargado:
+            # Primera carga: sin ella no hay nada que servir
+            with self._primera:
+                if not self._cargado:
+                    self._refrescar()
+            return
+        with self._lock:
+            if self._refrescando:
+                return  # otro hilo ya está refrescando
+            self._refrescando = True
+        try:
+            threading.Thread(target=self._refrescar, name='clases-activas', daemon=True).start()
+        except RuntimeError:
+            with self._lock:
+                self._refrescando = False
+
+    def _refrescar(self):
+        with self._lock:
+            self._refrescando = True
+            self._diario = []
+        try:
+            filas = self.cargar_activas()
+        except Exception as e:
+            print(f"Error refrescando clases activas: {e}")
+            filas = None
+        with self._lock:
+            self._cargado = time.monotonic()
+            self._refrescando = False
+            diario, self._diario = self._diario, None
+            if filas is None:
+                return  # BD no disponible: se conserva lo último conocido
+            clases, por_profesor, por_aula, espacial = {}, {}, {}, IndiceGeohash()
+            for clase in filas:
+                clase_id = int(clase['id'])
+                clases[clase_id] = clase
+                por_profesor[str(clase.get('profesor_id'))] = clase_id
+                aula = normalizar_aula(clase.get('aula'))
+                if aula:
+                    por_aula[aula] = clase_id
+                espacial.agregar(clase_id, clase.get('latitud_referencia'), clase.get('longitud_referencia'))
+            # Se reemplazan completos: los lectores nunca ven un índice a medias
+            self._clases, self._por_profesor, self._por_aula = clases, por_profesor, por_aula
+            self._espacial = espacial
+            # Lo que esta instancia cambió mientras se consultaba la BD
+            for aplicar, dato in diario:
+                aplicar(dato)
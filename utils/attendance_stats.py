@@ -0,0 +1,103 @@
+# utils/attendance_stats.py
+"""
+Conteos de asistencia por profesor, mantenidos de forma incremental.
+
+El dashboard del profesor necesita, por alumno, cuántas clases tiene
+presentes y justificadas. En lugar de recontar con una consulta por alumno,
+se cargan todos los conteos del profesor de una vez (clases + asistencias)
+y después se ajustan con cada escritura hecha en esta instancia: escaneos,
+justificaciones y clases nuevas. El TTL hace que los cambios de otras
+instancias aparezcan en la siguiente recarga.
+
+Cada fila de `asistencias` cuenta una sola vez: presente si es válida, si
+no justificada si lo está; si no existe, es falta.
+"""
+
+import threading
+from collections import Counter
+
+from utils.cache import TTLCache
+
+PRESENTE, JUSTIFICADA, FALTA = 'P', 'J', 'F'
+
+
+def estado_de(fila):
+    """Estado de una fila de `asistencias` (None = sin registro = falta)"""
+    if not fila:
+        return FALTA
+    if fila.get('valida'):
+        return PRESENTE
+    return JUSTIFICADA if fila.get('justificada') else FALTA
+
+
+class ConteosProfesor:
+    __slots__ = ('clases', 'por_materia', 'alumnos')
+
+    def __init__(self, clases, alumnos):
+        self.clases = clases      # clase_id -> materia_id (o None)
+        self.por_materia = Counter(clases.values())
+        self.alumnos = alumnos    # alumno_id -> [presentes, justificadas]
+
+    def de_alumno(self, alumno_id):
+        presentes, justificadas = self.alumnos.get(alumno_id, (0, 0))
+        return presentes, justificadas
+
+    def total_clases(self, materias=None):
+        """Clases que le tocan a un alumno inscrito en `materias` (None = todas).
+        Las clases sin materia cuentan para todos."""
+        if materias is None:
+            return len(self.clases)
+        return self.por_materia[None] + sum(self.por_materia[m] for m in materias)
+
+
+class ConteosAsistencia:
+    """
+    `cargar(profesor_id) -> (clases, filas)`: clases es {clase_id: materia_id}
+    y filas son las asistencias (alumno_id, valida, justificada) de esas clases.
+    """
+
+    def __init__(self, cargar, ttl=300.0, max_profesores=512):
+        self.cargar = cargar
+        self._cache = TTLCache(ttl=ttl, max_entries=max_profesores)
+        self._lock = threading.Lock()
+
+    def de_profesor(self, profesor_id):
+        conteos = self._cache.get(profesor_id)
+        if conteos is None:
+            clases, filas = self.cargar(profesor_id)
+            alumnos = {}
+            for fila in filas:
+                estado = estado_de(fila)
+                if estado == FALTA:
+                    continue
+                c = alumnos.setdefault(fila['alumno_id'], [0, 0])
+                c[0 if estado == PRESENTE else 1] += 1
+            conteos = ConteosProfesor(dict(clases), alumnos)
+            self._cache.set(profesor_id, conteos)
+        return conteos
+
+    # ── Ajustes incrementales ─────────────────
+    def cambio(self, profesor_id, alumno_id, antes, despues):
+        """Una fila pasó de `antes` a `despues` (PRESENTE / JUSTIFICADA / FALTA)"""
+        if antes == despues:
+            return
+        conteos = self._cache.get(profesor_id)
+        if conteos is None:
+            return  # no está cargado: la próxima carga lo leerá de la BD
+        with self._lock:
+            c = conteos.alumnos.setdefault(alumno_id, [0, 0])
+            if antes != FALTA:
+                c[0 if antes == PRESENTE else 1] -= 1
+            if despues != FALTA:
+                c[0 if despues == PRESENTE else 1] += 1
+
+    def clase_creada(self, profesor_id, clase_id, materia_id=None):
+        conteos = self._cache.get(profesor_id)
+        if conteos is not None:
+            with self._lock:
+                if clase_id not in conteos.clases:
+                    conteos.clases[clase_id] = materia_id
+                    conteos.por_materia[materia_id] += 1
+
+    def invalidar(self, profesor_id):
+        self._cache.pop(profesor_id)
@@ -0,0 +1,146 @@
+# utils/availability.py
+"""
+Índice en memoria para verificar si un email o matrícula ya están registrados.
+
+register.html consulta /api/check/<campo> mientras el usuario escribe. En
+lugar de ir a `usuarios` en cada tecla, se mantiene por instancia:
+
+- un filtro de Bloom por campo: "seguro no existe" sin tocar la BD;
+- una lista ordenada de valores normalizados: membresía exacta con bisect
+  (y búsquedas por prefijo si algún día se necesitan).
+
+El índice se carga en la primera consulta, se actualiza incrementalmente
+por `id` (siempre presente, a diferencia de created_at) y se alimenta con
+cada registro hecho en esta instancia. Un id se asigna al insertar pero la
+fila se ve hasta que la transacción confirma, así que un id menor puede
+aparecer después de uno mayor: cada refresco vuelve a leer los últimos
+`solape` ids ya vistos. Los positivos se confirman contra la BD; la
+restricción UNIQUE del INSERT sigue siendo la garantía final.
+"""
+
+import bisect
+import hashlib
+import math
+import threading
+import time
+
+CAMPOS = ('email', 'matricula')
+
+
+def normalizar(campo, valor):
+    valor = (valor or '').strip()
+    return valor.lower() if campo == 'email' else valor.upper()
+
+
+class BloomFilter:
+    """Filtro de Bloom con doble hashing sobre blake2b"""
+
+    __slots__ = ('capacidad', 'm', 'k', 'bits')
+
+    def __init__(self, capacidad, fp_rate=0.01):
+        capacidad = max(capacidad, 1024)
+        self.capacidad = capacidad
+        self.m = int(-capacidad * math.log(fp_rate) / (math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacidad * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _posiciones(self, valor):
+        d = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], 'little')
+        h2 = int.from_bytes(d[8:], 'little') | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, valor):
+        for p in self._posiciones(valor):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, valor):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._posiciones(valor))
+
+
+class IndiceDisponibilidad:
+    """
+    `cargar(despues_de, limite)` regresa filas de usuarios (id, email,
+    matricula) con id mayor a `despues_de` (None = desde el inicio),
+    ordenadas por id.
+    """
+
+    def __init__(self, cargar, refresco_s=30.0, pagina=1000, fp_rate=0.01, solape=200):
+        self.cargar = cargar
+        self.refresco_s = refresco_s
+        self.pagina = pagina
+        self.fp_rate = fp_rate
+        self.solape = solape
+        self.ultimo_id = None
+        self._ordenados = {c: [] for c in CAMPOS}
+        self._bloom = {c: BloomFilter(0, fp_rate) for c in CAMPOS}
+        self._ultimo_refresco = 0.0
+        self._cargado = False
+        self._lock = threading.Lock()
+
+    # ── Carga ─────────────────────────────────
+    def _asegurar_fresco(self):
+        if self._cargado and time.monotonic() - self._ultimo_refresco < self.refresco_s:
+            return
+        with self._lock:
+            if self._cargado and time.monotonic() - self._ultimo_refresco < self.refresco_s:
+                return
+            nuevos = {c: [] for c in CAMPOS}
+            # Ventana de solape para las filas que confirmaron tarde
+            desde = None if self.ultimo_id is None else max(0, self.ultimo_id - self.solape)
+            while True:
+                filas = self.cargar(desde, self.pagina) or []
+                for fila in filas:
+                    for c in CAMPOS:
+                        if fila.get(c):
+                            nuevos[c].append(normalizar(c, fila[c]))
+                if filas:
+                    desde = filas[-1]['id']
+                    self.ultimo_id = max(self.ultimo_id or 0, desde)
+                if len(filas) < self.pagina:
+                    break
+            for c in CAMPOS:
+                self._incorporar(c, nuevos[c])
+            self._ultimo_refresco = time.monotonic()
+            self._cargado = True
+
+    def _incorporar(self, campo, valores):
+        if not valores:
+            return
+        ordenados = self._ordenados[campo]
+        if len(valores) > 64:
+            ordenados[:] = sorted(set(ordenados).union(valores))
+        else:
+            for v in valores:
+                i = bisect.bisect_left(ordenados, v)
+                if i == len(ordenados) or ordenados[i] != v:
+                    ordenados.insert(i, v)
+        bloom = self._bloom[campo]
+        if len(ordenados) > bloom.capacidad:
+            # El filtro quedó chico: reconstruirlo con holgura para no degradar el FP
+            bloom = BloomFilter(2 * len(ordenados), self.fp_rate)
+            for v in ordenados:
+                bloom.add(v)
+            self._bloom[campo] = bloom
+        else:
+            for v in valores:
+                bloom.add(v)
+
+    # ── Consultas ─────────────────────────────
+    def puede_existir(self, campo, valor):
+        """False = seguro disponible; True = posible duplicado (confirmar en BD)"""
+        self._asegurar_fresco()
+        v = normalizar(campo, valor)
+        if v not in self._bloom[campo]:
+            return False
+        ordenados = self._ordenados[campo]
+        i = bisect.bisect_left(ordenados, v)
+        return i < len(ordenados) and ordenados[i] == v
+
+    def agregar(self, user):
+        """Registrar en el índice un usuario recién creado en esta instancia"""
+        with self._lock:
+            for c in CAMPOS:
+                if user.get(c):
+                    self._incorporar(c, [normalizar(c, user[c])])
@@ -0,0 +1,56 @@
+# utils/cache.py
+"""
+Caché en memoria con expiración (TTL) y límite de entradas.
+
+Vive dentro del proceso: en Vercel dura lo que dure la instancia caliente,
+en gunicorn es por worker. Sirve para datos que cambian poco y cuya versión
+ligeramente vieja es aceptable (metadatos de una clase activa, etc.).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Diccionario con expiración por entrada y desalojo LRU"""
+
+    def __init__(self, ttl=60.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expira, valor = item
+            if expira < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return valor
+
+    def set(self, key, value, ttl=None):
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expira, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def __contains__(self, key):
+        return self.get(key, _FALTANTE) is not _FALTANTE
+
+    def __len__(self):
+        return len(self._data)
+
+
+_FALTANTE = object()
@@ -0,0 +1,50 @@
+# utils/db_errors.py
+"""
+Traducción de errores de PostgREST y filtros compuestos.
+
+Con restricciones UNIQUE en la tabla, basta un solo INSERT: si hay duplicado
+PostgREST responde 409 con el código 23505 de Postgres, y de su mensaje se
+obtiene la columna en conflicto.
+"""
+
+import re
+
+UNIQUE_VIOLATION = '23505'
+
+_KEY_RE = re.compile(r'Key \(([^)]+)\)=')
+_CONSTRAINT_RE = re.compile(r'unique constraint "([^"]+)"')
+_RESERVADOS = set(',.:()"\\ ')
+
+
+def campo_duplicado(error, tabla, campos):
+    """
+    Columna que violó una restricción UNIQUE, a partir del JSON de error de
+    PostgREST. `campos` son las columnas candidatas; None si no es un
+    duplicado o no se puede determinar la columna.
+    """
+    if not isinstance(error, dict) or error.get('code') != UNIQUE_VIOLATION:
+        return None
+    m = _KEY_RE.search(error.get('details') or '')
+    if m and m.group(1) in campos:
+        return m.group(1)
+    # Sin details (p. ej. en logs recortados): usar el nombre de la restricción,
+    # que por convención de Postgres es <tabla>_<columna>_key
+    m = _CONSTRAINT_RE.search(error.get('message') or '')
+    if m:
+        for campo in campos:
+            if m.group(1) == f'{tabla}_{campo}_key':
+                return campo
+    return None
+
+
+def valor_filtro(valor):
+    """Escapa un valor para usarlo dentro de or=(...) / and=(...)"""
+    texto = str(valor)
+    if any(c in _RESERVADOS for c in texto):
+        return '"' + texto.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return texto
+
+
+def filtro_or_eq(valores):
+    """{'email': x, 'matricula': y} -> '(email.eq.x,matricula.eq.y)'"""
+    return '(' + ','.join(f'{campo}.eq.{valor_filtro(v)}' for campo, v in valores.items()) + ')'
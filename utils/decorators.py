@@ -0,0 +1,194 @@
+# utils/decorators.py
+"""
+Decoradores para rutas y handlers.
+
+Funcionan tanto con vistas de Flask (app.py, sin argumentos de request) como
+con los handlers de api/index.py, que reciben el request como primer
+argumento y regresan tuplas (body, status, headers).
+"""
+
+import hashlib
+import json
+import math
+from functools import wraps
+
+from utils.session_tokens import (verificar_sesion, necesita_refresco, refrescar,
+                                  token_de_request)
+from utils.rate_limit import llave_dispositivo
+from utils.idempotency import REPETIR, EN_PROCESO, CONFLICTO
+
+SESSION_HEADER = 'X-Session-Token'
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+COALESCED_HEADER = 'X-Coalesced'
+
+
+def _error_json(mensaje, status):
+    return (json.dumps({'success': False, 'message': mensaje}), status,
+            {'Content-Type': 'application/json'})
+
+
+def _request_de(args):
+    if args and hasattr(args[0], 'headers'):
+        return args[0]
+    from flask import request
+    return request
+
+
+def agregar_header(respuesta, nombre, valor):
+    """Agrega un header a una respuesta de Flask o a una tupla (body, status[, headers])"""
+    if hasattr(respuesta, 'headers'):
+        respuesta.headers[nombre] = valor
+        return respuesta
+    if isinstance(respuesta, tuple):
+        if len(respuesta) == 3:
+            body, status, headers = respuesta
+            return body, status, {**headers, nombre: valor}
+        if len(respuesta) == 2:
+            body, status = respuesta
+            if hasattr(body, 'headers'):
+                body.headers[nombre] = valor
+                return body, status
+            return body, status, {nombre: valor}
+    return respuesta
+
+
+def requiere_sesion(roles=None, revocaciones=None, error=None):
+    """
+    Exige un token de sesión firmado en `Authorization: Bearer <token>`.
+
+    - roles: tupla de roles permitidos (None = cualquiera)
+    - revocaciones: ListaRevocacion a consultar; pásala solo en rutas
+      sensibles, porque es la única parte que toca la base de datos
+    - error: función (mensaje, status) -> respuesta, para usar el formato
+      de error de cada app
+
+    Los claims quedan en `request.sesion`. Si el token ya consumió la mitad
+    de su vigencia, la respuesta incluye uno nuevo en X-Session-Token.
+    """
+    error = error or _error_json
+
+    def decorador(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            req_obj = _request_de(args)
+            claims = verificar_sesion(token_de_request(req_obj))
+            if claims is None:
+                return error('Sesión inválida o expirada', 401)
+            if roles and claims.get('rol') not in roles:
+                return error('No autorizado', 403)
+            if revocaciones is not None and revocaciones.esta_revocada(claims):
+                return error('Sesión revocada', 401)
+
+            req_obj.sesion = claims
+            respuesta = fn(*args, **kwargs)
+            if necesita_refresco(claims):
+                respuesta = agregar_header(respuesta, SESSION_HEADER, refrescar(claims))
+            return respuesta
+        return wrapper
+    return decorador
+
+
+def limitar_tasa(limitador, llave=llave_dispositivo, error=None):
+    """
+    Consume una ficha del limitador (utils/rate_limit.py) por request y
+    responde 429 con Retry-After cuando la cubeta de la llave está vacía.
+    """
+    error = error or _error_json
+
+    def decorador(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            permitido, espera = limitador.permitir(llave(_request_de(args)))
+            if not permitido:
+                return agregar_header(error('Demasiadas solicitudes, intenta más tarde', 429),
+                                      'Retry-After', str(max(1, math.ceil(espera))))
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorador
+
+
+def _como_tupla(respuesta):
+    """(body, status, headers) de una respuesta de Flask o de una tupla de handler"""
+    status, headers = None, {}
+    if isinstance(respuesta, tuple):
+        respuesta, status, *resto = respuesta
+        headers = dict(resto[0]) if resto else {}
+    if hasattr(respuesta, 'get_data'):
+        headers = {**{k: v for k, v in respuesta.headers.items() if k != 'Content-Length'},
+                   **headers}
+        status = status or respuesta.status_code
+        respuesta = respuesta.get_data()
+    return respuesta, status or 200, headers
+
+
+def idempotente(almacen, error=None):
+    """
+    Honra el header Idempotency-Key con un AlmacenIdempotencia
+    (utils/idempotency.py): un reintento con la misma llave y el mismo cuerpo
+    recibe la respuesta exitosa original, con Idempotent-Replayed: true.
+    Sin header, el handler corre normal.
+    """
+    error = error or _error_json
+
+    def decorador(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            req_obj = _request_de(args)
+            llave = req_obj.headers.get(IDEMPOTENCY_HEADER, '').strip()
+            if not llave:
+                return fn(*args, **kwargs)
+            if len(llave) > 255:
+                return error('Idempotency-Key inválida', 400)
+
+            huella = hashlib.sha256(req_obj.get_data()).hexdigest()
+            estado, guardada = almacen.reservar(llave, huella)
+            if estado == REPETIR:
+                return agregar_header(guardada, 'Idempotent-Replayed', 'true')
+            if estado == EN_PROCESO:
+                return error('La solicitud original sigue en proceso, reintenta', 409)
+            if estado == CONFLICTO:
+                return error('Idempotency-Key ya usada con otro contenido', 422)
+
+            try:
+                respuesta = fn(*args, **kwargs)
+            except Exception:
+                almacen.liberar(llave)
+                raise
+            body, status, headers = _como_tupla(respuesta)
+            if 200 <= status < 300:
+                almacen.completar(llave, huella, (body, status, headers))
+            else:
+                almacen.liberar(llave)
+            return respuesta
+        return wrapper
+    return decorador
+
+
+def coalescer(grupo, nombre=None):
+    """
+    Comparte una sola ejecución entre requests idénticos concurrentes con un
+    GrupoVuelo (utils/singleflight.py). La llave es la ruta, sus argumentos,
+    los query params normalizados y el usuario de la sesión si la hay, para
+    que dos usuarios nunca compartan respuesta; por eso va debajo de
+    requiere_sesion. Quien recibe una respuesta compartida la ve con
+    X-Coalesced: 1; solo las 2xx se reutilizan durante la gracia.
+    """
+    def decorador(fn):
+        ruta = nombre or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            req_obj = _request_de(args)
+            # En api/index.py el primer argumento es el request, no parte de la llave
+            resto = args[1:] if args and args[0] is req_obj else args
+            sesion = getattr(req_obj, 'sesion', None) or {}
+            llave = (ruta, resto, tuple(sorted(kwargs.items())),
+                     tuple(sorted(req_obj.args.items(multi=True))),
+                     sesion.get('uid'), sesion.get('rol'))
+            respuesta, compartida = grupo.hacer(llave, lambda: _como_tupla(fn(*args, **kwargs)),
+                                                guardar=lambda r: 200 <= r[1] < 300)
+            if compartida:
+                return agregar_header(respuesta, COALESCED_HEADER, '1')
+            return respuesta
+        return wrapper
+    return decorador
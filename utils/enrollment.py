@@ -0,0 +1,77 @@
+# utils/enrollment.py
+"""
+Índice de inscripciones derivado de `horarios`.
+
+`horarios` liga alumno_id con materia_id (una fila por día de la semana) y
+`materias` liga materia con profesor. Con eso se arma, por profesor:
+
+- materia_id -> conjunto de alumnos inscritos (la lista de cada materia);
+- alumno_id -> materias que lleva con ese profesor.
+
+Así el dashboard, el reporte y las estadísticas trabajan solo con los
+alumnos del curso, no con todos los `rol=alumno` del campus. Se carga por
+profesor bajo demanda (dos consultas) y se guarda con TTL; crear o borrar
+materias invalida la entrada del profesor.
+
+Esta app no escribe `horarios` (se cargan aparte, en Supabase), así que un
+alta o baja de inscripción se refleja al vencer el TTL
+(INSCRIPCIONES_TTL_S, 300 s por defecto). El dashboard y el reporte lo
+informan en `inscripciones_ttl_s`.
+"""
+
+import os
+
+from utils.cache import TTLCache
+
+INSCRIPCIONES_TTL_S = float(os.getenv('INSCRIPCIONES_TTL_S', '300'))
+
+
+class InscripcionesProfesor:
+    __slots__ = ('materias', 'por_alumno')
+
+    def __init__(self, materia_ids, pares):
+        self.materias = {m: set() for m in materia_ids}
+        self.por_alumno = {}
+        for alumno_id, materia_id in pares:
+            self.materias.setdefault(materia_id, set()).add(alumno_id)
+            self.por_alumno.setdefault(alumno_id, set()).add(materia_id)
+
+    def roster(self, materia_id=None):
+        """Alumnos de una materia, o de todas las materias del profesor"""
+        if materia_id is not None:
+            return set(self.materias.get(materia_id, ()))
+        return set(self.por_alumno)
+
+    def materias_de(self, alumno_id):
+        return self.por_alumno.get(alumno_id, set())
+
+
+class IndiceInscripciones:
+    """
+    - cargar_profesor(profesor_id) -> (materia_ids, pares (alumno_id, materia_id))
+    - cargar_alumno(alumno_id) -> materia_ids que lleva el alumno
+    """
+
+    def __init__(self, cargar_profesor, cargar_alumno, ttl=INSCRIPCIONES_TTL_S, max_entries=2048):
+        self.ttl = ttl
+        self.cargar_profesor = cargar_profesor
+        self.cargar_alumno = cargar_alumno
+        self._profesores = TTLCache(ttl=ttl, max_entries=max_entries)
+        self._alumnos = TTLCache(ttl=ttl, max_entries=20_000)
+
+    def de_profesor(self, profesor_id):
+        inscripciones = self._profesores.get(profesor_id)
+        if inscripciones is None:
+            inscripciones = InscripcionesProfesor(*self.cargar_profesor(profesor_id))
+            self._profesores.set(profesor_id, inscripciones)
+        return inscripciones
+
+    def materias_de_alumno(self, alumno_id):
+        materias = self._alumnos.get(alumno_id)
+        if materias is None:
+            materias = set(self.cargar_alumno(alumno_id))
+            self._alumnos.set(alumno_id, materias)
+        return materias
+
+    def invalidar_profesor(self, profesor_id):
+        self._profesores.pop(profesor_id)
@@ -0,0 +1,173 @@
+# utils/geofence.py
+"""
+Geocercas para validar la ubicación de un escaneo.
+
+Sustituye a geopy.geodesic (solver elipsoidal iterativo) en la ruta del
+escaneo. Para radios de aula (decenas de metros) basta una proyección
+equirectangular local alrededor del punto de referencia: con los radios de
+curvatura de WGS84 en esa latitud coincide con geodesic al milímetro. Cada
+Geocerca precalcula su proyección una vez, al iniciar la clase, y cada
+escaneo cuesta unas pocas multiplicaciones.
+
+Soporta círculos (referencia + radio) y polígonos para aulas irregulares.
+La API por lotes usa NumPy (importado solo cuando se usa).
+"""
+
+import math
+
+RADIO_TIERRA_M = 6_371_008.8
+_M_POR_GRADO = math.pi * RADIO_TIERRA_M / 180
+
+# Elipsoide WGS84 (el mismo que usa geodesic)
+_WGS84_A = 6_378_137.0
+_WGS84_E2 = 6.69437999014e-3
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distancia en metros entre dos coordenadas GPS (gran círculo)"""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def equirectangular(lat1, lon1, lat2, lon2):
+    """Aproximación plana; válida para distancias cortas (< ~10 km)"""
+    x = (lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return _M_POR_GRADO * math.hypot(x, y)
+
+
+class Geocerca:
+    """
+    Zona válida de escaneo: círculo alrededor de la referencia o polígono.
+
+    `poligono` es una lista de (lat, lon). Un escaneo dentro del polígono, o a
+    menos de `radio_m` de su borde, es válido. La distancia reportada siempre
+    es a la referencia (lo que se guarda en `distancia_metros`).
+    """
+
+    __slots__ = ('lat0', 'lon0', 'radio_m', '_kx', '_ky', '_poligono')
+
+    def __init__(self, lat, lon, radio_m, poligono=None):
+        self.lat0 = float(lat)
+        self.lon0 = float(lon)
+        self.radio_m = float(radio_m)
+        # Metros por grado en la latitud de la referencia, con los radios de
+        # curvatura de WGS84 (meridiano y primer vertical), precalculados
+        phi = math.radians(self.lat0)
+        w2 = 1 - _WGS84_E2 * math.sin(phi) ** 2
+        radio_n = _WGS84_A / math.sqrt(w2)
+        radio_m_meridiano = _WGS84_A * (1 - _WGS84_E2) / (w2 * math.sqrt(w2))
+        self._kx = math.radians(1) * radio_n * math.cos(phi)
+        self._ky = math.radians(1) * radio_m_meridiano
+        self._poligono = [self._proyectar(float(a), float(b)) for a, b in poligono] if poligono else None
+
+    def _proyectar(self, lat, lon):
+        return ((lon - self.lon0) * self._kx, (lat - self.lat0) * self._ky)
+
+    def distancia(self, lat, lon):
+        x, y = self._proyectar(float(lat), float(lon))
+        return math.hypot(x, y)
+
+    def contiene(self, lat, lon):
+        """Regresa (valida, distancia_m a la referencia)"""
+        x, y = self._proyectar(float(lat), float(lon))
+        distancia = math.hypot(x, y)
+        if self._poligono is None:
+            return distancia <= self.radio_m, distancia
+        if _punto_en_poligono(x, y, self._poligono):
+            return True, distancia
+        return _distancia_a_borde(x, y, self._poligono) <= self.radio_m, distancia
+
+    # ── Lotes (NumPy) ─────────────────────────
+    def contiene_lote(self, lats, lons):
+        """Versión vectorizada de contiene(): regresa (mascara_validas, distancias)"""
+        import numpy as np
+
+        x = (np.asarray(lons, dtype=np.float64) - self.lon0) * self._kx
+        y = (np.asarray(lats, dtype=np.float64) - self.lat0) * self._ky
+        distancias = np.hypot(x, y)
+        if self._poligono is None:
+            return distancias <= self.radio_m, distancias
+
+        dentro = np.zeros(x.shape, dtype=bool)
+        borde = np.full(x.shape, np.inf)
+        n = len(self._poligono)
+        for i in range(n):
+            (x1, y1), (x2, y2) = self._poligono[i], self._poligono[(i + 1) % n]
+            cruza = (y1 > y) != (y2 > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cruce = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+            dentro ^= cruza & (x < x_cruce)
+            borde = np.minimum(borde, _np_distancia_segmento(np, x, y, x1, y1, x2, y2))
+        return dentro | (borde <= self.radio_m), distancias
+
+
+def _punto_en_poligono(x, y, poligono):
+    """Ray casting sobre el polígono proyectado"""
+    dentro = False
+    n = len(poligono)
+    for i in range(n):
+        (x1, y1), (x2, y2) = poligono[i], poligono[(i + 1) % n]
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            dentro = not dentro
+    return dentro
+
+
+def _distancia_a_borde(x, y, poligono):
+    n = len(poligono)
+    return min(_distancia_segmento(x, y, *poligono[i], *poligono[(i + 1) % n]) for i in range(n))
+
+
+def _distancia_segmento(px, py, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    largo2 = dx * dx + dy * dy
+    t = 0.0 if largo2 == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / largo2))
+    return math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+
+def _np_distancia_segmento(np, px, py, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    largo2 = dx * dx + dy * dy
+    if largo2 == 0:
+        return np.hypot(px - x1, py - y1)
+    t = np.clip(((px - x1) * dx + (py - y1) * dy) / largo2, 0.0, 1.0)
+    return np.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+
+MAX_VERTICES = 64
+
+
+def validar_poligono(puntos):
+    """
+    Normaliza la geocerca que envía el cliente: lista de 3 a MAX_VERTICES
+    pares [lat, lon] numéricos y en rango. Regresa [[lat, lon], ...] con
+    floats o lanza ValueError con el motivo.
+    """
+    if not isinstance(puntos, list) or not 3 <= len(puntos) <= MAX_VERTICES:
+        raise ValueError(f'La geocerca debe ser una lista de 3 a {MAX_VERTICES} puntos [lat, lon]')
+    poligono = []
+    for i, punto in enumerate(puntos):
+        if (not isinstance(punto, (list, tuple)) or len(punto) != 2
+                or any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in punto)):
+            raise ValueError(f'Punto {i} de la geocerca: se espera [lat, lon] numérico')
+        lat, lon = float(punto[0]), float(punto[1])
+        if not (math.isfinite(lat) and math.isfinite(lon)) or abs(lat) > 90 or abs(lon) > 180:
+            raise ValueError(f'Punto {i} de la geocerca fuera de rango')
+        poligono.append([lat, lon])
+    return poligono
+
+
+def geocerca_de_clase(clase, radio_m):
+    """
+    Construye la geocerca de una fila de `clases`; None si la clase no tiene
+    referencia. Usa la columna `geocerca` (lista de [lat, lon]) si existe.
+    """
+    lat, lon = clase.get('latitud_referencia'), clase.get('longitud_referencia')
+    if lat is None or lon is None:
+        return None
+    return Geocerca(lat, lon, radio_m, poligono=clase.get('geocerca') or None)
@@ -1,15 +1,12 @@
 # utils/helpers.py
-from geopy.distance import geodesic
+from utils.geofence import equirectangular
 
 def validar_ubicacion(lat_escaneo, lon_escaneo, lat_clase, lon_clase):
     """
     Valida que la ubicación esté dentro del radio permitido
     Radio permitido: 5 metros (+2 metros de tolerancia = 7m máximo)
     """
-    punto_escaneo = (lat_escaneo, lon_escaneo)
-    punto_clase = (lat_clase, lon_clase)
-    
-    distancia = geodesic(punto_escaneo, punto_clase).meters
+    distancia = equirectangular(lat_clase, lon_clase, lat_escaneo, lon_escaneo)
     
     # Radio permitido: 5m + 2m de tolerancia = 7m
     if distancia <= 7:
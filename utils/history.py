@@ -0,0 +1,121 @@
+# utils/history.py
+"""
+Paginación por llave (keyset) del historial de asistencias.
+
+Las páginas se ordenan por (fecha_escaneo, id) descendente y el cursor es la
+última fila entregada. La siguiente página pide solo lo que va "después" de
+esa fila:
+
+    or=(fecha_escaneo.lt.F,and(fecha_escaneo.eq.F,id.lt.I))
+
+así que con un índice sobre (alumno_id | clase_id, fecha_escaneo, id) cada
+página cuesta lo mismo sea la primera o la del mes de agosto pasado, sin el
+OFFSET que recorre y descarta todas las filas anteriores:
+
+    CREATE INDEX asistencias_alumno_historial ON asistencias (alumno_id, fecha_escaneo DESC, id DESC);
+    CREATE INDEX asistencias_clase_historial ON asistencias (clase_id, fecha_escaneo DESC, id DESC);
+
+Se pide una fila de más (limite + 1) para saber si hay otra página sin
+contar el total. Clase, materia y alumno de toda la página se traen con una
+consulta por tabla (`detalle_pagina`).
+"""
+
+import base64
+from datetime import date, timedelta
+
+LIMITE_DEFAULT = 50
+LIMITE_MAX = 200
+
+COLUMNAS = 'id,fecha_escaneo,valida,justificada,clase_id,alumno_id,distancia_metros'
+CAMPOS_CLASE = 'id,fecha,hora_inicio,titulo,materia_id'
+CAMPOS_MATERIA = 'id,nombre,codigo'
+CAMPOS_ALUMNO = 'id,matricula,nombre,apellido_paterno,apellido_materno'
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(fila):
+    crudo = f"{fila['fecha_escaneo']}|{fila['id']}".encode()
+    return base64.urlsafe_b64encode(crudo).rstrip(b'=').decode()
+
+
+def decodificar_cursor(cursor):
+    """-> (fecha_escaneo, id)"""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        fecha, _, fila_id = crudo.rpartition('|')
+        date.fromisoformat(fecha[:10])
+        return fecha, int(fila_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido('Cursor inválido') from e
+
+
+def leer_limite(valor):
+    try:
+        return max(1, min(int(valor), LIMITE_MAX))
+    except (TypeError, ValueError):
+        return LIMITE_DEFAULT
+
+
+def params_pagina(cursor=None, desde=None, hasta=None, limite=LIMITE_DEFAULT, columnas=COLUMNAS):
+    """
+    Parámetros de PostgREST para una página (sin el filtro de dueño, que pone
+    el llamador). `desde` / `hasta` son fechas YYYY-MM-DD inclusivas.
+    """
+    params = {
+        'select': columnas,
+        'order': 'fecha_escaneo.desc,id.desc',
+        'limit': str(limite + 1),
+    }
+    rango = []
+    if desde:
+        rango.append(f'fecha_escaneo.gte.{date.fromisoformat(desde).isoformat()}')
+    if hasta:
+        rango.append(f'fecha_escaneo.lt.{(date.fromisoformat(hasta) + timedelta(days=1)).isoformat()}')
+    if rango:
+        params['and'] = f"({','.join(rango)})"
+    if cursor:
+        fecha, fila_id = decodificar_cursor(cursor)
+        params['or'] = f'(fecha_escaneo.lt.{fecha},and(fecha_escaneo.eq.{fecha},id.lt.{fila_id}))'
+    return params
+
+
+def cortar_pagina(filas, limite):
+    """-> (filas de la página, cursor de la siguiente o None)"""
+    if len(filas) > limite:
+        filas = filas[:limite]
+        return filas, codificar_cursor(filas[-1])
+    return filas, None
+
+
+def detalle_pagina(filas, buscar, con_alumno=False):
+    """
+    Enriquece una página. `buscar(tabla, ids, columnas)` regresa las filas
+    de `tabla` con esos ids (un solo `id=in.(...)`).
+    """
+    def por_id(tabla, ids, columnas):
+        ids = sorted(i for i in ids if i is not None)
+        return {r['id']: r for r in (buscar(tabla, ids, columnas) or [])} if ids else {}
+
+    clases = por_id('clases', {f.get('clase_id') for f in filas}, CAMPOS_CLASE)
+    materias = por_id('materias', {c.get('materia_id') for c in clases.values()}, CAMPOS_MATERIA)
+    alumnos = por_id('usuarios', {f.get('alumno_id') for f in filas}, CAMPOS_ALUMNO) if con_alumno else {}
+
+    resultado = []
+    for f in filas:
+        clase = clases.get(f.get('clase_id'))
+        item = {
+            'id': f['id'],
+            'fecha': f.get('fecha_escaneo'),
+            'valida': f.get('valida', False),
+            'justificada': f.get('justificada', False),
+            'distancia': float(f['distancia_metros']) if f.get('distancia_metros') else None,
+            'clase': clase,
+            'materia': materias.get(clase.get('materia_id')) if clase else None,
+        }
+        if con_alumno:
+            item['alumno'] = alumnos.get(f.get('alumno_id'))
+        resultado.append(item)
+    return resultado
@@ -0,0 +1,56 @@
+# utils/idempotency.py
+"""
+Almacén de llaves de idempotencia (header Idempotency-Key).
+
+Un reintento con la misma llave y el mismo cuerpo recibe la respuesta
+original sin volver a ejecutar el handler ni tocar la BD. La llave se
+reserva mientras el primer intento está en curso, para que un reintento
+concurrente no duplique el trabajo. Solo se guardan respuestas exitosas:
+un error puede corregirse y reintentarse con la misma llave.
+
+Vive en memoria del proceso (como utils/cache.py): un reintento que cae en
+otra instancia sigue el camino normal, que tiene su propia protección
+contra duplicados.
+"""
+
+import os
+import threading
+
+from utils.cache import TTLCache
+
+IDEMPOTENCY_TTL_S = int(os.getenv('IDEMPOTENCY_TTL_S', str(24 * 3600)))
+# Si el primer intento murió a medias, la reserva caduca sola
+RESERVA_TTL_S = 30
+
+REPETIR, EN_PROCESO, CONFLICTO, NUEVA = 'repetir', 'en_proceso', 'conflicto', 'nueva'
+
+
+class AlmacenIdempotencia:
+    def __init__(self, ttl=IDEMPOTENCY_TTL_S, max_entries=20_000):
+        self.ttl = ttl
+        self._entradas = TTLCache(ttl=ttl, max_entries=max_entries)
+        self._lock = threading.Lock()
+
+    def reservar(self, llave, huella):
+        """
+        Regresa (estado, respuesta_guardada):
+        REPETIR con la respuesta original, EN_PROCESO, CONFLICTO si la llave se
+        usó con otro cuerpo, o NUEVA si el llamador debe ejecutar el handler.
+        """
+        with self._lock:
+            entrada = self._entradas.get(llave)
+            if entrada is None:
+                self._entradas.set(llave, (huella, None), ttl=RESERVA_TTL_S)
+                return NUEVA, None
+        huella_guardada, respuesta = entrada
+        if huella_guardada != huella:
+            return CONFLICTO, None
+        if respuesta is None:
+            return EN_PROCESO, None
+        return REPETIR, respuesta
+
+    def completar(self, llave, huella, respuesta):
+        self._entradas.set(llave, (huella, respuesta))
+
+    def liberar(self, llave):
+        self._entradas.pop(llave)
@@ -0,0 +1,170 @@
+# utils/jobs.py
+"""
+Trabajos en segundo plano para cálculos pesados (el reporte del profesor).
+
+El POST encola y responde con el id; el GET consulta estado, progreso y, al
+terminar, el resultado. Así el request nunca carga con todo el cálculo y el
+límite de 10 s de Vercel deja de ser el techo del tamaño del curso.
+
+- Pool acotado: JOB_WORKERS hilos. Con JOB_QUEUE trabajos esperando,
+  `encolar` lanza ColaLlena (503 + Retry-After) en lugar de acumular
+  trabajos que nadie va a esperar.
+- Deduplicación: un trabajo idéntico (misma `llave`, p. ej. reporte,
+  profesor, materia) pendiente o en ejecución se comparte; el segundo POST
+  recibe el mismo id.
+- Resultados con TTL: un trabajo terminado se conserva JOB_RESULT_TTL_S y
+  luego se olvida; consultarlo da None (404) y el cliente vuelve a encolar.
+
+Vive en memoria del proceso, como utils/idempotency.py, así que el modo en
+segundo plano solo sirve en un proceso de larga vida (gunicorn, por worker).
+En serverless (Vercel) la instancia se congela en cuanto sale la respuesta:
+el hilo no avanza y la consulta puede caer en otra instancia. Ahí
+JOB_BACKGROUND vale 0 por defecto y `encolar` ejecuta el trabajo en el mismo
+request; el POST responde ya terminado y el cliente no consulta. Un 404 al
+consultar (expiró o lo atendió otra instancia) hace que el cliente reencole,
+un número acotado de veces.
+"""
+
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache import TTLCache
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_QUEUE = int(os.getenv('JOB_QUEUE', '16'))
+JOB_RESULT_TTL_S = int(os.getenv('JOB_RESULT_TTL_S', '600'))
+# Un trabajo en curso no debe caducar antes de terminar
+JOB_MAX_S = int(os.getenv('JOB_MAX_S', '900'))
+# Hilos en segundo plano solo en procesos de larga vida (no en Vercel)
+JOB_BACKGROUND = os.getenv('JOB_BACKGROUND', '0' if os.getenv('VERCEL') else '1') == '1'
+
+PENDIENTE, EJECUTANDO, LISTO, ERROR = 'pendiente', 'ejecutando', 'listo', 'error'
+
+
+class ColaLlena(Exception):
+    """Demasiados trabajos esperando; responder 503 y reintentar"""
+
+
+class Trabajo:
+    def __init__(self, llave, dueno=None):
+        self.id = secrets.token_urlsafe(16)
+        self.llave = llave
+        self.dueno = dueno
+        self.estado = PENDIENTE
+        self.progreso = 0.0
+        self.mensaje = ''
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+        self._hecho = threading.Event()
+
+    @property
+    def activo(self):
+        return self.estado in (PENDIENTE, EJECUTANDO)
+
+    def avanzar(self, fraccion, mensaje=None):
+        """Callback de progreso para la función del trabajo (0..1)"""
+        self.progreso = min(max(float(fraccion), 0.0), 1.0)
+        if mensaje is not None:
+            self.mensaje = mensaje
+
+    def esperar(self, segundos):
+        return self._hecho.wait(segundos)
+
+    def a_dict(self):
+        datos = {
+            'id': self.id,
+            'estado': self.estado,
+            'progreso': round(self.progreso, 3),
+            'mensaje': self.mensaje,
+        }
+        if self.estado == LISTO:
+            datos['resultado'] = self.resultado
+        if self.estado == ERROR:
+            datos['error'] = self.error
+        return datos
+
+
+class ColaTrabajos:
+    """
+    encolar(llave, fn, *args, dueno=None) -> (trabajo, nuevo)
+    `fn(*args, progreso=trabajo.avanzar)` corre en el pool (o en el mismo
+    hilo si `segundo_plano` es False); lo que regrese es el resultado del
+    trabajo y una excepción lo deja en ERROR.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pendientes=JOB_QUEUE,
+                 ttl=JOB_RESULT_TTL_S, max_entries=1024, segundo_plano=JOB_BACKGROUND):
+        self.segundo_plano = segundo_plano
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.ttl = ttl
+        self._trabajos = TTLCache(ttl=JOB_MAX_S, max_entries=max_entries)
+        self._activos = {}      # llave -> trabajo pendiente o en ejecución
+        self._pendientes = 0
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # El pool se crea con el primer trabajo (y de nuevo tras un fork)
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='trabajo')
+            self._pid = pid
+        return self._executor
+
+    def encolar(self, llave, fn, *args, dueno=None):
+        with self._lock:
+            existente = self._activos.get(llave)
+            if existente is not None and existente.activo:
+                return existente, False
+            if self._pendientes >= self.max_pendientes:
+                raise ColaLlena('Demasiados trabajos en espera')
+            trabajo = Trabajo(llave, dueno)
+            self._activos[llave] = trabajo
+            self._pendientes += 1
+            self._trabajos.set(trabajo.id, trabajo)
+            if self.segundo_plano:
+                try:
+                    self._pool().submit(self._ejecutar, trabajo, fn, args)
+                except Exception:
+                    self._pendientes -= 1
+                    self._activos.pop(llave, None)
+                    self._trabajos.pop(trabajo.id)
+                    raise
+        if not self.segundo_plano:
+            self._ejecutar(trabajo, fn, args)
+        return trabajo, True
+
+    def _ejecutar(self, trabajo, fn, args):
+        with self._lock:
+            self._pendientes -= 1
+        trabajo.estado = EJECUTANDO
+        try:
+            trabajo.resultado = fn(*args, progreso=trabajo.avanzar)
+            trabajo.progreso = 1.0
+            trabajo.estado = LISTO
+        except Exception as e:
+            # El detalle va al log, no al cliente
+            trabajo.error = 'No se pudo completar el trabajo'
+            trabajo.estado = ERROR
+            print(f"ERROR trabajo {trabajo.llave}: {e}")
+        finally:
+            trabajo.terminado = time.time()
+            with self._lock:
+                if self._activos.get(trabajo.llave) is trabajo:
+                    del self._activos[trabajo.llave]
+            # Desde aquí corre el TTL del resultado
+            self._trabajos.set(trabajo.id, trabajo, ttl=self.ttl)
+            trabajo._hecho.set()
+
+    def obtener(self, trabajo_id):
+        return self._trabajos.get(trabajo_id)
+
+    def pendientes(self):
+        return self._pendientes
@@ -0,0 +1,120 @@
+# utils/load_shedding.py
+"""
+Descarte de carga por prioridad.
+
+Cuando la BD se vuelve lenta, un dashboard o un reporte (cientos de
+consultas cada uno) compite con los escaneos de los alumnos, que son los que
+tienen prisa. Cada ruta se clasifica en un nivel:
+
+- CRITICA: escanear, clase activa, token del QR. Siempre se admite.
+- NORMAL: login, registro, iniciar/terminar clase, lista en vivo.
+  Se rechaza solo si las consultas en vuelo ya llegaron a `max_bd`.
+- BAJA: dashboard, reporte, materias, estadísticas, importación. Máximo `max_baja` a la
+  vez, y solo mientras las consultas en vuelo estén bajo la mitad de
+  `max_bd`; si no, espera hasta `espera_baja_s` a que se libere y después
+  se rechaza con 503 + Retry-After.
+
+Las consultas en vuelo se cuentan envolviendo cada llamada a la BD con
+`consulta_bd()`. El control es por proceso (por worker de gunicorn o por
+instancia de la función).
+"""
+
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+CRITICA, NORMAL, BAJA = 0, 1, 2
+NOMBRES = ('critica', 'normal', 'baja')
+
+_RUTAS_CRITICAS = re.compile(
+    r'^/(healthz$|api/registrar-asistencia$|api/clase/activa$|api/clase/\d+/qr(-token)?$)')
+_RUTAS_BAJAS = re.compile(
+    r'^/api/(profesor/\d+/(dashboard|reporte|materias|historial|analitica)|alumno/\d+/|alumnos/importar)')
+
+
+def prioridad_de(path):
+    path = path.rstrip('/')
+    if _RUTAS_CRITICAS.match(path):
+        return CRITICA
+    if _RUTAS_BAJAS.match(path):
+        return BAJA
+    return NORMAL
+
+
+class ControlCarga:
+    def __init__(self, max_bd=None, max_baja=None, espera_baja_s=None):
+        self.max_bd = max_bd or int(os.getenv('LOAD_MAX_DB_INFLIGHT', '24'))
+        self.max_baja = max_baja or int(os.getenv('LOAD_MAX_LOW_INFLIGHT', '2'))
+        self.espera_baja_s = (float(os.getenv('LOAD_LOW_WAIT_S', '2'))
+                              if espera_baja_s is None else espera_baja_s)
+        self.bd_en_vuelo = 0
+        self.en_vuelo = [0, 0, 0]
+        self.rechazados = [0, 0, 0]
+        self._cond = threading.Condition()
+
+    # ── Consultas a la BD ─────────────────────
+    @contextmanager
+    def consulta_bd(self):
+        with self._cond:
+            self.bd_en_vuelo += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.bd_en_vuelo -= 1
+                self._cond.notify_all()
+
+    # ── Admisión de requests ──────────────────
+    def _hay_cupo(self, prioridad):
+        if prioridad == CRITICA:
+            return True
+        if prioridad == NORMAL:
+            return self.bd_en_vuelo < self.max_bd
+        return self.en_vuelo[BAJA] < self.max_baja and self.bd_en_vuelo < self.max_bd // 2
+
+    def admitir(self, prioridad):
+        """True si el request puede pasar; en ese caso llamar liberar() al terminar"""
+        with self._cond:
+            if not self._hay_cupo(prioridad):
+                if prioridad != BAJA or not self._cond.wait_for(
+                        lambda: self._hay_cupo(prioridad), self.espera_baja_s):
+                    self.rechazados[prioridad] += 1
+                    return False
+            self.en_vuelo[prioridad] += 1
+            return True
+
+    def liberar(self, prioridad):
+        with self._cond:
+            self.en_vuelo[prioridad] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self, prioridad):
+        """Context manager: produce False si el request se descartó"""
+        admitido = self.admitir(prioridad)
+        try:
+            yield admitido
+        finally:
+            if admitido:
+                self.liberar(prioridad)
+
+    def snapshot(self):
+        return {
+            'bd_en_vuelo': self.bd_en_vuelo,
+            'en_vuelo': dict(zip(NOMBRES, self.en_vuelo)),
+            'rechazados': dict(zip(NOMBRES, self.rechazados)),
+        }
+
+
+_control = None
+_control_lock = threading.Lock()
+
+
+def get_control():
+    global _control
+    if _control is None:
+        with _control_lock:
+            if _control is None:
+                _control = ControlCarga()
+    return _control
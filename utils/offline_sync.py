@@ -0,0 +1,173 @@
+# utils/offline_sync.py
+"""
+Validación por lotes de escaneos capturados sin conexión.
+
+El dashboard del alumno guarda localmente los escaneos que no pudo enviar
+(token del QR, hora de captura y GPS) y los sube juntos. Aquí se validan en
+una pasada:
+
+- el token se verifica contra la hora de captura, no contra la hora de
+  sincronización: prueba que el QR se leyó mientras estaba en pantalla;
+- la captura no puede ser futura ni más vieja que OFFLINE_SCAN_MAX_AGE_S
+  (por defecto 2 h, nunca más de OFFLINE_MAX_TOPE_S: lo que dura una clase);
+- la captura debe caer dentro del periodo real de la clase (fecha +
+  hora_inicio hasta hora_fin, o hasta ahora si sigue activa): un token viejo
+  con una hora de captura inventada no sirve fuera de su clase;
+- sin GPS no hay escaneo sin conexión, y la clase debe tener geocerca: la
+  ubicación es lo único que ata el token reenviado a alguien en el aula;
+- duplicados dentro del lote y contra `asistencias` (una sola consulta);
+- distancia a la geocerca, vectorizada por clase (Geocerca.contiene_lote).
+
+El acceso a la BD lo ponen los callbacks, así que sirve para las dos apps.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from utils.qr_tokens import verificar_token, QR_WINDOW_SECONDS
+
+MAX_LOTE = int(os.getenv('OFFLINE_SCAN_MAX_BATCH', '50'))
+OFFLINE_MAX_TOPE_S = 3 * 3600
+OFFLINE_MAX_S = min(int(os.getenv('OFFLINE_SCAN_MAX_AGE_S', str(2 * 3600))), OFFLINE_MAX_TOPE_S)
+
+REGISTRADA, DUPLICADA, RECHAZADA = 'registrada', 'duplicada', 'rechazada'
+
+
+def instante_captura(valor):
+    """Epoch en segundos a partir de epoch (s o ms) o de un ISO 8601"""
+    if isinstance(valor, (int, float)):
+        return valor / 1000 if valor > 1e11 else float(valor)
+    if isinstance(valor, str):
+        try:
+            return datetime.fromisoformat(valor.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def periodo_clase(clase, ahora=None):
+    """
+    (inicio, fin) en epoch de una fila de `clases`: fecha + hora_inicio hasta
+    hora_fin, o hasta `ahora` si sigue activa. None si faltan datos.
+    """
+    ahora = time.time() if ahora is None else ahora
+    try:
+        inicio = datetime.fromisoformat(f"{str(clase['fecha'])[:10]}T{str(clase['hora_inicio'])[:8]}")
+    except (KeyError, TypeError, ValueError):
+        return None
+    if clase.get('activa') or not clase.get('hora_fin'):
+        if not clase.get('activa'):
+            return None  # terminada sin hora de fin: no se puede acotar
+        return inicio.timestamp(), ahora
+    try:
+        fin = datetime.fromisoformat(f"{inicio.date().isoformat()}T{str(clase['hora_fin'])[:8]}")
+    except ValueError:
+        return None
+    if fin < inicio:  # la clase cruzó la medianoche
+        fin += timedelta(days=1)
+    return inicio.timestamp(), fin.timestamp()
+
+
+def validar_lote(escaneos, alumno_id, cargar_clases, ya_registradas, geocerca_de,
+                 ahora=None):
+    """
+    - cargar_clases(ids) -> {clase_id: fila de clases}
+    - ya_registradas(ids) -> set de clase_id donde el alumno ya tiene asistencia
+    - geocerca_de(clase) -> Geocerca o None
+
+    Regresa (resultados, filas): un resultado por escaneo, en el mismo orden
+    ({'id', 'estado', 'message', 'clase_id'}), y las filas de `asistencias`
+    listas para un solo INSERT. Los resultados de las filas quedan como
+    REGISTRADA; si el INSERT falla, el llamador los corrige.
+    """
+    ahora = time.time() if ahora is None else ahora
+    resultados = []
+    candidatos = []  # (indice, clase_id, ts, lat, lon)
+
+    def resultado(escaneo, estado, mensaje, clase_id=None):
+        resultados.append({'id': escaneo.get('id'), 'estado': estado,
+                           'message': mensaje, 'clase_id': clase_id})
+
+    # 1. Token y hora de captura (en memoria)
+    vistos = set()
+    for escaneo in escaneos:
+        ts = instante_captura(escaneo.get('capturado_en'))
+        if ts is None:
+            resultado(escaneo, RECHAZADA, 'Hora de captura inválida')
+            continue
+        if ts > ahora + QR_WINDOW_SECONDS:
+            resultado(escaneo, RECHAZADA, 'Hora de captura en el futuro')
+            continue
+        if ahora - ts > OFFLINE_MAX_S:
+            resultado(escaneo, RECHAZADA, 'El escaneo es demasiado antiguo para sincronizarse')
+            continue
+        try:
+            lat, lon = float(escaneo['latitud']), float(escaneo['longitud'])
+        except (KeyError, TypeError, ValueError):
+            resultado(escaneo, RECHAZADA, 'Sin ubicación GPS: el escaneo sin conexión requiere ubicación')
+            continue
+        clase_id = verificar_token(escaneo.get('qr_token'), ahora=ts)
+        if clase_id is None:
+            resultado(escaneo, RECHAZADA, 'QR inválido para la hora de captura')
+            continue
+        if clase_id in vistos:
+            resultado(escaneo, DUPLICADA, 'Escaneo repetido en el lote', clase_id)
+            continue
+        vistos.add(clase_id)
+        resultado(escaneo, REGISTRADA, 'Asistencia registrada', clase_id)
+        candidatos.append((len(resultados) - 1, clase_id, ts, lat, lon))
+
+    if not candidatos:
+        return resultados, []
+
+    # 2. Clases y duplicados contra la BD: una consulta cada uno
+    ids = sorted(vistos)
+    clases = cargar_clases(ids)
+    registradas = ya_registradas(ids)
+
+    por_clase = {}
+    for cand in candidatos:
+        i, clase_id, ts = cand[0], cand[1], cand[2]
+        periodo = periodo_clase(clases[clase_id], ahora) if clase_id in clases else None
+        if clase_id not in clases:
+            resultados[i].update(estado=RECHAZADA, message='Clase no encontrada')
+        elif periodo is None or not (periodo[0] - QR_WINDOW_SECONDS <= ts <= periodo[1] + QR_WINDOW_SECONDS):
+            resultados[i].update(estado=RECHAZADA, message='La hora de captura no corresponde al horario de la clase')
+        elif clase_id in registradas:
+            resultados[i].update(estado=DUPLICADA, message='Ya registraste asistencia en esta clase')
+        else:
+            por_clase.setdefault(clase_id, []).append(cand)
+
+    # 3. Distancia, vectorizada por geocerca
+    filas = []
+    for clase_id, grupo in por_clase.items():
+        geocerca = geocerca_de(clases[clase_id])
+        distancias = {}
+        if geocerca is None:
+            for c in grupo:
+                resultados[c[0]].update(estado=RECHAZADA,
+                                        message='La clase no tiene ubicación de referencia; registra en línea')
+        else:
+            dentro, dist = geocerca.contiene_lote([c[3] for c in grupo], [c[4] for c in grupo])
+            for c, d_ok, d in zip(grupo, dentro.tolist(), dist.tolist()):
+                distancias[c[0]] = d
+                if not d_ok:
+                    resultados[c[0]].update(
+                        estado=RECHAZADA,
+                        message=f'Estabas demasiado lejos del aula ({d:.0f}m)')
+        for i, _, ts, lat, lon in grupo:
+            if resultados[i]['estado'] != REGISTRADA:
+                continue
+            distancia = distancias.get(i)
+            filas.append({
+                'clase_id': clase_id,
+                'alumno_id': int(alumno_id),
+                'fecha_escaneo': datetime.fromtimestamp(ts).isoformat(),
+                'latitud_escaneo': lat,
+                'longitud_escaneo': lon,
+                'distancia_metros': round(distancia, 2) if distancia is not None else None,
+                'valida': True,
+                'justificada': False,
+            })
+    return resultados, filas
@@ -0,0 +1,139 @@
+# utils/passwords.py
+"""
+Hash de contraseñas con scrypt (KDF con costo de memoria) en un pool acotado.
+
+Formato almacenado: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+
+El costo se configura con PASSWORD_SCRYPT_N / _R / _P. Con n=2**14, r=8 cada
+hash usa 16 MiB y unas decenas de ms de CPU, así que no se calcula en el
+hilo del request: se manda a un ThreadPoolExecutor de PASSWORD_HASH_WORKERS
+hilos (hashlib.scrypt libera el GIL mientras trabaja). Si ya hay
+PASSWORD_HASH_QUEUE hashes en espera, se rechaza de inmediato con
+HashingSaturado en lugar de acumular logins que van a expirar.
+
+Migración: los hashes SHA-256 viejos (64 caracteres hex) se siguen aceptando
+mediante la función `legado` de cada app; al verificar con éxito un hash
+viejo, o uno con costo menor al actual, se regresa el hash nuevo para que el
+login lo guarde (rehash-on-login).
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+PREFIJO = 'scrypt'
+
+SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', '1'))
+HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '32'))
+HASH_TIMEOUT_S = float(os.getenv('PASSWORD_HASH_TIMEOUT_S', '10'))
+
+
+class HashingSaturado(Exception):
+    """El pool de hashing tiene la cola llena; responder 503 y reintentar"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem con holgura: OpenSSL exige 128 * n * r bytes más su propio margen
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 2 ** 20, dklen=32)
+
+
+def hash_scrypt(password, n=None, r=None, p=None):
+    """Hash nuevo en el formato almacenado (síncrono; usar el pool en requests)"""
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = secrets.token_bytes(16)
+    return f"{PREFIJO}${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def es_legado(almacenado):
+    return not (almacenado or '').startswith(PREFIJO + '$')
+
+
+def necesita_rehash(almacenado):
+    if es_legado(almacenado):
+        return True
+    _, n, r, p, _, _ = almacenado.split('$')
+    return (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+def verificar_sincrono(password, almacenado, legado=None):
+    """
+    Regresa (valida, hash_nuevo). hash_nuevo es None salvo que la contraseña
+    sea válida y el hash guardado sea legado o tenga otro costo.
+    """
+    if not almacenado:
+        return False, None
+    if es_legado(almacenado):
+        if legado is None or not hmac.compare_digest(almacenado, legado(password)):
+            return False, None
+        return True, hash_scrypt(password)
+
+    try:
+        _, n, r, p, salt, esperado = almacenado.split('$')
+        calculado = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False, None
+    if not hmac.compare_digest(calculado, base64.b64decode(esperado)):
+        return False, None
+    return True, (hash_scrypt(password) if necesita_rehash(almacenado) else None)
+
+
+class PoolHashing:
+    """Ejecuta el KDF en hilos de fondo con una cola de espera acotada"""
+
+    def __init__(self, workers=HASH_WORKERS, max_cola=HASH_QUEUE, timeout=HASH_TIMEOUT_S):
+        self.workers = workers
+        self.timeout = timeout
+        # workers ejecutando + max_cola esperando
+        self._cupo = threading.BoundedSemaphore(workers + max_cola)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='kdf')
+                    self._pid = pid
+        return self._executor
+
+    def _ejecutar(self, fn, *args):
+        if not self._cupo.acquire(blocking=False):
+            raise HashingSaturado('Demasiados inicios de sesión simultáneos')
+        try:
+            futuro = self._pool().submit(fn, *args)
+        except Exception:
+            self._cupo.release()
+            raise
+        futuro.add_done_callback(lambda _: self._cupo.release())
+        return futuro.result(timeout=self.timeout)
+
+    def hash(self, password):
+        return self._ejecutar(hash_scrypt, password)
+
+    def verificar(self, password, almacenado, legado=None):
+        """Igual que verificar_sincrono(), ejecutado en el pool"""
+        return self._ejecutar(verificar_sincrono, password, almacenado, legado)
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = PoolHashing()
+    return _pool
@@ -0,0 +1,111 @@
+# utils/qr_render.py
+"""
+Servicio de renderizado de QR con caché en memoria.
+
+Cada imagen se genera una sola vez por (payload, formato) y se guarda en un LRU.
+Las rutas sirven la imagen desde una URL cacheable (/api/clase/<id>/qr) en
+lugar de incrustarla en base64 dentro del JSON. El payload de una clase es su
+token rotativo (utils/qr_tokens), así que la caché queda por ventana: al
+registrar el token nuevo se descartan las imágenes del anterior, y al terminar
+la clase se descartan todas sus entradas.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+MIMETYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+
+class QRRenderer:
+    """LRU de imágenes QR indexado por (payload, formato)"""
+
+    def __init__(self, max_entries=256, box_size=10, border=4):
+        self.max_entries = max_entries
+        self.box_size = box_size
+        self.border = border
+        self._cache = OrderedDict()
+        self._clases = {}
+        self._lock = threading.Lock()
+
+    # ── Registro por clase ────────────────────
+    def registrar_clase(self, clase_id, payload):
+        """Asocia el payload vigente a una clase"""
+        with self._lock:
+            anterior = self._clases.get(clase_id)
+            self._clases[clase_id] = payload
+        if anterior and anterior != payload:
+            self._descartar(anterior)
+
+    def payload_de(self, clase_id):
+        return self._clases.get(clase_id)
+
+    def evict_clase(self, clase_id):
+        """Descarta el payload y las imágenes de una clase terminada"""
+        with self._lock:
+            payload = self._clases.pop(clase_id, None)
+        if payload:
+            self._descartar(payload)
+
+    def _descartar(self, payload):
+        with self._lock:
+            for fmt in MIMETYPES:
+                self._cache.pop((payload, fmt), None)
+
+    # ── Renderizado ───────────────────────────
+    @staticmethod
+    def etag(payload, fmt):
+        return hashlib.sha1(f'{fmt}:{payload}'.encode()).hexdigest()[:20]
+
+    def render(self, payload, fmt='svg'):
+        """Regresa los bytes de la imagen, generándola solo si no está en caché"""
+        if fmt not in MIMETYPES:
+            raise ValueError(f'Formato de QR no soportado: {fmt}')
+
+        clave = (payload, fmt)
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return self._cache[clave]
+
+        data = self._generar(payload, fmt)
+
+        with self._lock:
+            self._cache[clave] = data
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return data
+
+    def _generar(self, payload, fmt):
+        # Import diferido: qrcode/PIL solo se cargan cuando hay que dibujar
+        import qrcode
+
+        qr = qrcode.QRCode(box_size=self.box_size, border=self.border)
+        qr.add_data(payload)
+        qr.make(fit=True)
+
+        if fmt == 'svg':
+            import qrcode.image.svg
+            img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        else:
+            img = qr.make_image(fill_color="black", back_color="white")
+
+        buffered = io.BytesIO()
+        img.save(buffered)
+        return buffered.getvalue()
+
+
+_renderer = None
+
+def get_qr_renderer():
+    """Instancia única del renderizador"""
+    global _renderer
+    if _renderer is None:
+        _renderer = QRRenderer(max_entries=int(os.getenv('QR_CACHE_SIZE', '256')))
+    return _renderer
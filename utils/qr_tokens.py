@@ -0,0 +1,104 @@
+# utils/qr_tokens.py
+"""
+Tokens de QR firmados con HMAC que rotan por ventana de tiempo.
+
+Formato: v1.<clase_id>.<ventana>.<firma>   (clase_id y ventana en base 36)
+
+El token codifica la clase y el número de ventana (epoch // QR_WINDOW_SECONDS)
+y se firma con un secreto del servidor, así que se valida en memoria sin
+consultar la tabla `clases`. Se acepta ±1 ventana para tolerar el desfase
+entre el proyector y el servidor; una foto del QR deja de servir en cuanto
+pasan dos rotaciones.
+
+Requiere QR_SECRET (distinto del de sesiones). Sin él no se emiten tokens
+(SecretoNoConfigurado) y ninguno verifica: nadie puede acuñar el QR de una
+clase con un secreto conocido.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+from utils.session_tokens import SecretoNoConfigurado
+
+VERSION = 'v1'
+QR_WINDOW_SECONDS = int(os.getenv('QR_WINDOW_SECONDS', '30'))
+SKEW_WINDOWS = 1
+
+
+def _secret():
+    secreto = os.getenv('QR_SECRET', '')
+    if secreto in ('', 'dev-key-123'):
+        print("ADVERTENCIA: QR_SECRET no configurado; no se emitirán ni aceptarán QR rotativos")
+        return None
+    return secreto.encode()
+
+
+_KEY = _secret()
+
+
+def _b36(n):
+    digitos = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if n == 0:
+        return '0'
+    out = ''
+    while n:
+        n, r = divmod(n, 36)
+        out = digitos[r] + out
+    return out
+
+
+def exigir_secreto():
+    """
+    Falla (SecretoNoConfigurado) si no hay QR_SECRET. Se llama antes de crear
+    una clase para no dejarla en la BD sin QR que proyectar.
+    """
+    if _KEY is None:
+        raise SecretoNoConfigurado('Configura QR_SECRET')
+
+
+def _firma(cuerpo):
+    exigir_secreto()
+    mac = hmac.new(_KEY, cuerpo.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(mac).rstrip(b'=').decode()
+
+
+def ventana_actual(ahora=None):
+    return int((time.time() if ahora is None else ahora) // QR_WINDOW_SECONDS)
+
+
+def segundos_restantes(ahora=None):
+    """Segundos hasta la siguiente rotación"""
+    ahora = time.time() if ahora is None else ahora
+    return QR_WINDOW_SECONDS - int(ahora % QR_WINDOW_SECONDS)
+
+
+def emitir_token(clase_id, ahora=None):
+    """Token vigente para la clase en la ventana actual"""
+    cuerpo = f"{VERSION}.{_b36(int(clase_id))}.{_b36(ventana_actual(ahora))}"
+    return f"{cuerpo}.{_firma(cuerpo)}"
+
+
+def verificar_token(token, ahora=None):
+    """
+    Regresa el clase_id si la firma es válida y la ventana está dentro de
+    ±SKEW_WINDOWS de la actual; None en cualquier otro caso.
+    """
+    if _KEY is None or not isinstance(token, str) or token.count('.') != 3:
+        return None
+    cuerpo, _, firma = token.rpartition('.')
+    version, clase_b36, ventana_b36 = cuerpo.split('.')
+    if version != VERSION:
+        return None
+    try:
+        clase_id = int(clase_b36, 36)
+        ventana = int(ventana_b36, 36)
+    except ValueError:
+        return None
+    if abs(ventana - ventana_actual(ahora)) > SKEW_WINDOWS:
+        return None
+    if not hmac.compare_digest(firma, _firma(cuerpo)):
+        return None
+    return clase_id
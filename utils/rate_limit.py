@@ -0,0 +1,169 @@
+# utils/rate_limit.py
+"""
+Control de admisión por dispositivo con token buckets.
+
+Cada llave (telefono_id para escaneos, IP del cliente para los checks,
+donde el telefono_id lo elige quien llama, y el par IP + email para login)
+tiene una cubeta de `capacidad` fichas que se rellena a `tasa` fichas por
+segundo. Un request consume una ficha; sin fichas se responde 429 con
+Retry-After.
+
+El login va por (IP, email): un salón detrás de un mismo NAT no comparte
+una sola cubeta, y adivinar la contraseña de una cuenta sigue limitado.
+
+X-Forwarded-For lo escribe quien llama; solo se toma en cuenta detrás de un
+proxy de confianza. TRUSTED_PROXY_HOPS es cuántos proxies propios hay
+delante (1 por defecto en Vercel, 0 en otro caso: se usa la IP del socket)
+y la IP del cliente es la que agregó el más externo de ellos.
+
+- LimitadorMemoria: por proceso, O(1) memoria por llave activa (dos floats)
+  y desalojo LRU al pasar de `max_llaves`. Una llave desalojada vuelve con la
+  cubeta llena, lo mismo que tendría tras estar inactiva.
+- LimitadorRedis: misma semántica en un almacén compartido, para varios
+  workers o instancias. Se activa con RATE_LIMIT_REDIS_URL (requiere el
+  paquete `redis`). Si Redis falla se deja pasar el request: el limitador
+  protege capacidad, no debe tumbar el servicio.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# nombre -> (capacidad, fichas por segundo)
+LIMITES = {
+    'asistencia': (int(os.getenv('RATE_ASISTENCIA_BURST', '6')),
+                   float(os.getenv('RATE_ASISTENCIA_POR_S', '0.5'))),
+    'login': (int(os.getenv('RATE_LOGIN_BURST', '10')),
+              float(os.getenv('RATE_LOGIN_POR_S', '0.2'))),
+    'check': (int(os.getenv('RATE_CHECK_BURST', '20')),
+              float(os.getenv('RATE_CHECK_POR_S', '2'))),
+}
+
+
+class LimitadorMemoria:
+    """Token buckets en un OrderedDict: llave -> [fichas, ultimo_ts]"""
+
+    def __init__(self, capacidad, tasa, max_llaves=50_000):
+        self.capacidad = float(capacidad)
+        self.tasa = float(tasa)
+        self.max_llaves = max_llaves
+        self._cubetas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def permitir(self, llave, costo=1.0, ahora=None):
+        """Regresa (permitido, segundos_para_reintentar)"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            cubeta = self._cubetas.get(llave)
+            if cubeta is None:
+                cubeta = self._cubetas[llave] = [self.capacidad, ahora]
+                if len(self._cubetas) > self.max_llaves:
+                    self._cubetas.popitem(last=False)
+            else:
+                self._cubetas.move_to_end(llave)
+                cubeta[0] = min(self.capacidad, cubeta[0] + (ahora - cubeta[1]) * self.tasa)
+                cubeta[1] = ahora
+            if cubeta[0] >= costo:
+                cubeta[0] -= costo
+                return True, 0.0
+            return False, (costo - cubeta[0]) / self.tasa
+
+    def __len__(self):
+        return len(self._cubetas)
+
+
+_LUA_TOKEN_BUCKET = """
+local cap = tonumber(ARGV[1])
+local tasa = tonumber(ARGV[2])
+local ahora = tonumber(ARGV[3])
+local costo = tonumber(ARGV[4])
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local t = tonumber(b[1]) or cap
+local ts = tonumber(b[2]) or ahora
+t = math.min(cap, t + math.max(0, ahora - ts) * tasa)
+local ok = 0
+if t >= costo then
+    t = t - costo
+    ok = 1
+end
+redis.call('HSET', KEYS[1], 't', t, 'ts', ahora)
+redis.call('PEXPIRE', KEYS[1], math.ceil(cap / tasa * 1000))
+return {ok, tostring(t)}
+"""
+
+
+class LimitadorRedis:
+    """Token bucket atómico (script Lua) en Redis; la llave expira al llenarse"""
+
+    def __init__(self, cliente, capacidad, tasa, prefijo='rl'):
+        self.capacidad = float(capacidad)
+        self.tasa = float(tasa)
+        self.prefijo = prefijo
+        self._script = cliente.register_script(_LUA_TOKEN_BUCKET)
+
+    def permitir(self, llave, costo=1.0, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        try:
+            ok, fichas = self._script(keys=[f'{self.prefijo}:{llave}'],
+                                      args=[self.capacidad, self.tasa, ahora, costo])
+        except Exception as e:
+            print(f"⚠️  Rate limit sin Redis ({e}); se deja pasar")
+            return True, 0.0
+        if int(ok):
+            return True, 0.0
+        return False, (costo - float(fichas)) / self.tasa
+
+
+_redis = None
+
+
+def crear_limitador(nombre):
+    """Limitador para una política de LIMITES; compartido si hay RATE_LIMIT_REDIS_URL"""
+    global _redis
+    capacidad, tasa = LIMITES[nombre]
+    url = os.getenv('RATE_LIMIT_REDIS_URL')
+    if url:
+        if _redis is None:
+            import redis
+            _redis = redis.Redis.from_url(url, socket_timeout=0.2)
+        return LimitadorRedis(_redis, capacidad, tasa, prefijo=f'rl:{nombre}')
+    return LimitadorMemoria(capacidad, tasa)
+
+
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1' if os.getenv('VERCEL') else '0'))
+
+
+def ip_cliente(req_obj, saltos=None):
+    """
+    IP del cliente: con `saltos` proxies de confianza, la que agregó el más
+    externo en X-Forwarded-For (las de más a la izquierda las pudo escribir
+    el cliente); sin proxies, la del socket.
+    """
+    saltos = TRUSTED_PROXY_HOPS if saltos is None else saltos
+    reenviada = req_obj.headers.get('X-Forwarded-For', '') if saltos > 0 else ''
+    if reenviada:
+        ips = [ip.strip() for ip in reenviada.split(',') if ip.strip()]
+        if ips:
+            return ips[-min(saltos, len(ips))]
+    return getattr(req_obj, 'remote_addr', None) or 'desconocida'
+
+
+def llave_ip(req_obj):
+    return f'ip:{ip_cliente(req_obj)}'
+
+
+def llave_login(req_obj):
+    """(IP, email) del cuerpo JSON; sin email, solo la IP"""
+    data = req_obj.get_json(silent=True) if hasattr(req_obj, 'get_json') else None
+    email = data.get('email') if isinstance(data, dict) else None
+    email = str(email or '').strip().lower()
+    return f'login:{ip_cliente(req_obj)}:{email}' if email else llave_ip(req_obj)
+
+
+def llave_dispositivo(req_obj):
+    """telefono_id del cuerpo JSON si viene; si no, la IP"""
+    data = req_obj.get_json(silent=True) if hasattr(req_obj, 'get_json') else None
+    telefono_id = data.get('telefono_id') if isinstance(data, dict) else None
+    return f'tel:{telefono_id}' if telefono_id else llave_ip(req_obj)
+
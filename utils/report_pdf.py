@@ -0,0 +1,293 @@
+# utils/report_pdf.py
+"""
+PDF del reporte de asistencias generado en el servidor, página por página.
+
+Antes el navegador armaba el PDF con jsPDF a partir del JSON del reporte:
+lento y pesado en memoria en celulares con listas grandes. Aquí se escribe
+el PDF directamente (PDF 1.4, fuentes Helvetica estándar con
+WinAnsiEncoding, sin dependencias): `generar_pdf` es un generador que emite
+cada página en cuanto está lista, así que la respuesta empieza a salir con
+la primera página. Lo que se guarda en caché sí se junta completo, hasta
+PDF_CACHE_MAX_BYTES; un PDF más grande solo se transmite.
+
+Layout (A4 horizontal): #, apellidos, nombre, matrícula, una columna por
+clase (P/J/F/-) y Total / %. Si hay más clases de las que caben a lo
+ancho, la tabla se parte en hojas de CLASES_POR_HOJA clases que repiten los
+datos del alumno.
+
+Caché (CachePDF): las escrituras de esta instancia (escaneos,
+justificaciones, clases y materias) llaman a `invalidar(profesor_id)`, que
+sube un contador por profesor. Mientras no cambie, una descarga repetida se
+sirve sin armar el reporte. Los bytes se guardan por la huella de los datos
+(`version_reporte`), así que un cambio hecho desde otra instancia produce un
+PDF nuevo a más tardar PDF_FRESH_S segundos después.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+from datetime import date
+
+from utils.cache import TTLCache
+
+PDF_CACHE_TTL_S = int(os.getenv('PDF_CACHE_TTL_S', '1800'))
+PDF_CACHE_MAX = int(os.getenv('PDF_CACHE_MAX', '64'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+# Cuánto vale la versión barata (contador local) sin rearmar el reporte
+PDF_FRESH_S = int(os.getenv('PDF_FRESH_S', '60'))
+
+ANCHO, ALTO = 842, 595           # A4 horizontal, en puntos
+MARGEN = 28
+ALTO_FILA = 13
+INICIO_TABLA = ALTO - 88
+CLASES_POR_HOJA = 15
+
+# (título, ancho) de las columnas fijas
+COLUMNAS_ALUMNO = [('#', 20), ('Apellido paterno', 92), ('Apellido materno', 92),
+                   ('Nombre', 100), ('Matrícula', 62)]
+COLUMNAS_TOTAL = [('Total', 32), ('%', 32)]
+ANCHO_CLASE = (ANCHO - 2 * MARGEN - sum(w for _, w in COLUMNAS_ALUMNO + COLUMNAS_TOTAL)) / CLASES_POR_HOJA
+
+COLORES = {
+    'P': (0.13, 0.62, 0.33),
+    'J': (0.80, 0.60, 0.03),
+    'F': (0.85, 0.22, 0.22),
+    '-': (0.55, 0.58, 0.64),
+}
+NEGRO = (0.1, 0.12, 0.16)
+ENCABEZADO = (0.12, 0.18, 0.27)
+FILA_ALTERNA = (0.95, 0.96, 0.98)
+LINEA = (0.8, 0.82, 0.86)
+
+# Anchos de Helvetica (1/1000 em) para ASCII 32..126; el resto ~ 556
+_ANCHOS = [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+           556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+           1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+           667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+           333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+           556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+
+
+def ancho_texto(texto, tamano, negrita=False):
+    total = sum(_ANCHOS[ord(c) - 32] if 32 <= ord(c) <= 126 else 556 for c in texto)
+    return total * tamano / 1000 * (1.06 if negrita else 1.0)
+
+
+def _recortar(texto, ancho, tamano):
+    texto = str(texto or '')
+    if ancho_texto(texto, tamano) <= ancho:
+        return texto
+    while texto and ancho_texto(texto + '…', tamano) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+
+def _cadena(texto):
+    """Literal de cadena PDF en WinAnsiEncoding"""
+    crudo = str(texto).encode('cp1252', errors='replace')
+    return b'(' + crudo.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class _Pagina:
+    """Acumula los operadores de contenido de una página"""
+
+    def __init__(self):
+        self.ops = []
+
+    def rect(self, x, y, w, h, color):
+        self.ops.append(b'%.3f %.3f %.3f rg %.2f %.2f %.2f %.2f re f' % (*color, x, y, w, h))
+
+    def linea(self, x1, y1, x2, y2, color=LINEA):
+        self.ops.append(b'%.3f %.3f %.3f RG 0.4 w %.2f %.2f m %.2f %.2f l S' % (*color, x1, y1, x2, y2))
+
+    def texto(self, x, y, texto, tamano=7.5, negrita=False, color=NEGRO):
+        self.ops.append(b'BT /%s %.1f Tf %.3f %.3f %.3f rg %.2f %.2f Td %s Tj ET' % (
+            b'F2' if negrita else b'F1', tamano, *color, x, y, _cadena(texto)))
+
+    def celda(self, x, y, ancho, texto, tamano=7.5, negrita=False, color=NEGRO, centrar=True):
+        texto = _recortar(texto, ancho - 4, tamano)
+        if centrar:
+            x += (ancho - ancho_texto(texto, tamano, negrita)) / 2
+        else:
+            x += 3
+        self.texto(x, y + 4, texto, tamano, negrita, color)
+
+    def contenido(self):
+        return b'\n'.join(self.ops)
+
+
+def _resumen(fila, clases):
+    valores = [fila.get('clases', {}).get(c['id']) or fila.get('clases', {}).get(str(c['id'])) or 'F'
+               for c in clases]
+    presentes = valores.count('P')
+    suyas = sum(1 for v in valores if v != '-')
+    return presentes, round(presentes / suyas * 100) if suyas else 0
+
+
+def _paginas(reporte, titulo, subtitulo):
+    """Contenido (sin comprimir) de cada página, una a la vez"""
+    clases = reporte.get('clases') or []
+    alumnos = reporte.get('alumnos') or []
+    filas_por_pagina = int((INICIO_TABLA - MARGEN - 16) // ALTO_FILA) - 1
+    hojas = [clases[i:i + CLASES_POR_HOJA] for i in range(0, len(clases), CLASES_POR_HOJA)] or [[]]
+    resumenes = [_resumen(a, clases) for a in alumnos]
+    bloques = range(0, max(len(alumnos), 1), filas_por_pagina)
+    numero = 0
+
+    for h, hoja in enumerate(hojas):
+        columnas = COLUMNAS_ALUMNO + [(c.get('fecha', '')[5:10] or f"C{c['id']}", ANCHO_CLASE)
+                                      for c in hoja] + COLUMNAS_TOTAL
+        ancho_tabla = sum(w for _, w in columnas)
+        for inicio in bloques:
+            numero += 1
+            p = _Pagina()
+            p.texto(MARGEN, ALTO - 40, titulo, 14, negrita=True)
+            p.texto(MARGEN, ALTO - 56, subtitulo, 9, color=(0.35, 0.38, 0.45))
+            resumen = f"Total alumnos: {len(alumnos)} · Total clases: {len(clases)}"
+            if len(hojas) > 1:
+                resumen += f" · Clases {h * CLASES_POR_HOJA + 1}–{h * CLASES_POR_HOJA + len(hoja)}"
+            p.texto(MARGEN, ALTO - 70, resumen, 9, color=(0.35, 0.38, 0.45))
+
+            y = INICIO_TABLA
+            p.rect(MARGEN, y, ancho_tabla, ALTO_FILA, ENCABEZADO)
+            x = MARGEN
+            for nombre, ancho in columnas:
+                p.celda(x, y, ancho, nombre, 7, negrita=True, color=(1, 1, 1))
+                x += ancho
+
+            for n in range(inicio, min(inicio + filas_por_pagina, len(alumnos))):
+                a = alumnos[n]
+                y -= ALTO_FILA
+                if (n - inicio) % 2:
+                    p.rect(MARGEN, y, ancho_tabla, ALTO_FILA, FILA_ALTERNA)
+                presentes, pct = resumenes[n]
+                celdas = [(n + 1, True, NEGRO), (a.get('apellido_paterno'), False, NEGRO),
+                          (a.get('apellido_materno'), False, NEGRO), (a.get('nombre'), False, NEGRO),
+                          (a.get('matricula'), True, NEGRO)]
+                for c in hoja:
+                    valor = a.get('clases', {}).get(c['id']) or a.get('clases', {}).get(str(c['id'])) or 'F'
+                    celdas.append((valor, True, COLORES.get(valor, NEGRO)))
+                celdas += [(presentes, True, NEGRO), (f"{pct}%", True, NEGRO)]
+                x = MARGEN
+                for (valor, centrar, color), (_, ancho) in zip(celdas, columnas):
+                    p.celda(x, y, ancho, valor, negrita=color is not NEGRO, color=color, centrar=centrar)
+                    x += ancho
+                p.linea(MARGEN, y, MARGEN + ancho_tabla, y)
+
+            p.texto(ANCHO - MARGEN - 50, MARGEN - 10, f"Página {numero}", 8, color=(0.5, 0.52, 0.58))
+            yield p.contenido()
+
+
+def generar_pdf(reporte, titulo, subtitulo=''):
+    """Generador de bytes del PDF; cada página se emite al terminarla"""
+    offsets = {}
+    escrito = 0
+
+    def objeto(num, cuerpo):
+        nonlocal escrito
+        offsets[num] = escrito
+        datos = b'%d 0 obj\n' % num + cuerpo + b'\nendobj\n'
+        escrito += len(datos)
+        return datos
+
+    cabecera = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    escrito = len(cabecera)
+    yield cabecera
+    # 1 catálogo, 2 árbol de páginas y 3 info se escriben al final
+    yield objeto(4, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    yield objeto(5, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+
+    paginas, num = [], 6
+    for contenido in _paginas(reporte, titulo, subtitulo):
+        comprimido = zlib.compress(contenido)
+        yield objeto(num, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(comprimido)
+                     + comprimido + b'\nendstream')
+        yield objeto(num + 1, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                              b'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents %d 0 R >>'
+                     % (ANCHO, ALTO, num))
+        paginas.append(num + 1)
+        num += 2
+
+    kids = b' '.join(b'%d 0 R' % n for n in paginas)
+    yield objeto(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(paginas)))
+    yield objeto(3, b'<< /Title %s /Producer (AttendCore) >>' % _cadena(titulo))
+    yield objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+    xref = [b'xref\n0 %d\n' % num, b'0000000000 65535 f \n']
+    xref += [b'%010d 00000 n \n' % offsets[n] for n in range(1, num)]
+    yield b''.join(xref) + (b'trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                            % (num, escrito))
+
+
+def version_reporte(reporte, *textos):
+    """Huella de lo que se imprime (sin la marca `generado`)"""
+    datos = {'clases': reporte.get('clases'), 'alumnos': reporte.get('alumnos'), 'textos': textos}
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+class CachePDF:
+    """
+    Dos niveles, para no armar el reporte en cada descarga:
+
+    - `llave(profesor, materia)`: versión barata de los datos, sin consultar
+      la BD (generación del profesor, que sube con cada `invalidar`, y el
+      día, que aparece en el subtítulo). `reciente(llave)` regresa
+      (huella, bytes) del último PDF servido con esa versión.
+    - los bytes, por (profesor, huella del contenido): si el reporte se
+      rearmó y no cambió, el PDF no se vuelve a escribir.
+
+    Las escrituras de otras instancias no suben la generación local; por eso
+    la versión barata vale solo PDF_FRESH_S segundos y después se rearma el
+    reporte y se compara la huella.
+    """
+
+    def __init__(self, ttl=PDF_CACHE_TTL_S, max_entries=PDF_CACHE_MAX,
+                 fresco=PDF_FRESH_S, max_bytes=PDF_CACHE_MAX_BYTES):
+        self._pdfs = TTLCache(ttl=ttl, max_entries=max_entries)
+        self._recientes = TTLCache(ttl=fresco, max_entries=4 * max_entries)
+        self._generacion = {}
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def llave(self, profesor_id, materia_id=None):
+        """Tomarla antes de armar el reporte: una invalidación posterior la deja vieja"""
+        return (profesor_id, materia_id, self._generacion.get(profesor_id, 0), date.today().isoformat())
+
+    def reciente(self, llave):
+        huella = self._recientes.get(llave)
+        pdf = self._pdfs.get((llave[0], huella)) if huella is not None else None
+        return (huella, pdf) if pdf is not None else None
+
+    def servir(self, llave, huella, generar):
+        """
+        Bytes guardados si los hay; si no, un generador que transmite las
+        páginas de `generar()`. Para guardar el PDF hay que juntar sus
+        partes, así que solo se acumulan hasta `max_bytes`: un PDF más
+        grande se transmite con memoria de una página y no se guarda.
+        """
+        guardado = self._pdfs.get((llave[0], huella))
+        if guardado is not None:
+            self._recientes.set(llave, huella)
+            return guardado
+
+        def transmitir():
+            partes, tamano = [], 0
+            for parte in generar():
+                if partes is not None:
+                    tamano += len(parte)
+                    if tamano <= self.max_bytes:
+                        partes.append(parte)
+                    else:
+                        partes = None
+                yield parte
+            # Solo se guarda si el cliente recibió el PDF completo
+            if partes is not None:
+                self._pdfs.set((llave[0], huella), b''.join(partes))
+                self._recientes.set(llave, huella)
+        return transmitir()
+
+    def invalidar(self, profesor_id):
+        with self._lock:
+            self._generacion[profesor_id] = self._generacion.get(profesor_id, 0) + 1
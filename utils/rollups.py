@@ -0,0 +1,325 @@
+# utils/rollups.py
+"""
+Agregados de asistencia (rollups) mantenidos por un trabajo incremental.
+
+Las tendencias del profesor leen solo estas tablas, no `asistencias`:
+
+    CREATE TABLE rollup_clases (
+        clase_id int PRIMARY KEY, fecha date, semana date, profesor_id int,
+        materia_id int, inscritos int, presentes int, justificadas int,
+        ausentes int, distancia_promedio numeric, actualizado timestamptz);
+    CREATE INDEX rollup_clases_profesor ON rollup_clases (profesor_id, fecha);
+
+    CREATE TABLE rollup_alumnos_semana (
+        alumno_id int, materia_id int, semana date, profesor_id int,
+        clases int, presentes int, justificadas int, ausentes int,
+        distancia_promedio numeric, actualizado timestamptz,
+        PRIMARY KEY (alumno_id, materia_id, semana));
+    CREATE INDEX rollup_alumnos_profesor ON rollup_alumnos_semana (profesor_id, semana);
+
+    CREATE TABLE rollup_estado (nombre text PRIMARY KEY, fecha_escaneo timestamptz,
+                                asistencia_id int, actualizado timestamptz);
+    CREATE TABLE rollup_pendientes (clase_id int PRIMARY KEY, marcado timestamptz);
+
+Cada corrida:
+
+1. lee `asistencias` después de la marca de agua (fecha_escaneo, id), por
+   llave y en orden ascendente, hasta `ROLLUP_LAG_S` antes de ahora (las
+   transacciones que aún no confirman no quedan atrás de la marca);
+2. junta esas clases con las de `rollup_pendientes`: escrituras que no
+   avanzan fecha_escaneo (justificaciones, escaneos offline con hora de
+   captura vieja) marcan su clase ahí;
+3. recalcula completos los agregados de esas clases y de las semanas
+   (materia, semana) que tocan, y los escribe con upsert: repetir una
+   corrida da el mismo resultado;
+4. solo entonces avanza la marca y borra las pendientes procesadas: las que
+   tienen `marcado` anterior al inicio de la corrida. Una clase marcada
+   mientras la corrida trabajaba se queda para la siguiente.
+
+Iniciar y terminar una clase también la marcan, para que una clase sin
+ningún escaneo tenga su fila en `rollup_clases` (todos ausentes).
+
+Las faltas salen de la lista de la materia (`horarios`): inscritos que no
+tienen fila válida ni justificada. Las clases sin materia cuentan como
+ausentes solo las filas fuera de rango.
+"""
+
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+ROLLUP_LAG_S = int(os.getenv('ROLLUP_LAG_S', '120'))
+ROLLUP_PAGINA = int(os.getenv('ROLLUP_PAGINA', '1000'))
+ROLLUP_MAX_FILAS = int(os.getenv('ROLLUP_MAX_FILAS', '50000'))
+LOTE_CLASES = 200
+ESTADO = 'asistencias'
+
+
+def _lista_in(ids):
+    return f"in.({','.join(map(str, ids))})"
+
+
+def _lotes(valores, n):
+    valores = sorted(valores)
+    for i in range(0, len(valores), n):
+        yield valores[i:i + n]
+
+
+def semana_de(fecha):
+    """Lunes de la semana ISO de una fecha 'YYYY-MM-DD'"""
+    dia = date.fromisoformat(str(fecha)[:10])
+    return dia - timedelta(days=dia.weekday())
+
+
+def marcar_pendientes(db, clase_ids):
+    """Para escrituras que la marca de agua no ve; errores no detienen al llamador"""
+    clase_ids = sorted({int(c) for c in clase_ids})
+    if not clase_ids:
+        return
+    ahora = datetime.now().isoformat()
+    try:
+        db.upsert('rollup_pendientes', [{'clase_id': c, 'marcado': ahora} for c in clase_ids],
+                  on_conflict='clase_id')
+    except Exception as e:
+        print(f"⚠️  No se pudieron marcar clases para rollup: {e}")
+
+
+class TrabajoRollup:
+    """`db` con select / upsert / delete al estilo de api/index.py::DB"""
+
+    def __init__(self, db, lag_s=ROLLUP_LAG_S, pagina=ROLLUP_PAGINA, max_filas=ROLLUP_MAX_FILAS):
+        self.db = db
+        self.lag_s = lag_s
+        self.pagina = pagina
+        self.max_filas = max_filas
+
+    def ejecutar(self, ahora=None):
+        """Una corrida incremental; regresa un resumen"""
+        ahora = ahora or datetime.now()
+        # Reloj real, el mismo de marcar_pendientes (`ahora` puede ser simulado)
+        inicio = datetime.now().isoformat()
+        marca = self._marca()
+        clase_ids, nueva_marca, filas = self._clases_nuevas(marca, ahora - timedelta(seconds=self.lag_s))
+        pendientes = {p['clase_id'] for p in self.db.select('rollup_pendientes', {'select': 'clase_id'}) or []}
+        clase_ids |= pendientes
+
+        semanas = set()
+        n_clases = 0
+        for lote in _lotes(clase_ids, LOTE_CLASES):
+            n_clases += self._rollup_clases(lote, semanas)
+        n_alumnos = self._rollup_alumnos(semanas)
+
+        if pendientes:
+            for lote in _lotes(pendientes, LOTE_CLASES):
+                self.db.delete('rollup_pendientes', {'clase_id': _lista_in(lote),
+                                                     'marcado': f'lte.{inicio}'})
+        if nueva_marca:
+            self.db.upsert('rollup_estado', [{
+                'nombre': ESTADO,
+                'fecha_escaneo': nueva_marca[0],
+                'asistencia_id': nueva_marca[1],
+                'actualizado': ahora.isoformat(),
+            }], on_conflict='nombre')
+        return {'asistencias_leidas': filas, 'clases': n_clases,
+                'semanas': len(semanas), 'filas_alumnos': n_alumnos,
+                'marca': nueva_marca[0] if nueva_marca else (marca[0] if marca else None)}
+
+    # ── 1. Marca de agua ──────────────────────
+    def _marca(self):
+        filas = self.db.select('rollup_estado', {'nombre': f'eq.{ESTADO}',
+                                                 'select': 'fecha_escaneo,asistencia_id'})
+        if filas and filas[0].get('fecha_escaneo'):
+            return filas[0]['fecha_escaneo'], int(filas[0].get('asistencia_id') or 0)
+        return None
+
+    def _clases_nuevas(self, marca, hasta):
+        """Clases con escaneos después de la marca; -> (ids, nueva marca, filas leídas)"""
+        clase_ids, leidas, ultima = set(), 0, None
+        while leidas < self.max_filas:
+            params = {
+                'select': 'id,clase_id,fecha_escaneo',
+                'order': 'fecha_escaneo.asc,id.asc',
+                'limit': str(self.pagina),
+                'fecha_escaneo': f'lt.{hasta.isoformat()}',
+            }
+            desde = ultima or marca
+            if desde:
+                params['or'] = f'(fecha_escaneo.gt.{desde[0]},and(fecha_escaneo.eq.{desde[0]},id.gt.{desde[1]}))'
+            filas = self.db.select('asistencias', params) or []
+            for f in filas:
+                clase_ids.add(f['clase_id'])
+            leidas += len(filas)
+            if filas:
+                ultima = (filas[-1]['fecha_escaneo'], filas[-1]['id'])
+            if len(filas) < self.pagina:
+                break
+        return clase_ids, ultima, leidas
+
+    # ── 2. Por clase (y por día) ──────────────
+    def _rollup_clases(self, clase_ids, semanas):
+        clases = self.db.select('clases', {'id': _lista_in(clase_ids),
+                                           'select': 'id,fecha,profesor_id,materia_id'}) or []
+        if not clases:
+            return 0
+        asistencias = self.db.select('asistencias', {
+            'clase_id': _lista_in([c['id'] for c in clases]),
+            'select': 'clase_id,alumno_id,valida,justificada,distancia_metros',
+        }) or []
+        roster = self._roster({c['materia_id'] for c in clases if c.get('materia_id')})
+
+        por_clase = defaultdict(list)
+        for a in asistencias:
+            por_clase[a['clase_id']].append(a)
+
+        ahora = datetime.now().isoformat()
+        filas = []
+        for clase in clases:
+            if not clase.get('fecha'):
+                continue
+            presentes, justificadas, fuera, distancias = _contar(por_clase[clase['id']])
+            materia_id = clase.get('materia_id')
+            inscritos = len(roster.get(materia_id, ())) if materia_id else None
+            if inscritos:
+                ausentes = max(inscritos - presentes - justificadas, 0)
+            else:
+                ausentes = fuera
+            semana = semana_de(clase['fecha'])
+            if materia_id:
+                semanas.add((materia_id, semana))
+            filas.append({
+                'clase_id': clase['id'],
+                'fecha': str(clase['fecha'])[:10],
+                'semana': semana.isoformat(),
+                'profesor_id': clase.get('profesor_id'),
+                'materia_id': materia_id,
+                'inscritos': inscritos,
+                'presentes': presentes,
+                'justificadas': justificadas,
+                'ausentes': ausentes,
+                'distancia_promedio': round(sum(distancias) / len(distancias), 2) if distancias else None,
+                'actualizado': ahora,
+            })
+        if filas:
+            self.db.upsert('rollup_clases', filas, on_conflict='clase_id')
+        return len(filas)
+
+    # ── 3. Por alumno, materia y semana ───────
+    def _rollup_alumnos(self, semanas):
+        if not semanas:
+            return 0
+        total = 0
+        por_materia = defaultdict(set)
+        for materia_id, semana in semanas:
+            por_materia[materia_id].add(semana)
+        roster = self._roster(set(por_materia))
+        ahora = datetime.now().isoformat()
+
+        for materia_id, semanas_materia in por_materia.items():
+            inicio = min(semanas_materia)
+            fin = max(semanas_materia) + timedelta(days=7)
+            clases = [c for c in self.db.select('clases', {
+                'materia_id': f'eq.{materia_id}',
+                'and': f'(fecha.gte.{inicio.isoformat()},fecha.lt.{fin.isoformat()})',
+                'select': 'id,fecha,profesor_id',
+            }) or [] if c.get('fecha') and semana_de(c['fecha']) in semanas_materia]
+            if not clases:
+                continue
+            semana_de_clase = {c['id']: semana_de(c['fecha']) for c in clases}
+            clases_por_semana = defaultdict(int)
+            for s in semana_de_clase.values():
+                clases_por_semana[s] += 1
+            profesor_id = clases[0].get('profesor_id')
+
+            celdas = defaultdict(list)  # (alumno, semana) -> filas
+            for lote in _lotes(semana_de_clase, LOTE_CLASES):
+                for a in self.db.select('asistencias', {
+                    'clase_id': _lista_in(lote),
+                    'select': 'clase_id,alumno_id,valida,justificada,distancia_metros',
+                }) or []:
+                    celdas[(a['alumno_id'], semana_de_clase[a['clase_id']])].append(a)
+
+            alumnos = roster.get(materia_id, set()) | {a for a, _ in celdas}
+            filas = []
+            for semana in sorted(clases_por_semana):
+                for alumno_id in sorted(alumnos):
+                    presentes, justificadas, _, distancias = _contar(celdas.get((alumno_id, semana), ()))
+                    n = clases_por_semana[semana]
+                    filas.append({
+                        'alumno_id': alumno_id,
+                        'materia_id': materia_id,
+                        'semana': semana.isoformat(),
+                        'profesor_id': profesor_id,
+                        'clases': n,
+                        'presentes': presentes,
+                        'justificadas': justificadas,
+                        'ausentes': max(n - presentes - justificadas, 0),
+                        'distancia_promedio': round(sum(distancias) / len(distancias), 2) if distancias else None,
+                        'actualizado': ahora,
+                    })
+            for i in range(0, len(filas), 1000):
+                self.db.upsert('rollup_alumnos_semana', filas[i:i + 1000],
+                               on_conflict='alumno_id,materia_id,semana')
+            total += len(filas)
+        return total
+
+    def _roster(self, materia_ids):
+        """materia_id -> set de alumnos inscritos (una consulta)"""
+        if not materia_ids:
+            return {}
+        roster = defaultdict(set)
+        for h in self.db.select('horarios', {'materia_id': _lista_in(sorted(materia_ids)),
+                                             'select': 'alumno_id,materia_id'}) or []:
+            roster[h['materia_id']].add(h['alumno_id'])
+        return roster
+
+
+def _contar(filas):
+    """-> (presentes, justificadas, fuera de rango, distancias de los presentes)"""
+    presentes = justificadas = fuera = 0
+    distancias = []
+    for f in filas:
+        if f.get('valida'):
+            presentes += 1
+            if f.get('distancia_metros') is not None:
+                distancias.append(float(f['distancia_metros']))
+        elif f.get('justificada'):
+            justificadas += 1
+        else:
+            fuera += 1
+    return presentes, justificadas, fuera, distancias
+
+
+def tendencias(filas, agrupar='semana'):
+    """
+    Serie por periodo (día o semana) y materia a partir de filas de
+    `rollup_clases`: [{periodo, materia_id, clases, presentes, justificadas,
+    ausentes, tasa, distancia_promedio}], ordenada por periodo.
+    """
+    clave = 'fecha' if agrupar == 'dia' else 'semana'
+    grupos = {}
+    for f in filas:
+        llave = (str(f[clave])[:10], f.get('materia_id'))
+        g = grupos.setdefault(llave, {'clases': 0, 'presentes': 0, 'justificadas': 0,
+                                      'ausentes': 0, '_dist': 0.0, '_n_dist': 0})
+        g['clases'] += 1
+        g['presentes'] += f.get('presentes') or 0
+        g['justificadas'] += f.get('justificadas') or 0
+        g['ausentes'] += f.get('ausentes') or 0
+        if f.get('distancia_promedio') is not None and f.get('presentes'):
+            g['_dist'] += float(f['distancia_promedio']) * f['presentes']
+            g['_n_dist'] += f['presentes']
+
+    serie = []
+    for (periodo, materia_id), g in sorted(grupos.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+        total = g['presentes'] + g['justificadas'] + g['ausentes']
+        serie.append({
+            'periodo': periodo,
+            'materia_id': materia_id,
+            'clases': g['clases'],
+            'presentes': g['presentes'],
+            'justificadas': g['justificadas'],
+            'ausentes': g['ausentes'],
+            'tasa': round((g['presentes'] + g['justificadas']) / total * 100, 1) if total else None,
+            'distancia_promedio': round(g['_dist'] / g['_n_dist'], 2) if g['_n_dist'] else None,
+        })
+    return serie
@@ -0,0 +1,221 @@
+# utils/roster_import.py
+"""
+Importación masiva de alumnos desde el CSV de servicios escolares.
+
+El archivo se lee en streaming (csv sobre el stream, sin cargarlo completo)
+y se procesa por lotes de `lote` filas:
+
+1. validación de matrícula y email con regex precompiladas;
+2. duplicados dentro del archivo con sets de valores ya vistos;
+3. duplicados contra `usuarios` con una sola consulta por lote
+   (or=(email.in.(...),matricula.in.(...)));
+4. un INSERT por lote; si la BD lo rechaza (p. ej. alguien se registró en
+   ese momento), ese lote se reintenta fila por fila para saber cuál falló.
+
+Cada fila produce una entrada del reporte: creada u error con el motivo.
+
+Columnas: matricula, email, nombre, apellido_paterno, apellido_materno y,
+opcional, password. Sin password la cuenta queda sin contraseña utilizable
+hasta que el alumno fije la suya con un código de activación: un profesor
+los pide por matrícula (POST /api/alumnos/activaciones), los reparte, y cada
+alumno lo canjea una sola vez en POST /api/activar.
+
+Uso como CLI (con las credenciales de Supabase en .env):
+    python -m utils.roster_import alumnos.csv [--lote 500] [--reporte reporte.csv]
+"""
+
+import codecs
+import csv
+import io
+import re
+import unicodedata
+from datetime import datetime
+
+from utils.db_errors import valor_filtro
+
+LOTE_DEFAULT = 500
+SIN_PASSWORD = '!'  # ningún hash (scrypt ni legado) coincide con este valor
+
+_MATRICULA_RE = re.compile(r'[A-Z0-9]{9}')
+_EMAIL_RE = re.compile(r'[^\s@]+@[^\s@]+\.[^\s@]+')
+
+_ALIAS = {
+    'matricula': 'matricula', 'email': 'email', 'correo': 'email',
+    'correo_electronico': 'email', 'nombre': 'nombre', 'nombres': 'nombre',
+    'apellido_paterno': 'apellido_paterno', 'paterno': 'apellido_paterno',
+    'apellido_materno': 'apellido_materno', 'materno': 'apellido_materno',
+    'password': 'password', 'contrasena': 'password',
+}
+
+CREADA, ERROR = 'creada', 'error'
+COLUMNAS_REPORTE = ('fila', 'matricula', 'email', 'estado', 'mensaje')
+
+
+def _columna(nombre):
+    """'Matrícula' / 'Correo electrónico' -> nombre de campo"""
+    sin_acentos = unicodedata.normalize('NFKD', nombre or '').encode('ascii', 'ignore').decode()
+    return _ALIAS.get(re.sub(r'\W+', '_', sin_acentos.strip().lower()).strip('_'))
+
+
+def leer_filas(stream, encoding='utf-8-sig'):
+    """Genera (numero_de_linea, dict) desde un stream de texto o de bytes"""
+    if not isinstance(stream, io.TextIOBase):
+        stream = codecs.getreader(encoding)(stream)
+    lector = csv.reader(stream)
+    encabezado = [_columna(c) for c in next(lector, [])]
+    for fila in lector:
+        if not any(fila):
+            continue
+        yield lector.line_num, {c: v.strip() for c, v in zip(encabezado, fila) if c}
+
+
+class ImportadorAlumnos:
+    """
+    - existentes(emails, matriculas) -> (set de emails, set de matrículas)
+      que ya están en `usuarios`
+    - insertar(filas) -> filas creadas; lanza excepción o regresa vacío si
+      la BD rechaza el lote
+    - hash_password(password) -> hash (solo si el CSV trae contraseñas)
+    """
+
+    def __init__(self, existentes, insertar, lote=LOTE_DEFAULT, hash_password=None):
+        self.existentes = existentes
+        self.insertar = insertar
+        self.lote = max(1, int(lote))
+        self.hash_password = hash_password
+        self.resumen = {'filas': 0, 'creadas': 0, 'errores': 0}
+
+    def importar(self, stream):
+        """Genera una entrada de reporte por fila, lote por lote"""
+        vistos_email, vistos_matricula = set(), set()
+        pendientes = []
+        for linea, datos in leer_filas(stream):
+            self.resumen['filas'] += 1
+            fila, error = self._validar(datos, vistos_email, vistos_matricula)
+            if error:
+                yield self._reporte(linea, datos, ERROR, error)
+                continue
+            pendientes.append((linea, fila))
+            if len(pendientes) >= self.lote:
+                yield from self._procesar_lote(pendientes)
+                pendientes = []
+        if pendientes:
+            yield from self._procesar_lote(pendientes)
+
+    # ── Validación (en memoria) ───────────────
+    def _validar(self, datos, vistos_email, vistos_matricula):
+        matricula = datos.get('matricula', '').upper()
+        email = datos.get('email', '').lower()
+        nombre = datos.get('nombre', '').title()
+        if not _MATRICULA_RE.fullmatch(matricula):
+            return None, 'Matrícula inválida (9 caracteres alfanuméricos)'
+        if not _EMAIL_RE.fullmatch(email):
+            return None, 'Email inválido'
+        if not nombre:
+            return None, 'Nombre requerido'
+        if matricula in vistos_matricula:
+            return None, 'Matrícula repetida en el archivo'
+        if email in vistos_email:
+            return None, 'Email repetido en el archivo'
+        vistos_matricula.add(matricula)
+        vistos_email.add(email)
+
+        ap = datos.get('apellido_paterno', '').title()
+        am = datos.get('apellido_materno', '').title()
+        password = datos.get('password')
+        return {
+            'matricula': matricula,
+            'nombre': ' '.join(p for p in (nombre, ap, am) if p),
+            'apellido_paterno': ap,
+            'apellido_materno': am,
+            'email': email,
+            'password_hash': self.hash_password(password) if password and self.hash_password
+                             else SIN_PASSWORD,
+            'rol': 'alumno',
+            'created_at': datetime.now().isoformat(),
+        }, None
+
+    # ── Lote (BD) ─────────────────────────────
+    def _procesar_lote(self, pendientes):
+        emails, matriculas = self.existentes([f['email'] for _, f in pendientes],
+                                             [f['matricula'] for _, f in pendientes])
+        nuevas = []
+        for linea, fila in pendientes:
+            if fila['email'] in emails:
+                yield self._reporte(linea, fila, ERROR, 'Email ya registrado')
+            elif fila['matricula'] in matriculas:
+                yield self._reporte(linea, fila, ERROR, 'Matrícula ya registrada')
+            else:
+                nuevas.append((linea, fila))
+        if not nuevas:
+            return
+
+        if self._insertar([f for _, f in nuevas]):
+            for linea, fila in nuevas:
+                yield self._reporte(linea, fila, CREADA, '')
+            return
+        # El lote completo fue rechazado: fila por fila para aislar la causa
+        for linea, fila in nuevas:
+            if self._insertar([fila]):
+                yield self._reporte(linea, fila, CREADA, '')
+            else:
+                yield self._reporte(linea, fila, ERROR, 'Rechazada por la base de datos')
+
+    def _insertar(self, filas):
+        try:
+            return bool(self.insertar(filas))
+        except Exception as e:
+            print(f"⚠️  Lote de {len(filas)} alumnos rechazado: {e}")
+            return False
+
+    def _reporte(self, linea, datos, estado, mensaje):
+        self.resumen['creadas' if estado == CREADA else 'errores'] += 1
+        return {'fila': linea, 'matricula': datos.get('matricula', ''),
+                'email': datos.get('email', ''), 'estado': estado, 'mensaje': mensaje}
+
+
+def filtro_existentes(emails, matriculas):
+    """Parámetros de PostgREST para la consulta de duplicados de un lote"""
+    lista = lambda valores: ','.join(valor_filtro(v) for v in valores)
+    return {'or': f'(email.in.({lista(emails)}),matricula.in.({lista(matriculas)}))',
+            'select': 'email,matricula'}
+
+
+def _cli():
+    import argparse
+    import sys
+    from database import get_db
+    from utils.passwords import hash_scrypt
+
+    parser = argparse.ArgumentParser(description='Importa alumnos desde un CSV')
+    parser.add_argument('archivo')
+    parser.add_argument('--lote', type=int, default=LOTE_DEFAULT)
+    parser.add_argument('--reporte', help='CSV con el resultado de cada fila (default: stdout)')
+    args = parser.parse_args()
+
+    db = get_db()
+
+    def existentes(emails, matriculas):
+        rows = db.query('usuarios', params=filtro_existentes(emails, matriculas))
+        if rows is None:
+            raise RuntimeError('No se pudo consultar usuarios existentes')
+        return {r['email'] for r in rows}, {r['matricula'] for r in rows}
+
+    importador = ImportadorAlumnos(existentes,
+                                   lambda filas: db.query('usuarios', method='POST', data=filas),
+                                   lote=args.lote, hash_password=hash_scrypt)
+    salida = open(args.reporte, 'w', newline='', encoding='utf-8') if args.reporte else sys.stdout
+    with open(args.archivo, newline='', encoding='utf-8-sig') as f:
+        escritor = csv.DictWriter(salida, fieldnames=COLUMNAS_REPORTE)
+        escritor.writeheader()
+        for entrada in importador.importar(f):
+            escritor.writerow(entrada)
+    if salida is not sys.stdout:
+        salida.close()
+    r = importador.resumen
+    print(f"✅ {r['creadas']} creadas, ❌ {r['errores']} con error, de {r['filas']} filas",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    _cli()
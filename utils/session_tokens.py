@@ -0,0 +1,176 @@
+# utils/session_tokens.py
+"""
+Tokens de sesión firmados (HMAC-SHA256) con expiración deslizante.
+
+Formato: <payload base64url>.<firma base64url>, donde el payload es JSON con
+uid, rol, tel (telefono_id), iat, exp y jti. Verificar un token no consulta la
+base de datos; la lista de revocación solo se consulta en rutas sensibles.
+
+Requiere SESSION_SECRET (o SECRET_KEY). Sin secreto no hay valor por
+defecto: no se emiten tokens (SecretoNoConfigurado) y ninguno verifica, así
+que las rutas con sesión responden 401 en lugar de aceptar firmas que
+cualquiera podría calcular.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+from utils.cache import TTLCache
+
+SESSION_TTL_S = int(os.getenv('SESSION_TTL_S', str(7 * 24 * 3600)))
+ACTIVATION_TTL_S = int(os.getenv('ACTIVATION_TTL_S', str(14 * 24 * 3600)))
+
+
+# Valores públicos (ejemplos del repo) que no cuentan como secreto
+_INSEGUROS = {'', 'dev-key-123'}
+
+
+class SecretoNoConfigurado(RuntimeError):
+    """Falta el secreto de firma; el servidor no puede emitir tokens"""
+
+
+def _secret():
+    secreto = os.getenv('SESSION_SECRET') or os.getenv('SECRET_KEY') or ''
+    if secreto in _INSEGUROS:
+        print("ADVERTENCIA: SESSION_SECRET no configurado; no se emitirán ni aceptarán sesiones")
+        return None
+    return secreto.encode()
+
+
+_KEY = _secret()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _unb64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _firma(payload_b64):
+    if _KEY is None:
+        raise SecretoNoConfigurado('Configura SESSION_SECRET')
+    return _b64(hmac.new(_KEY, payload_b64.encode(), hashlib.sha256).digest())
+
+
+def emitir_sesion(user, ahora=None):
+    """Token de sesión para una fila de `usuarios`"""
+    ahora = int(time.time() if ahora is None else ahora)
+    claims = {
+        'uid': user['id'],
+        'rol': user.get('rol'),
+        'tel': user.get('telefono_id'),
+        'iat': ahora,
+        'exp': ahora + SESSION_TTL_S,
+        'jti': secrets.token_urlsafe(9),
+    }
+    payload = _b64(json.dumps(claims, separators=(',', ':')).encode())
+    return f"{payload}.{_firma(payload)}"
+
+
+def verificar_sesion(token, ahora=None):
+    """Regresa los claims si la firma es válida y no ha expirado; None si no"""
+    if _KEY is None or not token or token.count('.') != 1:
+        return None
+    payload, firma = token.split('.')
+    if not hmac.compare_digest(firma, _firma(payload)):
+        return None
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    if claims.get('exp', 0) < (time.time() if ahora is None else ahora):
+        return None
+    return claims
+
+
+def necesita_refresco(claims, ahora=None):
+    """Expiración deslizante: se renueva al consumirse la mitad de la vigencia"""
+    ahora = time.time() if ahora is None else ahora
+    return claims['exp'] - ahora < SESSION_TTL_S / 2
+
+
+def refrescar(claims, ahora=None):
+    """Nuevo token con los mismos datos de usuario y vigencia completa"""
+    return emitir_sesion({'id': claims['uid'], 'rol': claims.get('rol'),
+                          'telefono_id': claims.get('tel')}, ahora)
+
+
+# ── Activación de cuentas importadas ──────────
+# Una cuenta creada por la importación no tiene contraseña; el código de
+# activación permite fijar la primera. Se firma con otro prefijo (nunca pasa
+# por sesión) y va ligado al hash actual: en cuanto la cuenta tiene
+# contraseña, el código deja de valer.
+
+def _huella(password_hash):
+    return hashlib.sha256(str(password_hash).encode()).hexdigest()[:16]
+
+
+def emitir_activacion(user, ahora=None):
+    """Código de activación para una fila de `usuarios` (id y password_hash)"""
+    ahora = int(time.time() if ahora is None else ahora)
+    claims = {'act': user['id'], 'h': _huella(user.get('password_hash')),
+              'exp': ahora + ACTIVATION_TTL_S}
+    payload = _b64(json.dumps(claims, separators=(',', ':')).encode())
+    return f"{payload}.{_firma('activacion:' + payload)}"
+
+
+def verificar_activacion(token, ahora=None):
+    """-> (uid, huella del hash) si la firma es válida y no ha expirado; None si no"""
+    if _KEY is None or not token or token.count('.') != 1:
+        return None
+    payload, firma = token.split('.')
+    if not hmac.compare_digest(firma, _firma('activacion:' + payload)):
+        return None
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    if claims.get('exp', 0) < (time.time() if ahora is None else ahora):
+        return None
+    return claims['act'], claims['h']
+
+
+def coincide_huella(password_hash, huella):
+    return hmac.compare_digest(_huella(password_hash), str(huella))
+
+
+def token_de_request(req_obj):
+    """Token del header Authorization: Bearer <token>"""
+    auth = req_obj.headers.get('Authorization', '')
+    return auth[7:].strip() if auth.startswith('Bearer ') else None
+
+
+class ListaRevocacion:
+    """
+    Revocación de sesiones (logout, cambio de dispositivo).
+
+    `consultar(jti) -> bool` y `registrar(jti, exp)` hablan con el almacén
+    compartido (tabla `sesiones_revocadas`). Los positivos se cachean hasta
+    que el token expira; los negativos no, para que una revocación aplique
+    de inmediato en las rutas sensibles.
+    """
+
+    def __init__(self, consultar, registrar):
+        self.consultar = consultar
+        self.registrar = registrar
+        self._revocados = TTLCache(ttl=SESSION_TTL_S, max_entries=10_000)
+
+    def revocar(self, claims):
+        self.registrar(claims['jti'], claims['exp'])
+        self._revocados.set(claims['jti'], True, ttl=max(0, claims['exp'] - time.time()))
+
+    def esta_revocada(self, claims):
+        jti = claims.get('jti')
+        if jti in self._revocados:
+            return True
+        if self.consultar(jti):
+            self._revocados.set(jti, True, ttl=max(0, claims['exp'] - time.time()))
+            return True
+        return False
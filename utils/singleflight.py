@@ -0,0 +1,95 @@
+# utils/singleflight.py
+"""
+Coalescencia de lecturas idénticas concurrentes (singleflight).
+
+Cuando el dashboard se abre en el proyector y en la laptop, o varios
+ayudantes abren la misma clase, llegan a la vez requests idénticos y caros.
+El primero (líder) calcula; los que llegan mientras tanto con la misma
+llave esperan y reciben ese mismo resultado, así que la BD atiende una sola
+vez. Si el líder falla, los que esperaban reciben la misma excepción.
+
+Tras terminar, el resultado se sigue sirviendo durante un periodo de gracia
+corto (SINGLEFLIGHT_GRACE_S, 0 = solo mientras está en vuelo) para absorber
+ráfagas que llegan justo después; es un desfase aceptable para lecturas que
+el cliente ya refresca por polling. Los errores nunca se guardan.
+
+Vive en memoria del proceso, como utils/cache.py: en gunicorn coalesce por
+worker y en Vercel por instancia.
+"""
+
+import os
+import threading
+
+from utils.cache import TTLCache
+
+SINGLEFLIGHT_GRACE_S = float(os.getenv('SINGLEFLIGHT_GRACE_S', '1.0'))
+# Un seguidor no espera para siempre a un líder atorado: calcula por su cuenta
+SINGLEFLIGHT_WAIT_S = float(os.getenv('SINGLEFLIGHT_WAIT_S', '30'))
+
+_FALTANTE = object()
+
+
+class _Llamada:
+    __slots__ = ('hecho', 'resultado', 'error')
+
+    def __init__(self):
+        self.hecho = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class GrupoVuelo:
+    """
+    hacer(llave, fn, guardar=None) -> (resultado, compartido)
+    `guardar(resultado)` decide si el resultado se reutiliza durante la
+    gracia (p. ej. solo respuestas 2xx).
+    """
+
+    def __init__(self, gracia=SINGLEFLIGHT_GRACE_S, espera=SINGLEFLIGHT_WAIT_S, max_entries=1024):
+        self.gracia = gracia
+        self.espera = espera
+        self._en_vuelo = {}
+        self._recientes = TTLCache(ttl=gracia, max_entries=max_entries) if gracia > 0 else None
+        self._lock = threading.Lock()
+        self.lideres = 0
+        self.compartidas = 0
+
+    def hacer(self, llave, fn, guardar=None):
+        with self._lock:
+            if self._recientes is not None:
+                reciente = self._recientes.get(llave, _FALTANTE)
+                if reciente is not _FALTANTE:
+                    self.compartidas += 1
+                    return reciente, True
+            llamada = self._en_vuelo.get(llave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_vuelo[llave] = _Llamada()
+                self.lideres += 1
+            else:
+                self.compartidas += 1
+
+        if not lider:
+            if llamada.hecho.wait(self.espera):
+                if llamada.error is not None:
+                    raise llamada.error
+                return llamada.resultado, True
+            return fn(), False
+
+        try:
+            llamada.resultado = fn()
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(llave, None)
+                if llamada.error is None and self._recientes is not None \
+                        and (guardar is None or guardar(llamada.resultado)):
+                    self._recientes.set(llave, llamada.resultado)
+            llamada.hecho.set()
+        return llamada.resultado, False
+
+    def estadisticas(self):
+        return {'en_vuelo': len(self._en_vuelo), 'lideres': self.lideres,
+                'compartidas': self.compartidas}
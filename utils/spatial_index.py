@@ -0,0 +1,119 @@
+# utils/spatial_index.py
+"""
+Índice espacial de las clases activas sobre una rejilla geohash.
+
+Cada clase se guarda en la celda geohash de su punto de referencia
+(latitud_referencia / longitud_referencia). Para "¿qué clases activas están
+a menos de R metros de este punto?" se calculan las celdas que cubren el
+cuadro de ±R alrededor del punto (9 con el tamaño de celda por defecto y
+radios de aula), se leen de un dict y solo los candidatos de esas celdas
+pasan por la distancia exacta. El costo no depende del número de clases
+activas en el campus sino de cuántas caen cerca.
+
+Precisión 7 ≈ celdas de 153 m × 153 m; alcanza para radios de geocerca y
+para detectar el aula vecina.
+"""
+
+import math
+
+from utils.geofence import haversine
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_M_POR_GRADO_LAT = 111_320.0
+PRECISION = 7
+
+
+def geohash(lat, lon, precision=PRECISION):
+    """Geohash estándar (base32) de un punto"""
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    bits, bit, pares, salida = 0, 0, True, []
+    while len(salida) < precision:
+        if pares:
+            medio = (lon_min + lon_max) / 2
+            if lon >= medio:
+                bits, lon_min = bits * 2 + 1, medio
+            else:
+                bits, lon_max = bits * 2, medio
+        else:
+            medio = (lat_min + lat_max) / 2
+            if lat >= medio:
+                bits, lat_min = bits * 2 + 1, medio
+            else:
+                bits, lat_max = bits * 2, medio
+        pares = not pares
+        bit += 1
+        if bit == 5:
+            salida.append(_BASE32[bits])
+            bits, bit = 0, 0
+    return ''.join(salida)
+
+
+def tamano_celda(precision=PRECISION):
+    """(alto, ancho) de una celda en grados"""
+    total = 5 * precision
+    return 180.0 / 2 ** (total // 2), 360.0 / 2 ** (total - total // 2)
+
+
+class IndiceGeohash:
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self._alto, self._ancho = tamano_celda(precision)
+        self._celdas = {}      # geohash -> set de claves
+        self._posiciones = {}  # clave -> (lat, lon, geohash)
+
+    def agregar(self, clave, lat, lon):
+        if lat is None or lon is None:
+            return
+        self.quitar(clave)
+        lat, lon = float(lat), float(lon)
+        celda = geohash(lat, lon, self.precision)
+        self._celdas.setdefault(celda, set()).add(clave)
+        self._posiciones[clave] = (lat, lon, celda)
+
+    def quitar(self, clave):
+        posicion = self._posiciones.pop(clave, None)
+        if posicion is None:
+            return
+        celda = self._celdas.get(posicion[2])
+        if celda is not None:
+            celda.discard(clave)
+            if not celda:
+                del self._celdas[posicion[2]]
+
+    def cercanas(self, lat, lon, radio_m):
+        """[(clave, distancia_m)] a menos de radio_m, de la más cercana a la más lejana"""
+        if lat is None or lon is None:
+            return []
+        lat, lon = float(lat), float(lon)
+        resultado = []
+        for celda in self._celdas_cubiertas(lat, lon, radio_m):
+            # Copias: otro hilo puede estar agregando o quitando clases
+            for clave in tuple(self._celdas.get(celda, ())):
+                posicion = self._posiciones.get(clave)
+                if posicion is None:
+                    continue
+                lat_c, lon_c, _ = posicion
+                distancia = haversine(lat, lon, lat_c, lon_c)
+                if distancia <= radio_m:
+                    resultado.append((clave, distancia))
+        resultado.sort(key=lambda par: par[1])
+        return resultado
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def _celdas_cubiertas(self, lat, lon, radio_m):
+        """Celdas geohash que tocan el cuadro de ±radio_m alrededor del punto"""
+        d_lat = radio_m / _M_POR_GRADO_LAT
+        d_lon = radio_m / (_M_POR_GRADO_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        lat_min, lat_max = max(lat - d_lat, -90.0), min(lat + d_lat, 90.0)
+        lon_min, lon_max = lon - d_lon, lon + d_lon
+        n_lat = int((lat_max - lat_min) / self._alto) + 1
+        n_lon = int((lon_max - lon_min) / self._ancho) + 1
+        celdas = set()
+        for i in range(n_lat + 1):
+            la = min(lat_min + i * self._alto, lat_max)
+            for j in range(n_lon + 1):
+                lo = min(lon_min + j * self._ancho, lon_max)
+                celdas.add(geohash(la, (lo + 180.0) % 360.0 - 180.0, self.precision))
+        return celdas
@@ -0,0 +1,90 @@
+# utils/write_buffer.py
+"""
+Buffer de escrituras diferidas con coalescencia por llave.
+
+Para escrituras de bookkeeping (last_login, etc.) que no deben retrasar la
+respuesta: cada registro sobrescribe el valor pendiente de su llave y un
+hilo daemon vacía el buffer por lotes cada `intervalo` segundos o al llegar
+a `max_pendientes`. Al terminar el proceso (atexit) se hace un vaciado final.
+
+El hilo y el atexit solo sirven en un proceso de larga vida (gunicorn). En
+serverless (Vercel) la instancia se congela al responder y se recicla sin
+correr atexit, así que lo pendiente se perdería. Ahí WRITE_BUFFER_BACKGROUND
+vale 0 por defecto (como JOB_BACKGROUND en utils/jobs.py) y `registrar`
+escribe en el mismo request.
+"""
+
+import atexit
+import os
+import threading
+
+# Vaciado en segundo plano solo en procesos de larga vida (no en Vercel)
+WRITE_BUFFER_BACKGROUND = os.getenv('WRITE_BUFFER_BACKGROUND', '0' if os.getenv('VERCEL') else '1') == '1'
+
+
+class BufferEscrituras:
+    """
+    `flush(dict llave -> valor)` recibe el lote completo de pendientes. Con
+    `segundo_plano` en False cada `registrar` vacía el buffer en el momento.
+    """
+
+    def __init__(self, flush, intervalo=10.0, max_pendientes=500, nombre='write-buffer',
+                 segundo_plano=WRITE_BUFFER_BACKGROUND):
+        self.flush_fn = flush
+        self.segundo_plano = segundo_plano
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.nombre = nombre
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._pid = None
+        self._thread = None
+        atexit.register(self.flush)
+
+    def registrar(self, llave, valor):
+        with self._lock:
+            self._pendientes[llave] = valor
+            lleno = len(self._pendientes) >= self.max_pendientes
+        if not self.segundo_plano:
+            self.flush()
+            return
+        self._asegurar_hilo()
+        if lleno:
+            self._despertar.set()
+
+    def flush(self):
+        """Escribe todo lo pendiente; si falla, reencola lo que no se haya sobrescrito"""
+        with self._lock:
+            lote, self._pendientes = self._pendientes, {}
+        if not lote:
+            return 0
+        try:
+            self.flush_fn(lote)
+        except Exception as e:
+            print(f"❌ Error vaciando {self.nombre}: {e}")
+            with self._lock:
+                for llave, valor in lote.items():
+                    self._pendientes.setdefault(llave, valor)
+            return 0
+        return len(lote)
+
+    def _asegurar_hilo(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name=self.nombre, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            self.flush()
+
+    def __len__(self):
+        return len(self._pendientes)